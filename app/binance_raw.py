@@ -5,6 +5,11 @@ import urllib.parse
 import requests
 from app.tools import timestamp_from_str
 from app.config import NUMBER_OF_MILISECONDS_IN_A_DAY
+from app import metrics
+from app.logging_config import get_logger
+from app.rate_limiter import get_limiter
+
+logger = get_logger(__name__)
 
 
 def sign_query(query: str, secret_key: str) -> str:
@@ -34,10 +39,10 @@ def create_params(secret_key: str, params_source: dict = {}) -> dict:
     # Build querystring
     query_string = urllib.parse.urlencode(params)
 
+    logger.debug("Created params: %s", query_string)
     # Sign
     signature = sign_query(query=query_string, secret_key=secret_key)
     params["signature"] = signature
-    print(f"Created params: {params}")
     return params
 
 
@@ -54,21 +59,24 @@ def get_my_trades(
 
     # Make GET request to Binance
     url: str = f"{base_url}myTrades"
-    print(f"Request URL: {url}")
-    response = requests.get(
-        url=url,
-        params=create_params(
-            secret_key=secret_key,
-            params_source={
-                "symbol": symbol,
-                "start_time": start_time,
-                "end_time": end_time,
-            },
-        ),
-        headers=headers,
-    )
-    print(f"Response: {response.text}")
-    print(f"Status: {response.status_code}")
+    limiter = get_limiter("binance")
+    limiter.acquire("myTrades")
+    logger.debug("Request URL: %s", url)
+    with metrics.track_request("binance", "myTrades"):
+        response = requests.get(
+            url=url,
+            params=create_params(
+                secret_key=secret_key,
+                params_source={
+                    "symbol": symbol,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                },
+            ),
+            headers=headers,
+        )
+    limiter.update(response.headers, response.status_code)
+    logger.debug("Response %s: %s", response.status_code, response.text)
     return response
 
 
@@ -83,18 +91,22 @@ def snapshot(
 
     # Make GET request to Binance
     url: str = f"{base_url}account"
-    print(f"Request URL: {url}")
-    response = requests.get(
-        url=url,
-        params=create_params(
-            secret_key=secret_key,
-            params_source={
-                "omitZeroBalances": str(omitZeroBalances).lower(),
-            },
-        ),
-        headers=headers,
-    )
-    print(f"Response: {response.text}")
+    limiter = get_limiter("binance")
+    limiter.acquire("account")
+    logger.debug("Request URL: %s", url)
+    with metrics.track_request("binance", "account"):
+        response = requests.get(
+            url=url,
+            params=create_params(
+                secret_key=secret_key,
+                params_source={
+                    "omitZeroBalances": str(omitZeroBalances).lower(),
+                },
+            ),
+            headers=headers,
+        )
+    limiter.update(response.headers, response.status_code)
+    logger.debug("Response %s: %s", response.status_code, response.text)
     return response
 
 
@@ -108,15 +120,19 @@ def get_all_order_list(
 
     # Make GET request to Binance
     url: str = f"{base_url}allOrderList"
-    print(f"Request URL: {url}")
-    response = requests.get(
-        url=url,
-        params=create_params(
-            secret_key=secret_key,
-        ),
-        headers=headers,
-    )
-    print(f"Response: {response.text}")
+    limiter = get_limiter("binance")
+    limiter.acquire("allOrderList")
+    logger.debug("Request URL: %s", url)
+    with metrics.track_request("binance", "allOrderList"):
+        response = requests.get(
+            url=url,
+            params=create_params(
+                secret_key=secret_key,
+            ),
+            headers=headers,
+        )
+    limiter.update(response.headers, response.status_code)
+    logger.debug("Response %s: %s", response.status_code, response.text)
     return response
 
 
@@ -2,13 +2,18 @@ from fastapi import APIRouter, File, HTTPException, Depends, Query, UploadFile
 from typing import Annotated
 from sqlalchemy.orm import Session
 from app.binance_service import BinanceService
-from app.dependencies import get_db_session, get_binance_service
-from app import crud, tools
+from app.dependencies import (
+    get_db_session,
+    get_binance_service,
+)
+from app import crud, tools, uploads
 from app.users_enum import UsersEnum
 from app.binance_raw import get_my_trades, snapshot, get_all_order_list
 from app.config import NUMBER_OF_MILISECONDS_IN_A_DAY
+from app.logging_config import get_logger
 
 router = APIRouter(prefix="/binance", tags=["Binance"])
+logger = get_logger(__name__)
 
 
 @router.get("/get_binance_exchange_info")
@@ -52,11 +57,12 @@ def update_symbols(
             status_code=404, detail="No symbols found in Binance API response."
         )
     try:
-        return crud.upsert_binance_symbols(
+        result = crud.upsert_binance_symbols(
             db_session=db_session, symbols_data=symbols_data
         )
+        return result
     except Exception as e:
-        print(f"Error storing Binance symbols: {str(e)}")
+        logger.error("Error storing Binance symbols: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error storing Binance symbols: {str(e)}",
@@ -72,7 +78,7 @@ def get_currencies(
     try:
         return crud.get_binance_symbol_dict(db_session=db_session, symbol=symbol)
     except Exception as e:
-        print(f"Error storing Binance symbols: {str(e)}")
+        logger.error("Error storing Binance symbols: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error storing Binance symbols: {str(e)}",
@@ -90,19 +96,31 @@ async def upload_csv(
         raise HTTPException(status_code=400, detail="Provide user.")
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only .csv files are supported.")
+    upload = uploads.read_upload(
+        file.file, crud.get_uploads(db_session, user.value, "Binance", "csv")
+    )
+    if upload.previous:
+        return uploads.duplicate_result(upload.previous)
+    csv_file, first_row_number = upload.content, 1
+    # An earlier export with rows appended: only the new rows are parsed
+    tail = upload.prefix and uploads.csv_tail(upload.content, upload.prefix.size)
+    if tail:
+        csv_file, first_row_number = tail, upload.prefix.row_count + 1
     try:
-        contents: bytes = await file.read()
         trades_data: list[list[str]] = binance_service.parse_trades_from_csv(
-            db_session=db_session, csv_file=contents, user=user.value
+            db_session=db_session,
+            csv_file=csv_file,
+            user=user.value,
+            first_row_number=first_row_number,
         )
     except Exception as e:
-        print(f"Error processing uploaded CSV file: {str(e)}")
+        logger.error("Error processing uploaded CSV file: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing uploaded CSV file: {str(e)}",
         )
     try:
-        return crud.upsert_trade_records(
+        result = crud.upsert_trade_records(
             db_session=db_session,
             user=user.value,
             exchange="Binance",
@@ -110,6 +128,18 @@ async def upload_csv(
         )
     except HTTPException as e:
         raise e
+    if tail:
+        result["skipped_rows"] = first_row_number - 1
+    uploads.record_upload(
+        db_session,
+        upload,
+        user.value,
+        "Binance",
+        "csv",
+        row_count=first_row_number - 1 + len(trades_data),
+        result=result,
+    )
+    return result
 
 
 @router.post("/upload-xlsx")
@@ -123,27 +153,41 @@ async def upload_xlsx(
         raise HTTPException(status_code=400, detail="Provide user.")
     if not file.filename.endswith(".xlsx"):
         raise HTTPException(status_code=400, detail="Only .xlsx files are supported.")
+    upload = uploads.read_upload(
+        file.file,
+        crud.get_uploads(db_session, user.value, "Binance", "xlsx"),
+        keep_content=False,
+    )
+    if upload.previous:
+        return uploads.duplicate_result(upload.previous)
+    # Parsed and stored batch by batch straight from the spooled upload
     try:
-        contents: bytes = await file.read()
-        trades_data: list[list[str]] = binance_service.parse_trades_from_xlsx(
-            db_session=db_session, xlsx_file=contents, user=user.value
-        )
-    except Exception as e:
-        print(f"Error processing uploaded XLSX file: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error processing uploaded XLSX file: {str(e)}",
-        )
-    # print(f"Parsed trades data: {trades_data}")
-    try:
-        return crud.upsert_trade_records(
+        result = crud.upsert_trade_batches(
             db_session=db_session,
             user=user.value,
             exchange="Binance",
-            trades_data=trades_data,
+            batches=binance_service.iter_trades_from_xlsx(
+                db_session=db_session, xlsx_file=file.file, user=user.value
+            ),
+        )
+        uploads.record_upload(
+            db_session,
+            upload,
+            user.value,
+            "Binance",
+            "xlsx",
+            row_count=result["fetched_trades"],
+            result=result,
         )
+        return result
     except HTTPException as e:
         raise e
+    except Exception as e:
+        logger.error("Error processing uploaded XLSX file: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing uploaded XLSX file: {str(e)}",
+        )
 
 
 @router.post("/fetch_and_store_trades_24h")
@@ -163,7 +207,7 @@ async def fetch_trades_24h(
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    print(f"Fetched trades for symbol {symbol}: {api_trades}")
+    logger.info("Fetched %d trades for symbol %s.", len(api_trades), symbol)
     if not api_trades:
         raise HTTPException(
             status_code=404, detail="No trades found for the specified symbol."
@@ -198,7 +242,7 @@ async def fetch_trades_raw_24h(
         )
         response_json = response.json()
     except Exception as e:
-        print(f"Error fetching trades from Binance API: {str(e)}")
+        logger.error("Error fetching trades from Binance API: %s", e)
         return {"error": str(e)}
     # if not response:
     #     return {"message": "No response for the specified symbol."}
@@ -220,7 +264,7 @@ async def account_snapshot(
         )
         response_json = response.json()
     except Exception as e:
-        print(f"Error fetching trades from Binance API: {str(e)}")
+        logger.error("Error fetching trades from Binance API: %s", e)
         return {"error": str(e)}
     return {"response": response_json}
 
@@ -232,7 +276,7 @@ def get_user(
     try:
         return {"User": binance_service.user}
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.error("Error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error: {str(e)}",
@@ -251,6 +295,6 @@ async def get_all_order_list_endpoint(
         )
         response_json = response.json()
     except Exception as e:
-        print(f"Error fetching trades from Binance API: {str(e)}")
+        logger.error("Error fetching trades from Binance API: %s", e)
         return {"error": str(e)}
     return {"response": response_json}
@@ -2,19 +2,25 @@ from decimal import Decimal
 import keyring.errors
 import requests
 import time
+import warnings
 import keyring
 import pandas as pd
 from datetime import datetime, timedelta, timezone
+from itertools import count
 from requests.exceptions import (
     RequestException,
     HTTPError,
     Timeout,
     ConnectionError,
 )
-from typing import List, Dict, Generator
+from typing import BinaryIO, Dict, Generator, Iterator, List
 from binance.spot import Spot
 from binance.error import ClientError
-from app import tools, crud
+from app import tools, crud, metrics, parallel_parsing, trade_ids
+from app.logging_config import get_logger, get_row_logger
+from app.rate_limiter import RateLimiter, get_limiter
+from app.response_cache import cached_fetch, range_closed
+from app.xlsx_reader import XLSX_BATCH_SIZE, XlsxBatches
 from fastapi import HTTPException
 from io import BytesIO, StringIO
 
@@ -25,9 +31,214 @@ KEYRING_SYSTEM_NAME = "binance_CherryWallet_api"
 # "binance_CherryWallet_api" (MARCELINA)
 # "binance_Mariusz_ro_api" (MARIUSZ)
 # }
-PAUSE_SECONDS = 1.0
 MAX_RETRIES = 3
+# Deposits and withdrawals change status after their time window ended, so
+# windows are cached only days after they closed and when every item is final
+TRANSFER_SETTLE_MS = 7 * 86_400_000
+DEPOSIT_FINAL_STATUSES = {1, 2, 7}  # success, rejected, wrong deposit
+WITHDRAW_FINAL_STATUSES = {1, 3, 5, 6}  # cancelled, rejected, failure, completed
+logger = get_logger(__name__)
+row_logger = get_row_logger(__name__)
+# Length of kline intervals; a kline range is immutable once its last candle closed
+KLINE_INTERVAL_MS = {
+    "1s": 1_000,
+    "1m": 60_000,
+    "3m": 180_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "30m": 1_800_000,
+    "1h": 3_600_000,
+    "2h": 7_200_000,
+    "4h": 14_400_000,
+    "6h": 21_600_000,
+    "8h": 28_800_000,
+    "12h": 43_200_000,
+    "1d": 86_400_000,
+    "3d": 259_200_000,
+    "1w": 604_800_000,
+    "1M": 2_678_400_000,
+}
 BACKOFF_FACTOR = 1.0
+XLSX_REQUIRED_COLUMNS = {
+    "Date(UTC)",
+    "Pair",
+    "Base Asset",
+    "Quote Asset",
+    "Type",
+    "Price",
+    "Amount",
+    "Total",
+    "Fee",
+    "Fee Coin",
+}
+# Column names usable as attributes of itertuples rows
+XLSX_COLUMN_NAMES = {
+    "Date(UTC)": "Date_UTC",
+    "Base Asset": "Base_Asset",
+    "Quote Asset": "Quote_Asset",
+    "Fee Coin": "Fee_Coin",
+}
+
+
+def _kline_value(entry: list, index: int, kind: type):
+    """A kline field as kind, None when the entry does not have it."""
+    if len(entry) <= index or entry[index] in ("", None):
+        return None
+    return kind(entry[index])
+
+
+def _load_symbols(db_session: crud.Session, pairs: pd.Series) -> dict[str, dict]:
+    """Symbols of all pairs of an export, read once before parsing its rows."""
+    symbols = {}
+    for pair in pairs.unique():
+        try:
+            symbols[pair] = crud.get_binance_symbol_dict(
+                db_session=db_session, symbol=pair
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=400, detail=f"Error parsing row: unknown pair {pair}: {e}"
+            )
+    return symbols
+
+
+def _open_xlsx(xlsx_file: BinaryIO, batch_size: int = XLSX_BATCH_SIZE) -> XlsxBatches:
+    try:
+        sheet = XlsxBatches(xlsx_file, batch_size)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error reading XLSX file: {e}")
+    if not XLSX_REQUIRED_COLUMNS.issubset(sheet.columns):
+        sheet.close()
+        missing = XLSX_REQUIRED_COLUMNS - set(sheet.columns)
+        raise HTTPException(
+            status_code=400, detail=f"Missing required columns: {missing}"
+        )
+    return sheet
+
+
+def _all_final(transfers, final_statuses: set[int]) -> bool:
+    """True for a list of deposits or withdrawals that will not change anymore."""
+    return isinstance(transfers, list) and all(
+        transfer.get("status") in final_statuses for transfer in transfers
+    )
+
+
+def _xlsx_pairs(df: pd.DataFrame) -> pd.Series:
+    return df["Base_Asset"].astype(str) + df["Quote_Asset"].astype(str)
+
+
+def _parsed_trade(
+    row_number: int,
+    trade_time_utc: datetime,
+    side: str,
+    base_currency: str,
+    quote_currency: str,
+    base_amount: Decimal,
+    quote_amount: Decimal,
+    price,
+    fee,
+    fee_currency: str,
+    user: str,
+) -> dict:
+    """Trade of an export row; row_number sets its millisecond offset."""
+    if side == "BUY":
+        bought_currency = base_currency
+        sold_currency = quote_currency
+        bought_amount = base_amount
+        sold_amount = quote_amount
+    if side == "SELL":
+        bought_currency = quote_currency
+        sold_currency = base_currency
+        bought_amount = quote_amount
+        sold_amount = base_amount
+    trade_str = {
+        "utc_time": trade_time_utc.strftime("%Y-%m-%d %H:%M:%S"),
+        "bought_currency": str(bought_currency),
+        "sold_currency": str(sold_currency),
+        "price": str(price),
+        "bought_amount": tools.string(bought_amount),
+        "sold_amount": tools.string(sold_amount),
+        "fee_currency": str(fee_currency),
+        "fee_amount": str(fee),
+        "original_id": "",
+        "id": "",
+        "exchange": "Binance",
+        "user": user,
+    }
+    row_logger.debug("Trade source for hash generation: %s", trade_str)
+    trade_hash = trade_ids.trade_id(trade_str)
+    parsed_trade: dict = trade_str | {
+        "utc_time": trade_time_utc + pd.Timedelta(milliseconds=row_number % 1000),
+        "price": Decimal(trade_str["price"]),
+        "bought_amount": Decimal(trade_str["bought_amount"]),
+        "sold_amount": Decimal(trade_str["sold_amount"]),
+        "fee_amount": Decimal(trade_str["fee_amount"]),
+        "id": trade_hash,
+    }
+    del parsed_trade["exchange"]
+    del parsed_trade["user"]
+    return parsed_trade
+
+
+def _parse_csv_rows(
+    rows: pd.DataFrame, first_row_number: int, symbols: dict[str, dict], user: str
+) -> list[dict]:
+    """Trades of a range of Binance CSV rows (run in import worker processes)."""
+    trades_data = []
+    times = pd.to_datetime(rows["Date_UTC"])
+    for row_number, row, trade_time_utc in zip(
+        count(first_row_number), rows.itertuples(), times
+    ):
+        row_logger.debug("CSV row: %s", row)
+        symbol_dict = symbols[row.Pair]
+        base_currency: str = symbol_dict.get("base_currency")
+        quote_currency: str = symbol_dict.get("quote_currency")
+        fee, fee_currency = tools.split_amount_currency(amount_currency_string=row.Fee)
+        trades_data.append(
+            _parsed_trade(
+                row_number,
+                trade_time_utc,
+                row.Side,
+                base_currency,
+                quote_currency,
+                Decimal(str(row.Executed).replace(base_currency, "")),
+                Decimal(str(row.Amount).replace(quote_currency, "")),
+                row.Price,
+                fee,
+                fee_currency,
+                user,
+            )
+        )
+    return trades_data
+
+
+def _parse_xlsx_rows(
+    rows: pd.DataFrame, first_row_number: int, symbols: dict[str, dict], user: str
+) -> list[dict]:
+    """Trades of a range of Binance XLSX rows (run in import worker processes)."""
+    trades_data = []
+    times = pd.to_datetime(rows["Date_UTC"])
+    for row_number, row, trade_time_utc in zip(
+        count(first_row_number), rows.itertuples(), times
+    ):
+        symbol_dict = symbols[str(row.Base_Asset) + str(row.Quote_Asset)]
+        row_logger.debug("Symbol: %s", symbol_dict)
+        trades_data.append(
+            _parsed_trade(
+                row_number,
+                trade_time_utc,
+                row.Type,
+                symbol_dict.get("base_currency"),
+                symbol_dict.get("quote_currency"),
+                Decimal(str(row.Amount)),
+                Decimal(str(row.Total)),
+                row.Price,
+                Decimal(str(row.Fee)),
+                row.Fee_Coin,
+                user,
+            )
+        )
+    return trades_data
 
 
 class BinanceService:
@@ -40,10 +251,18 @@ class BinanceService:
     def __init__(
         self,
         keyring_system_name=KEYRING_SYSTEM_NAME,
-        pause_seconds: float = PAUSE_SECONDS,
+        pause_seconds: float | None = None,
         max_retries: int = MAX_RETRIES,
         backoff_factor: float = BACKOFF_FACTOR,
+        limiter: RateLimiter | None = None,
     ):
+        if pause_seconds is not None:
+            warnings.warn(
+                "pause_seconds is deprecated and ignored, requests are paced by"
+                " the shared rate limiter.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
         self.keyring_system_name: str = keyring_system_name
         self.api_url = BINANCE_API_URL
         self.api_key: str = self._get_api_key()
@@ -52,6 +271,10 @@ class BinanceService:
         self.client: Spot = self._get_client(
             self._get_api_key(), self._get_api_secret()
         )
+        self.max_retries = int(max_retries)
+        self.backoff_factor = float(backoff_factor)
+        # Shared by all Binance callers in the process
+        self.limiter: RateLimiter = limiter or get_limiter("binance")
 
     def _get_api_key(self) -> str:
         """
@@ -81,10 +304,31 @@ class BinanceService:
             raise Exception("Username not found in keyring.")
 
     def _get_client(self, api_key: str, api_secret: str) -> Spot:
-        return Spot(api_key=api_key, api_secret=api_secret)
+        return Spot(api_key=api_key, api_secret=api_secret, show_limit_usage=True)
+
+    def _call(self, endpoint: str, method, **params):
+        """
+        Calls a Spot client method through the rate limiter.
+        Used weight reported by Binance is fed back to the limiter and 429
+        responses are retried once the limiter allows it.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(endpoint)
+            try:
+                with metrics.track_request("binance", endpoint):
+                    result = method(**params)
+            except ClientError as e:
+                self.limiter.update(e.header, e.status_code)
+                if e.status_code == 429 and attempt < self.max_retries:
+                    continue
+                raise
+            if isinstance(result, dict) and result.keys() == {"limit_usage", "data"}:
+                self.limiter.update(result["limit_usage"])
+                return result["data"]
+            return result
 
     def get_account_info(self):
-        return self.client.account()
+        return self._call("account", self.client.account)
 
     def get_klines(
         self,
@@ -99,31 +343,41 @@ class BinanceService:
             params["startTime"] = tools.convert_time_to_ms(start_time)
         if end_time:
             params["endTime"] = tools.convert_time_to_ms(end_time)
+        return cached_fetch(
+            "binance/klines",
+            params,
+            lambda: self._request_klines(params),
+            immutable=range_closed(
+                params.get("endTime"), KLINE_INTERVAL_MS.get(interval, 2_678_400_000)
+            ),
+        )
 
+    def _request_klines(self, params: dict) -> List[Dict]:
         for attempt in range(RETRY_ATTEMPTS):
+            self.limiter.acquire("klines")
             try:
-                response = requests.get(
-                    url=f"{BINANCE_API_URL}klines", params=params, timeout=10
-                )
+                with metrics.track_request("binance", "klines"):
+                    response = requests.get(
+                        url=f"{BINANCE_API_URL}klines", params=params, timeout=10
+                    )
+                self.limiter.update(response.headers, response.status_code)
                 if response.status_code == 429:
-                    print("Rate limit exceeded (429). Waiting before retry...")
-                    time.sleep(2**attempt)  # exponential backoff
+                    # The limiter holds back every caller until Retry-After
+                    logger.warning("Rate limit exceeded (429). Waiting before retry...")
                     continue
                 response.raise_for_status()
-                data = response.json()
-                print(f"Type of response.json(): {type(data)}")
-                return data
+                return response.json()
             except (ConnectionError, Timeout) as e:
-                print(f"Network error: {e}. Retrying...")
+                logger.warning("Network error: %s. Retrying...", e)
                 time.sleep(2**attempt)
             except HTTPError as e:
-                print(f"HTTP error: {e}")
+                logger.error("HTTP error: %s", e)
                 raise
             except ValueError as e:
-                print(f"Error parsing response JSON: {e}")
+                logger.error("Error parsing response JSON: %s", e)
                 raise
             except RequestException as e:
-                print(f"Unexpected request error: {e}")
+                logger.error("Unexpected request error: %s", e)
                 raise
         raise RuntimeError(
             f"Failed to fetch data from Binance after " f"{RETRY_ATTEMPTS} attempts."
@@ -144,6 +398,11 @@ class BinanceService:
                         open_time_ms / 1000, timezone.utc
                     ).replace(second=0, microsecond=0, tzinfo=None),
                     "price": float(open_price_str),
+                    "high": _kline_value(entry, 2, float),
+                    "low": _kline_value(entry, 3, float),
+                    "close": _kline_value(entry, 4, float),
+                    "volume": _kline_value(entry, 5, float),
+                    "trade_count": _kline_value(entry, 8, int),
                     "source": "binance",
                 }
             )
@@ -186,15 +445,17 @@ class BinanceService:
             if len(data) < batch_size:
                 break
             last_open_time_ms = data[0][0]
-            print(f"len(data): {len(data)}")
-            print(f"data[0]: {data[0]}")
-            print(f"data[-1]: {data[-1]}")
-            print(f"Last open time in ms: {last_open_time_ms}")
+            logger.debug(
+                "Fetched %d klines of %s, first open time: %s, last: %s",
+                len(data),
+                symbol,
+                data[0][0],
+                data[-1][0],
+            )
             end_time = datetime.fromtimestamp(
                 last_open_time_ms / 1000, timezone.utc
             ) - timedelta(minutes=1)
             requests_made += 1
-            time.sleep(0.5)
 
     def fetch_all_trades_for_symbol(
         self, symbol, start_time=None, end_time=None, limit=1000
@@ -215,10 +476,8 @@ class BinanceService:
             if len(batch) < limit:
                 break
             from_id = batch[-1]["id"] + 1
-            time.sleep(0.5)  # to respect rate limits
-        print(f"Fetched {len(trades)} trades for symbol {symbol}.")
+        logger.info("Fetched %d trades for symbol %s.", len(trades), symbol)
         if not trades:
-            print(f"No trades found for symbol {symbol}.")
             return []
         return trades
 
@@ -234,8 +493,13 @@ class BinanceService:
                 params["startTime"] = start_time
             if end_time:
                 params["endTime"] = end_time
-            trades_raw = self.client.my_trades(**params)
-            print(f"raw trades: {trades_raw}")
+            trades_raw = cached_fetch(
+                "binance/myTrades",
+                params | {"user": self.user},
+                lambda: self._call("myTrades", self.client.my_trades, **params),
+                immutable=range_closed(end_time),
+            )
+            logger.debug("Fetched %d raw trades of %s", len(trades_raw), symbol)
             for trade in trades_raw:
                 trades.append(
                     {
@@ -276,15 +540,31 @@ class BinanceService:
     def get_deposit_history(
         self, asset: str = None, start_time: int = None, end_time: int = None
     ):
-        return self.client.deposit_history(
-            asset=asset, startTime=start_time, endTime=end_time
+        params = {"asset": asset, "startTime": start_time, "endTime": end_time}
+        return cached_fetch(
+            "binance/deposit_history",
+            params | {"user": self.user},
+            lambda: self._call(
+                "deposit_history", self.client.deposit_history, **params
+            ),
+            immutable=range_closed(end_time, TRANSFER_SETTLE_MS),
+            cacheable=lambda deposits: _all_final(deposits, DEPOSIT_FINAL_STATUSES),
         )
 
     def get_withdraw_history(
         self, asset: str = None, start_time: int = None, end_time: int = None
     ):
-        return self.client.withdraw_history(
-            asset=asset, startTime=start_time, endTime=end_time
+        params = {"asset": asset, "startTime": start_time, "endTime": end_time}
+        return cached_fetch(
+            "binance/withdraw_history",
+            params | {"user": self.user},
+            lambda: self._call(
+                "withdraw_history", self.client.withdraw_history, **params
+            ),
+            immutable=range_closed(end_time, TRANSFER_SETTLE_MS),
+            cacheable=lambda withdrawals: _all_final(
+                withdrawals, WITHDRAW_FINAL_STATUSES
+            ),
         )
 
     def get_all_deposits(
@@ -319,25 +599,25 @@ class BinanceService:
                 start_time = earliest_dt
             end_time_ms = int(end_time.timestamp() * 1000)
             start_time_ms = int(start_time.timestamp() * 1000)
-            print(
-                f"Fetching deposits: page {page}, "
-                f"{start_time.date()} to {end_time.date()} ..."
+            logger.info(
+                "Fetching deposits: page %d, %s to %s ...",
+                page,
+                start_time.date(),
+                end_time.date(),
             )
-            deposits = self.client.deposit_history(
-                asset=asset, startTime=start_time_ms, endTime=end_time_ms
+            deposits = self.get_deposit_history(
+                asset=asset, start_time=start_time_ms, end_time=end_time_ms
             )
-            print(
-                f"  Found {len(deposits) if deposits else 0} "
-                f"deposits in this window."
+            logger.info(
+                "Found %d deposits in this window.", len(deposits) if deposits else 0
             )
             if deposits:
                 all_deposits.extend(deposits)
             if start_time == earliest_dt:
-                print("Reached earliest date, stopping.")
+                logger.info("Reached earliest date, stopping.")
                 break
             page += 1
-            time.sleep(0.5)
-        print(f"Total deposits fetched: {len(all_deposits)}")
+        logger.info("Total deposits fetched: %d", len(all_deposits))
         return {
             "status": "success",
             "count": len(all_deposits),
@@ -369,25 +649,26 @@ class BinanceService:
                 start_time = earliest_dt
             end_time_ms = int(end_time.timestamp() * 1000)
             start_time_ms = int(start_time.timestamp() * 1000)
-            print(
-                f"Fetching withdrawals: page {page}, "
-                f"{start_time.date()} to {end_time.date()} ..."
+            logger.info(
+                "Fetching withdrawals: page %d, %s to %s ...",
+                page,
+                start_time.date(),
+                end_time.date(),
             )
-            withdrawals = self.client.withdraw_history(
-                asset=asset, startTime=start_time_ms, endTime=end_time_ms
+            withdrawals = self.get_withdraw_history(
+                asset=asset, start_time=start_time_ms, end_time=end_time_ms
             )
-            print(
-                f"  Found {len(withdrawals) if withdrawals else 0} "
-                "withdrawals in this window."
+            logger.info(
+                "Found %d withdrawals in this window.",
+                len(withdrawals) if withdrawals else 0,
             )
             if withdrawals:
                 all_withdrawals.extend(withdrawals)
             if start_time == earliest_dt:
-                print("Reached earliest date, stopping.")
+                logger.info("Reached earliest date, stopping.")
                 break
             page += 1
-            time.sleep(0.5)
-        print(f"Total withdrawals fetched: {len(all_withdrawals)}")
+        logger.info("Total withdrawals fetched: %d", len(all_withdrawals))
         return {
             "status": "success",
             "count": len(all_withdrawals),
@@ -398,7 +679,7 @@ class BinanceService:
         """
         Fetches small-balance (dust) conversion history from Binance.
         """
-        return self.client.dust_log()
+        return self._call("dust_log", self.client.dust_log)
 
     def get_lending_interest_history(
         self,
@@ -420,7 +701,11 @@ class BinanceService:
             params["startTime"] = start_time
         if end_time:
             params["endTime"] = end_time
-        return self.client.get_flexible_rewards_history(**params)
+        return self._call(
+            "flexible_rewards_history",
+            self.client.get_flexible_rewards_history,
+            **params,
+        )
 
     def get_flexible_redemption_record(
         self,
@@ -449,7 +734,11 @@ class BinanceService:
         if end_time:
             params["endTime"] = end_time
 
-        return self.client.get_flexible_redemption_record(**params)
+        return self._call(
+            "flexible_redemption_record",
+            self.client.get_flexible_redemption_record,
+            **params,
+        )
 
     def get_flexible_product_position(self, asset: str = None):
         """
@@ -458,21 +747,25 @@ class BinanceService:
         params = {}
         if asset:
             params["asset"] = asset
-        return self.client.get_flexible_product_position(**params)
+        return self._call(
+            "flexible_product_position",
+            self.client.get_flexible_product_position,
+            **params,
+        )
 
     def get_exchange_info(self) -> dict:
         """
         Fetches exchange information from Binance.
         This includes trading pairs, limits, and other exchange details.
         """
-        return self.client.exchange_info()
+        return self._call("exchangeInfo", self.client.exchange_info)
 
     def get_symbols(self) -> list[dict]:
         """
         Fetches exchange information from Binance.
         This includes trading pairs, limits, and other exchange details.
         """
-        return self.client.exchange_info()["symbols"]
+        return self.get_exchange_info()["symbols"]
 
     def get_base_currency(self, symbol_dict: dict) -> str | None:
         """
@@ -520,15 +813,23 @@ class BinanceService:
                     "fee": str(row["Fee"]),
                 }
                 records.append(trade)
-                print(f"Trade hash: {tools.generate_hash(str(trade))}")
+                row_logger.debug("Parsed CSV trade: %s", trade)
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Error parsing row: {e}")
         return records
 
     def parse_trades_from_csv(
-        self, db_session: crud.Session, csv_file: bytes, user: str
+        self,
+        db_session: crud.Session,
+        csv_file: bytes,
+        user: str,
+        first_row_number: int = 1,
     ) -> list[dict]:
-        """Imports trades from a Binance CSV file into the database."""
+        """
+        Imports trades from a Binance CSV file into the database.
+        first_row_number is the number of the first row in the original export
+        when csv_file holds only its tail.
+        """
         try:
             df = pd.read_csv(StringIO(csv_file.decode("utf-8")))
         except Exception as e:
@@ -548,167 +849,78 @@ class BinanceService:
                 status_code=400, detail=f"Missing required columns: {missing}"
             )
         df = df.rename(columns={"Date(UTC)": "Date_UTC"})
-        trades_data = []
-        for row_number, row in enumerate(df.itertuples(), start=1):
-            print(row)
-            try:
-                symbol_dict: dict = crud.get_binance_symbol_dict(
-                    db_session=db_session, symbol=row.Pair
-                )
-                base_currency: str = self.get_base_currency(symbol_dict=symbol_dict)
-                quote_currency: str = self.get_quote_currency(symbol_dict=symbol_dict)
-                quote_amount = Decimal(str(row.Amount).replace(quote_currency, ""))
-                base_amount = Decimal(str(row.Executed).replace(base_currency, ""))
-                fee, fee_currency = tools.split_amount_currency(
-                    amount_currency_string=row.Fee
-                )
-                if row.Side == "BUY":
-                    bought_currency = base_currency
-                    sold_currency = quote_currency
-                    bought_amount = base_amount
-                    sold_amount = quote_amount
-                if row.Side == "SELL":
-                    bought_currency = quote_currency
-                    sold_currency = base_currency
-                    bought_amount = quote_amount
-                    sold_amount = base_amount
-                trade_time_utc: datetime = pd.to_datetime(row.Date_UTC)
-                trade_str = {
-                    "utc_time": trade_time_utc.strftime("%Y-%m-%d %H:%M:%S"),
-                    "bought_currency": str(bought_currency),
-                    "sold_currency": str(sold_currency),
-                    "price": str(row.Price),
-                    "bought_amount": tools.string(bought_amount),
-                    "sold_amount": tools.string(sold_amount),
-                    "fee_currency": str(fee_currency),
-                    "fee_amount": str(fee),
-                    "original_id": "",
-                    "id": "",
-                    "exchange": "Binance",
-                    "user": user,
-                }
-                print(f"Trade source for hash generation: {trade_str}")
-                trade_hash = tools.generate_hash(input_dict=trade_str)
-                parsed_trade: dict = trade_str | {
-                    "utc_time": trade_time_utc
-                    + pd.Timedelta(milliseconds=row_number % 1000),
-                    "price": Decimal(trade_str["price"]),
-                    "bought_amount": Decimal(trade_str["bought_amount"]),
-                    "sold_amount": Decimal(trade_str["sold_amount"]),
-                    "fee_amount": Decimal(trade_str["fee_amount"]),
-                    "id": trade_hash,
-                }
-                del parsed_trade["exchange"]
-                del parsed_trade["user"]
-                trades_data.append(parsed_trade)
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Error parsing row: {e}")
-        print(f"First 5: {trades_data[:5]}")
-        print(f"Last 5: {trades_data[-5:]}")
+        symbols = _load_symbols(db_session, df["Pair"])
+        try:
+            trades_data = parallel_parsing.parse_in_parallel(
+                _parse_csv_rows,
+                df,
+                first_row_number=first_row_number,
+                symbols=symbols,
+                user=user,
+            )
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error parsing row: {e}")
+        logger.debug("First 5: %s, last 5: %s", trades_data[:5], trades_data[-5:])
+        metrics.count_rows("binance_csv", parsed=len(trades_data))
         return trades_data
 
     def parse_trades_from_xlsx(
         self, db_session: crud.Session, xlsx_file: bytes, user: str
     ) -> list[dict]:
         """Imports trades from a Binance XLSX file into the database."""
+        with _open_xlsx(BytesIO(xlsx_file)) as sheet:
+            frames = list(sheet)
+        df = pd.concat(frames) if frames else pd.DataFrame(columns=sheet.columns)
+        df = df.rename(columns=XLSX_COLUMN_NAMES)
+        symbols = _load_symbols(db_session, _xlsx_pairs(df))
         try:
-            df = pd.read_excel(BytesIO(xlsx_file), engine="openpyxl")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error reading CSV file: {e}")
-        required_columns = {
-            "Date(UTC)",
-            "Pair",
-            "Base Asset",
-            "Quote Asset",
-            "Type",
-            "Price",
-            "Amount",
-            "Total",
-            "Fee",
-            "Fee Coin",
-        }
-        if not required_columns.issubset(df.columns):
-            missing = required_columns - set(df.columns)
-            raise HTTPException(
-                status_code=400, detail=f"Missing required columns: {missing}"
+            trades_data = parallel_parsing.parse_in_parallel(
+                _parse_xlsx_rows, df, symbols=symbols, user=user
             )
-        df = df.rename(columns={"Date(UTC)": "Date_UTC"})
-        df = df.rename(columns={"Base Asset": "Base_Asset"})
-        df = df.rename(columns={"Quote Asset": "Quote_Asset"})
-        df = df.rename(columns={"Fee Coin": "Fee_Coin"})
-        trades_data = []
-        for row_number, row in enumerate(df.itertuples(), start=1):
-            # print(row)
-            # print(row.Pair)
-            try:
-                symbol_dict: dict = crud.get_binance_symbol_dict(
-                    db_session=db_session,
-                    symbol=str(row.Base_Asset) + str(row.Quote_Asset),
-                )
-                print(symbol_dict)
-                base_currency: str = self.get_base_currency(symbol_dict=symbol_dict)
-                quote_currency: str = self.get_quote_currency(symbol_dict=symbol_dict)
-                base_amount = Decimal(str(row.Amount))
-                quote_amount = Decimal(str(row.Total))
-                fee = Decimal(str(row.Fee))
-                fee_currency = row.Fee_Coin
-                if row.Type == "BUY":
-                    bought_currency = base_currency
-                    sold_currency = quote_currency
-                    bought_amount = base_amount
-                    sold_amount = quote_amount
-                if row.Type == "SELL":
-                    bought_currency = quote_currency
-                    sold_currency = base_currency
-                    bought_amount = quote_amount
-                    sold_amount = base_amount
-                trade_time_utc: datetime = pd.to_datetime(row.Date_UTC)
-                trade_str = {
-                    "utc_time": trade_time_utc.strftime("%Y-%m-%d %H:%M:%S"),
-                    "bought_currency": str(bought_currency),
-                    "sold_currency": str(sold_currency),
-                    "price": str(row.Price),
-                    "bought_amount": tools.string(bought_amount),
-                    "sold_amount": tools.string(sold_amount),
-                    "fee_currency": str(fee_currency),
-                    "fee_amount": str(fee),
-                    "original_id": "",
-                    "id": "",
-                    "exchange": "Binance",
-                    "user": user,
-                }
-                # print(f"Trade source for hash generation: {trade_str}")
-                trade_hash = tools.generate_hash(input_dict=trade_str)
-                parsed_trade: dict = trade_str | {
-                    "utc_time": trade_time_utc
-                    + pd.Timedelta(milliseconds=row_number % 1000),
-                    "price": Decimal(trade_str["price"]),
-                    "bought_amount": Decimal(trade_str["bought_amount"]),
-                    "sold_amount": Decimal(trade_str["sold_amount"]),
-                    "fee_amount": Decimal(trade_str["fee_amount"]),
-                    "id": trade_hash,
-                }
-                del parsed_trade["exchange"]
-                del parsed_trade["user"]
-                trades_data.append(parsed_trade)
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Error parsing row: {e}")
-        print(f"First 5: {trades_data[:5]}")
-        print(f"Last 5: {trades_data[-5:]}")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error parsing row: {e}")
+        logger.debug("First 5: %s, last 5: %s", trades_data[:5], trades_data[-5:])
+        metrics.count_rows("binance_xlsx", parsed=len(trades_data))
         return trades_data
 
+    def iter_trades_from_xlsx(
+        self,
+        db_session: crud.Session,
+        xlsx_file: BinaryIO,
+        user: str,
+        batch_size: int = XLSX_BATCH_SIZE,
+    ) -> Iterator[list[dict]]:
+        """
+        Trades of a Binance XLSX file in batches of batch_size rows, read as
+        a stream; for exports too large to load at once.
+        """
+        symbols: dict[str, dict] = {}
+        with _open_xlsx(xlsx_file, batch_size) as sheet:
+            for df in sheet:
+                df = df.rename(columns=XLSX_COLUMN_NAMES)
+                pairs = _xlsx_pairs(df)
+                symbols |= _load_symbols(db_session, pairs[~pairs.isin(list(symbols))])
+                try:
+                    trades_data = _parse_xlsx_rows(df, df.index[0] + 1, symbols, user)
+                except Exception as e:
+                    raise HTTPException(
+                        status_code=400, detail=f"Error parsing row: {e}"
+                    )
+                metrics.count_rows("binance_xlsx", parsed=len(trades_data))
+                yield trades_data
+
     def parse_trades_from_api(
         self, db_session: crud.Session, api_trades: list[dict], user: str
     ) -> list[dict]:
         """Imports trades from a Binance API response into the database."""
         trades_data = []
         for trade_number, trade in enumerate(api_trades, start=1):
-            print(f"Trade: {trade}")
+            row_logger.debug("API trade: %s", trade)
             try:
                 symbol_dict: dict = crud.get_binance_symbol_dict(
                     db_session=db_session, symbol=trade["symbol"]
                 )
-                print(symbol_dict)
+                row_logger.debug("Symbol: %s", symbol_dict)
                 base_currency: str = self.get_base_currency(symbol_dict=symbol_dict)
                 quote_currency: str = self.get_quote_currency(symbol_dict=symbol_dict)
                 base_amount = Decimal(str(trade["qty"]))
@@ -740,8 +952,8 @@ class BinanceService:
                     "exchange": "Binance",
                     "user": user,
                 }
-                print(f"Trade source for hash generation: {trade_str}")
-                trade_hash = tools.generate_hash(input_dict=trade_str)
+                row_logger.debug("Trade source for hash generation: %s", trade_str)
+                trade_hash = trade_ids.trade_id(trade_str)
                 parsed_trade: dict = trade_str | {
                     "utc_time": trade_time_utc
                     + pd.Timedelta(milliseconds=trade_number % 1000),
@@ -757,9 +969,9 @@ class BinanceService:
                 trades_data.append(parsed_trade)
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Error parsing row: {e}")
-        print(f"First 5: {trades_data[:5]}")
-        print(f"Last 5: {trades_data[-5:]}")
+        logger.debug("First 5: %s, last 5: %s", trades_data[:5], trades_data[-5:])
+        metrics.count_rows("binance_api", parsed=len(trades_data))
         return trades_data
 
     def get_all_order_list(self):
-        return self.client.account()
+        return self._call("account", self.client.account)
@@ -0,0 +1,320 @@
+"""
+Memory-mapped column store of candles, an optional backend for reading
+long series (years of 1m candles) without building millions of ORM rows.
+Opt-in: enabled when CANDLE_ARCHIVE_PATH points to a directory.
+
+Every (symbol, interval) series is one file: a small index header (row
+count, capacity, first and last open time) followed by the columns time
+(int64 epoch ms), open, high, low, close and volume (float64), each
+preallocated for capacity rows. Newer candles are written in place after
+the last one; a full file or older candles make the series be written
+again with doubled capacity. Reads map the file and slice the columns by
+time range without copying.
+
+A series is built in full from the database on its first use (or with
+python -m app.candle_archive SYMBOL INTERVAL) and from then on kept in sync
+by the candle ingest path. Candles of other series stay in the database
+only, so an archived series is never missing older candles.
+"""
+
+import argparse
+import os
+import struct
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, NamedTuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import models
+from app.database import Database
+from app.logging_config import get_logger
+
+CANDLE_ARCHIVE_ENV = "CANDLE_ARCHIVE_PATH"
+MAGIC = b"CANDLES1"
+# Magic, row count, capacity, first and last open time (epoch ms)
+HEADER = struct.Struct("<8sqqqq")
+HEADER_SIZE = 64
+VALUE_COLUMNS = ("open", "high", "low", "close", "volume")
+MIN_CAPACITY = 1024
+BUILD_CHUNK_ROWS = 100_000
+logger = get_logger(__name__)
+
+
+class CandleSeries(NamedTuple):
+    """Columns of a series sorted by time; views of the mapped file."""
+
+    times: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def between(
+        self, start_ms: int | None = None, end_ms: int | None = None
+    ) -> "CandleSeries":
+        """Candles opened from start_ms to end_ms (inclusive), without copying."""
+        start = 0 if start_ms is None else np.searchsorted(self.times, start_ms)
+        stop = (
+            len(self.times)
+            if end_ms is None
+            else np.searchsorted(self.times, end_ms, side="right")
+        )
+        return CandleSeries(*(column[start:stop] for column in self))
+
+
+def _epoch_ms(times: Iterable) -> np.ndarray:
+    """Naive datetimes of the database (UTC) as int64 epoch ms."""
+    return pd.DatetimeIndex(list(times)).as_unit("ms").asi8
+
+
+def _sorted_unique(times: np.ndarray, values: np.ndarray):
+    """Rows sorted by time; of rows with the same time the last one is kept."""
+    order = np.argsort(times, kind="stable")
+    times, values = times[order], values[order]
+    last = np.append(times[1:] != times[:-1], True)
+    return times[last], values[last]
+
+
+def _capacity(rows: int) -> int:
+    return max(MIN_CAPACITY, 1 << max(rows - 1, 0).bit_length())
+
+
+class CandleArchive:
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+
+    def path(self, symbol: str, interval: str) -> Path:
+        return self.directory / f"{symbol}-{interval}.candles"
+
+    def has_series(self, symbol: str, interval: str) -> bool:
+        return self.path(symbol, interval).exists()
+
+    def clear(self) -> None:
+        """Drops all series, e.g. after candles were stored around the archive."""
+        with self._lock:
+            for path in self.directory.glob("*.candles"):
+                path.unlink()
+
+    @staticmethod
+    def _header(path: Path) -> tuple[int, int, int, int]:
+        with open(path, "rb") as file:
+            magic, *header = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Not a candle archive file: {path}")
+        return tuple(header)
+
+    def read(
+        self,
+        symbol: str,
+        interval: str,
+        start_ms: int | None = None,
+        end_ms: int | None = None,
+    ) -> CandleSeries | None:
+        """Candles of a series in a time range, None when it is not archived."""
+        path = self.path(symbol, interval)
+        with self._lock:
+            if not path.exists():
+                return None
+            count, capacity, _, _ = self._header(path)
+            mapped = np.memmap(path, dtype=np.uint8, mode="r")
+        columns = [
+            np.frombuffer(
+                mapped,
+                dtype=np.int64 if position == 0 else np.float64,
+                count=count,
+                offset=HEADER_SIZE + position * capacity * 8,
+            )
+            for position in range(1 + len(VALUE_COLUMNS))
+        ]
+        return CandleSeries(*columns).between(start_ms, end_ms)
+
+    def _write(self, path: Path, times: np.ndarray, values: np.ndarray) -> None:
+        """Writes a series to a new file replacing the old one atomically."""
+        capacity = _capacity(len(times))
+        temporary = path.with_suffix(".tmp")
+        with open(temporary, "wb") as file:
+            file.write(
+                HEADER.pack(MAGIC, len(times), capacity, times[0], times[-1]).ljust(
+                    HEADER_SIZE, b"\0"
+                )
+            )
+            for position, column in enumerate([times, *values.T]):
+                file.seek(HEADER_SIZE + position * capacity * 8)
+                file.write(np.ascontiguousarray(column).tobytes())
+            file.truncate(HEADER_SIZE + (1 + len(VALUE_COLUMNS)) * capacity * 8)
+        os.replace(temporary, path)
+
+    def append(
+        self, symbol: str, interval: str, times: np.ndarray, values: np.ndarray
+    ) -> None:
+        """
+        Stores candles given as epoch ms times and rows of VALUE_COLUMNS;
+        candles with a stored time replace the stored ones.
+        """
+        if len(times) == 0:
+            return
+        times, values = _sorted_unique(
+            np.asarray(times, dtype=np.int64), np.asarray(values, dtype=np.float64)
+        )
+        path = self.path(symbol, interval)
+        with self._lock:
+            if not path.exists():
+                self._write(path, times, values)
+                return
+            count, capacity, first, last = self._header(path)
+            start = count - 1 if times[0] == last else count
+            if times[0] < last or start + len(times) > capacity:
+                stored = self.read(symbol, interval)
+                merged = _sorted_unique(
+                    np.concatenate([stored.times, times]),
+                    np.concatenate([np.column_stack(stored[1:]), values]),
+                )
+                # Copied; the old file is not mapped while it is replaced
+                del stored
+                self._write(path, *merged)
+                return
+            with open(path, "r+b") as file:
+                for position, column in enumerate([times, *values.T]):
+                    file.seek(HEADER_SIZE + (position * capacity + start) * 8)
+                    file.write(np.ascontiguousarray(column).tobytes())
+                # Rows are written before the header makes them visible
+                file.seek(0)
+                file.write(
+                    HEADER.pack(MAGIC, start + len(times), capacity, first, times[-1])
+                )
+
+    def store(self, candles: Iterable[dict]) -> None:
+        """Candle dicts of the ingest path written to their archived series."""
+        series: dict[tuple[str, str], list[dict]] = {}
+        for candle in candles:
+            series.setdefault((candle["symbol"], candle["interval"]), []).append(candle)
+        for (symbol, interval), rows in series.items():
+            if not self.has_series(symbol, interval):
+                continue
+            values = np.array(
+                [
+                    [row["price"], *(row.get(name) for name in VALUE_COLUMNS[1:])]
+                    for row in rows
+                ],
+                dtype=np.float64,
+            )
+            self.append(
+                symbol, interval, _epoch_ms(row["time"] for row in rows), values
+            )
+
+    def build_series(
+        self,
+        db_session: Session,
+        symbol: str,
+        interval: str,
+        chunk_rows: int = BUILD_CHUNK_ROWS,
+    ) -> int:
+        """Writes a series from all of its candles in the database."""
+        columns = [
+            getattr(models.PriceHistory, name)
+            for name in ("time", "price", *VALUE_COLUMNS[1:])
+        ]
+        stmt = (
+            select(*columns)
+            .where(
+                models.PriceHistory.symbol == symbol,
+                models.PriceHistory.interval == interval,
+            )
+            .order_by(models.PriceHistory.time)
+            .execution_options(yield_per=chunk_rows)
+        )
+        rows = 0
+        with self._lock:
+            self.path(symbol, interval).unlink(missing_ok=True)
+            for chunk in db_session.execute(stmt).partitions(chunk_rows):
+                times, *values = zip(*chunk)
+                self.append(
+                    symbol,
+                    interval,
+                    _epoch_ms(times),
+                    np.array(values, dtype=np.float64).T,
+                )
+                rows += len(chunk)
+        logger.info("Archived %d %s %s candles.", rows, symbol, interval)
+        return rows
+
+    def series(
+        self, db_session: Session, symbol: str, interval: str
+    ) -> CandleSeries | None:
+        """A whole series, built from the database first when not archived."""
+        if not self.has_series(symbol, interval):
+            self.build_series(db_session, symbol, interval)
+        return self.read(symbol, interval)
+
+
+@lru_cache()
+def get_candle_archive() -> CandleArchive | None:
+    """Process wide archive, or None when it is not enabled."""
+    path = os.getenv(CANDLE_ARCHIVE_ENV)
+    return CandleArchive(path) if path else None
+
+
+def load_candles(
+    db_session: Session,
+    symbol: str,
+    interval: str,
+    start_ms: int | None = None,
+    end_ms: int | None = None,
+) -> CandleSeries:
+    """Candles in a time range from the archive when enabled, else the database."""
+    archive = get_candle_archive()
+    if archive is not None:
+        series = archive.series(db_session, symbol, interval)
+        if series is not None:
+            return series.between(start_ms, end_ms)
+    stmt = (
+        select(
+            models.PriceHistory.time,
+            models.PriceHistory.price,
+            *(getattr(models.PriceHistory, name) for name in VALUE_COLUMNS[1:]),
+        )
+        .where(
+            models.PriceHistory.symbol == symbol,
+            models.PriceHistory.interval == interval,
+        )
+        .order_by(models.PriceHistory.time)
+    )
+    if start_ms is not None:
+        stmt = stmt.where(
+            models.PriceHistory.time
+            >= pd.Timestamp(start_ms, unit="ms").to_pydatetime()
+        )
+    if end_ms is not None:
+        stmt = stmt.where(
+            models.PriceHistory.time <= pd.Timestamp(end_ms, unit="ms").to_pydatetime()
+        )
+    rows = db_session.execute(stmt).all()
+    if not rows:
+        return CandleSeries(np.empty(0, dtype=np.int64), *[np.empty(0)] * 5)
+    times, *values = zip(*rows)
+    return CandleSeries(
+        _epoch_ms(times), *np.array(values, dtype=np.float64).reshape(5, -1)
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build archived candle series")
+    parser.add_argument("symbol")
+    parser.add_argument("intervals", nargs="+")
+    args = parser.parse_args(argv)
+    archive = get_candle_archive()
+    if archive is None:
+        parser.error(f"{CANDLE_ARCHIVE_ENV} is not set")
+    with Database().SessionLocal() as db_session:
+        for interval in args.intervals:
+            print(interval, archive.build_series(db_session, args.symbol, interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Derives candles of coarser intervals (1h, 4h, 1d, ...) from a stored finer
+series, so a single 1m backfill serves every interval without API requests.
+Derived candles are stored with source "resampled" and kept up to date
+incrementally: an update computes again only the last derived bucket (it
+may have been incomplete) and the buckets after it.
+"""
+
+from datetime import datetime
+from typing import Iterable, Iterator
+import pandas as pd
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from app import crud, models
+from app.binance_service import KLINE_INTERVAL_MS
+from app.logging_config import get_logger
+
+RESAMPLED_SOURCE = "resampled"
+CANDLE_COLUMNS = ("time", "price", *crud.CANDLE_VALUES)
+RESAMPLE_CHUNK_ROWS = 100_000
+# Binance weeks start on Monday; 1970-01-05 is the first Monday after the epoch
+WEEK_ORIGIN = pd.Timestamp("1970-01-05")
+EPOCH = pd.Timestamp(0)
+logger = get_logger(__name__)
+
+
+def can_resample(source_interval: str, interval: str) -> bool:
+    """Whether candles of interval are made of whole source_interval candles."""
+    source_ms = KLINE_INTERVAL_MS.get(source_interval)
+    interval_ms = KLINE_INTERVAL_MS.get(interval)
+    if source_ms is None or interval_ms is None:
+        return False
+    if interval == "1M":
+        # Months are made of whole days of any length
+        return source_interval != "1M" and KLINE_INTERVAL_MS["1d"] % source_ms == 0
+    return interval_ms > source_ms and interval_ms % source_ms == 0
+
+
+def bucket_starts(times: pd.DatetimeIndex, interval: str) -> pd.DatetimeIndex:
+    """Open times of the interval candles the given times fall in."""
+    if interval == "1M":
+        return times.to_period("M").to_timestamp()
+    step = pd.Timedelta(milliseconds=KLINE_INTERVAL_MS[interval])
+    origin = WEEK_ORIGIN if interval == "1w" else EPOCH
+    return origin + ((times - origin) // step) * step
+
+
+def resample_candles(candles: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    OHLCV candles of interval indexed by open time from finer candles with
+    CANDLE_COLUMNS. Candles stored before OHLCV only have the open price,
+    which stands in for their high, low and close.
+    """
+    candles = candles.sort_values("time", ignore_index=True)
+    price = candles["price"].astype("float64")
+    groups = pd.DataFrame(
+        {
+            "price": price,
+            "high": candles["high"].astype("float64").fillna(price),
+            "low": candles["low"].astype("float64").fillna(price),
+            "close": candles["close"].astype("float64").fillna(price),
+            "volume": candles["volume"].astype("float64"),
+            "trade_count": candles["trade_count"].astype("float64"),
+        }
+    ).groupby(bucket_starts(pd.DatetimeIndex(candles["time"]), interval).to_numpy())
+    return pd.DataFrame(
+        {
+            "price": groups["price"].first(),
+            "high": groups["high"].max(),
+            "low": groups["low"].min(),
+            "close": groups["close"].last(),
+            "volume": groups["volume"].sum(min_count=1),
+            "trade_count": groups["trade_count"].sum(min_count=1),
+        }
+    )
+
+
+def iter_resampled(
+    chunks: Iterable[list[tuple]], interval: str
+) -> Iterator[pd.DataFrame]:
+    """
+    resample_candles over finer candles read in time ordered chunks. Rows of
+    the last bucket of a chunk wait for the next one, which may continue it.
+    """
+    carry = pd.DataFrame(columns=CANDLE_COLUMNS)
+    for chunk in chunks:
+        candles = pd.DataFrame(chunk, columns=CANDLE_COLUMNS)
+        if len(carry):
+            candles = pd.concat([carry, candles], ignore_index=True)
+        starts = bucket_starts(pd.DatetimeIndex(candles["time"]), interval)
+        done = starts < starts[-1]
+        if done.any():
+            yield resample_candles(candles[done], interval)
+        carry = candles[~done]
+    if len(carry):
+        yield resample_candles(carry, interval)
+
+
+def _candle_dicts(resampled: pd.DataFrame, symbol: str, interval: str) -> list[dict]:
+    values = resampled.astype(object).where(resampled.notna(), None)
+    return [
+        {
+            "symbol": symbol,
+            "interval": interval,
+            "time": open_time.to_pydatetime(),
+            "price": price,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+            "trade_count": None if trade_count is None else int(trade_count),
+            "source": RESAMPLED_SOURCE,
+        }
+        for open_time, price, high, low, close, volume, trade_count in (
+            values.itertuples()
+        )
+    ]
+
+
+def _next_bucket(open_time: datetime, interval: str) -> datetime:
+    """Open time of the interval candle after the one open_time falls in."""
+    bucket = bucket_starts(pd.DatetimeIndex([open_time]), interval)[0]
+    if interval == "1M":
+        return (bucket + pd.DateOffset(months=1)).to_pydatetime()
+    return (
+        bucket + pd.Timedelta(milliseconds=KLINE_INTERVAL_MS[interval])
+    ).to_pydatetime()
+
+
+def update_resampled(
+    db_session: Session,
+    symbol: str,
+    interval: str,
+    source_interval: str = "1m",
+    chunk_rows: int = RESAMPLE_CHUNK_ROWS,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> int:
+    """
+    Derives the interval series of symbol from its source_interval candles.
+    Computed again are the last derived candle and the ones after it, the
+    buckets before the first derived candle when older source candles were
+    stored since (backfills), and the buckets of source candles opened from
+    start to end, e.g. the range of an import filling a gap. Candles of the
+    interval stored from other sources (API requests, dumps) are kept.
+    Returns the number of stored candles, the recomputed ones included.
+    """
+    if not can_resample(source_interval, interval):
+        raise ValueError(f"Cannot resample {source_interval} candles to {interval}.")
+    derived = (
+        models.PriceHistory.symbol == symbol,
+        models.PriceHistory.interval == interval,
+        models.PriceHistory.source == RESAMPLED_SOURCE,
+    )
+    source = (
+        models.PriceHistory.symbol == symbol,
+        models.PriceHistory.interval == source_interval,
+    )
+    first, last = db_session.execute(
+        select(
+            func.min(models.PriceHistory.time), func.max(models.PriceHistory.time)
+        ).where(*derived)
+    ).one()
+    # Bucket ranges [from, to) to compute, None for an open end
+    ranges: list[tuple[datetime | None, datetime | None]] = [(last, None)]
+    if first is not None:
+        first_source = db_session.scalar(
+            select(func.min(models.PriceHistory.time)).where(*source)
+        )
+        if first_source is not None and first_source < first:
+            ranges.append((None, first))
+        if start is not None:
+            ranges.append(
+                (
+                    bucket_starts(pd.DatetimeIndex([start]), interval)[
+                        0
+                    ].to_pydatetime(),
+                    _next_bucket(end or start, interval),
+                )
+            )
+    candles = []
+    for range_start, range_end in ranges:
+        bounds = []
+        if range_start is not None:
+            bounds.append(models.PriceHistory.time >= range_start)
+        if range_end is not None:
+            bounds.append(models.PriceHistory.time < range_end)
+        db_session.execute(delete(models.PriceHistory).where(*derived, *bounds))
+        stmt = (
+            select(*(getattr(models.PriceHistory, name) for name in CANDLE_COLUMNS))
+            .where(*source, *bounds)
+            .order_by(models.PriceHistory.time)
+            .execution_options(yield_per=chunk_rows)
+        )
+        # Stored once the source rows are read, upserts commit
+        candles.extend(
+            candle
+            for resampled in iter_resampled(
+                db_session.execute(stmt).partitions(chunk_rows), interval
+            )
+            for candle in _candle_dicts(resampled, symbol, interval)
+        )
+    stored = crud.upsert_candles(db_session, candles)
+    db_session.commit()
+    logger.info(
+        "Stored %d %s %s candles resampled from %s.",
+        stored,
+        symbol,
+        interval,
+        source_interval,
+    )
+    return stored
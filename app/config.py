@@ -1 +1,4 @@
 NUMBER_OF_MILISECONDS_IN_A_DAY = 86400000
+# Exchange specific tokens that are 1:1 equivalents of fiat currencies
+# (see KangaService.alias_currencies).
+FIAT_CURRENCY_ALIASES = {"oPLN": "PLN", "oEUR": "EUR", "oUSD": "USD"}
@@ -0,0 +1,262 @@
+import heapq
+import threading
+import time
+import weakref
+import numpy as np
+from typing import Iterable, NamedTuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app import models
+from app.config import FIAT_CURRENCY_ALIASES
+from app.price_lookup import PriceStore, to_epoch_ms
+
+# Relative cost of a conversion hop; Kanga markets are less liquid and
+# usually have sparser price history than Binance.
+EDGE_COSTS = {"identity": 0.0, "binance": 1.0, "nbp": 1.0, "kanga": 2.0}
+# Small extra cost per hop so that among equally priced paths the shortest wins.
+HOP_COST = 0.001
+# Stablecoins valued at par with the fiat currency they track.
+STABLECOIN_PEGS = {
+    "USDT": "USD",
+    "USDC": "USD",
+    "BUSD": "USD",
+    "FDUSD": "USD",
+    "TUSD": "USD",
+    "EURI": "EUR",
+}
+
+
+# Conversion services of this process, invalidated by the crud writers
+_conversion_services: "weakref.WeakSet[ConversionService]" = weakref.WeakSet()
+
+
+def markets_changed() -> None:
+    """Drops the graphs of every conversion service."""
+    for service in list(_conversion_services):
+        service.invalidate()
+
+
+def graph_version(db_session: Session, interval: str) -> tuple:
+    """Changes when symbols, tickers, candles of interval or rates are added."""
+
+    def scalar(column, *conditions):
+        return select(column).where(*conditions).scalar_subquery()
+
+    return tuple(
+        db_session.execute(
+            select(
+                scalar(func.count(models.BinanceSymbols.symbol)),
+                scalar(func.count(models.Tickers.ticker)),
+                scalar(
+                    func.max(models.PriceHistory.id),
+                    models.PriceHistory.interval == interval,
+                ),
+                scalar(func.max(models.DailyPriceHistory.id)),
+            )
+        ).one()
+    )
+
+
+class ConversionStep(NamedTuple):
+    """One hop of a path: 1 unit of source is worth factor units of target."""
+
+    kind: str
+    source: str
+    target: str
+    key: str
+    invert: bool
+
+
+class ConversionGraph:
+    """
+    Graph of currencies connected by markets (Binance symbols, Kanga tickers),
+    NBP rates and fixed identities (exchange aliases and stablecoin pegs).
+    Only markets with stored candles of the interval are connected, so the
+    cheapest path is one that can be priced.
+    """
+
+    def __init__(self):
+        # incoming[b] lists the steps a -> b, used to search from the target
+        self._incoming: dict[str, list[tuple[float, ConversionStep]]] = {}
+        self._paths: dict[str, dict[str, list[ConversionStep]]] = {}
+
+    def add_edge(self, kind: str, base: str, quote: str, key: str = "") -> None:
+        """Adds a market where 1 base costs price(key) quote, in both directions."""
+        if not base or not quote or base == quote:
+            return
+        cost = EDGE_COSTS[kind] + HOP_COST
+        self._incoming.setdefault(quote, []).append(
+            (cost, ConversionStep(kind, base, quote, key, False))
+        )
+        self._incoming.setdefault(base, []).append(
+            (cost, ConversionStep(kind, quote, base, key, True))
+        )
+        self._paths.clear()
+
+    @classmethod
+    def load(cls, db_session: Session, interval: str = "1d") -> "ConversionGraph":
+        graph = cls()
+        priced = set(
+            db_session.scalars(
+                select(models.PriceHistory.symbol)
+                .where(models.PriceHistory.interval == interval)
+                .distinct()
+            )
+        )
+        for alias, currency in FIAT_CURRENCY_ALIASES.items():
+            graph.add_edge("identity", alias, currency)
+        for stablecoin, currency in STABLECOIN_PEGS.items():
+            graph.add_edge("identity", stablecoin, currency)
+        symbols = db_session.execute(
+            select(
+                models.BinanceSymbols.symbol,
+                models.BinanceSymbols.base_currency,
+                models.BinanceSymbols.quote_currency,
+            )
+        )
+        for symbol, base, quote in symbols:
+            if symbol in priced:
+                graph.add_edge("binance", base, quote, symbol)
+        tickers = db_session.execute(
+            select(
+                models.Tickers.ticker,
+                models.Tickers.base_asset,
+                models.Tickers.quote_asset,
+            ).where(models.Tickers.venue == "Kanga")
+        )
+        for ticker, base, quote in tickers:
+            if ticker in priced:
+                graph.add_edge("kanga", base, quote, ticker)
+        nbp_currencies = db_session.execute(
+            select(
+                models.DailyPriceHistory.base_currency,
+                models.DailyPriceHistory.quote_currency,
+            ).distinct()
+        )
+        for base, quote in nbp_currencies:
+            graph.add_edge("nbp", base, quote, f"{base}/{quote}")
+        return graph
+
+    def _paths_to(self, target: str) -> dict[str, list[ConversionStep]]:
+        """Cheapest paths from every reachable currency to target (Dijkstra)."""
+        paths = self._paths.get(target)
+        if paths is not None:
+            return paths
+        distances = {target: 0.0}
+        next_step: dict[str, ConversionStep] = {}
+        queue = [(0.0, target)]
+        while queue:
+            distance, currency = heapq.heappop(queue)
+            if distance > distances[currency]:
+                continue
+            for cost, step in self._incoming.get(currency, ()):
+                candidate = distance + cost
+                if candidate < distances.get(step.source, float("inf")):
+                    distances[step.source] = candidate
+                    next_step[step.source] = step
+                    heapq.heappush(queue, (candidate, step.source))
+        paths = {target: []}
+        for currency in next_step:
+            path = []
+            node = currency
+            while node != target:
+                step = next_step[node]
+                path.append(step)
+                node = step.target
+            paths[currency] = path
+        self._paths[target] = paths
+        return paths
+
+    def path(self, asset: str, target: str) -> list[ConversionStep] | None:
+        return self._paths_to(target).get(asset)
+
+
+class ConversionService:
+    """Values vectors of (asset, time) pairs in a target currency."""
+
+    def __init__(self, price_store: PriceStore):
+        self.price_store = price_store
+        # interval -> (graph, version when loaded, time of the last check)
+        self._graphs: dict[str, tuple[ConversionGraph, tuple, float]] = {}
+        self._lock = threading.Lock()
+        _conversion_services.add(self)
+
+    def get_graph(self, db_session: Session, interval: str = "1d") -> ConversionGraph:
+        """
+        Cached graph of interval, reloaded when a check every check_seconds
+        of the price store finds markets or prices added since it was read.
+        """
+        with self._lock:
+            now = time.monotonic()
+            entry = self._graphs.get(interval)
+            if entry is not None:
+                graph, version, checked_at = entry
+                if now - checked_at < self.price_store.check_seconds:
+                    return graph
+                if graph_version(db_session, interval) == version:
+                    self._graphs[interval] = (graph, version, now)
+                    return graph
+            version = graph_version(db_session, interval)
+            graph = ConversionGraph.load(db_session, interval)
+            self._graphs[interval] = (graph, version, now)
+            return graph
+
+    def invalidate(self) -> None:
+        """Forgets the graphs, e.g. after symbols, tickers or candles changed."""
+        with self._lock:
+            self._graphs.clear()
+
+    def _step_factors(
+        self,
+        db_session: Session,
+        step: ConversionStep,
+        timestamps_ms: np.ndarray,
+        interval: str,
+    ) -> np.ndarray:
+        if step.kind == "identity":
+            return np.ones(len(timestamps_ms))
+        if step.kind == "nbp":
+            base, quote = step.key.split("/")
+            prices = self.price_store.rate_asof(db_session, base, quote, timestamps_ms)
+        else:
+            prices = self.price_store.asof(
+                db_session, step.key, interval, timestamps_ms
+            )
+        if step.invert:
+            with np.errstate(divide="ignore"):
+                return 1.0 / prices
+        return prices
+
+    def convert(
+        self,
+        db_session: Session,
+        assets: Iterable[str],
+        timestamps: Iterable,
+        target: str = "PLN",
+        interval: str = "1d",
+    ) -> np.ndarray:
+        """
+        Returns the value of one unit of each asset in target at each timestamp.
+        NaN marks assets without a path or without prices at that time.
+        """
+        assets = np.asarray(list(assets), dtype=object)
+        timestamps_ms = to_epoch_ms(timestamps)
+        if len(assets) != len(timestamps_ms):
+            raise ValueError("assets and timestamps must have the same length.")
+        result = np.full(len(assets), np.nan)
+        if not len(assets):
+            return result
+        graph = self.get_graph(db_session, interval)
+        unique_assets, inverse = np.unique(assets, return_inverse=True)
+        for position, asset in enumerate(unique_assets):
+            path = graph.path(asset, target)
+            if path is None:
+                continue
+            mask = inverse == position
+            factors = np.ones(int(mask.sum()))
+            for step in path:
+                factors *= self._step_factors(
+                    db_session, step, timestamps_ms[mask], interval
+                )
+            result[mask] = factors
+        return result
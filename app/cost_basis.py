@@ -0,0 +1,174 @@
+from collections import deque
+from decimal import Decimal
+from typing import Iterable, Iterator
+from app.config import FIAT_CURRENCY_ALIASES
+
+COST_BASIS_METHODS = ("FIFO", "LIFO", "AVERAGE")
+ZERO = Decimal(0)
+
+
+class CostBasisEngine:
+    """
+    Computes realized gains from trades streamed in utc_time order.
+
+    Open positions are kept per currency as a deque of [amount, cost] lots,
+    so memory grows with the number of open lots, not with the trade history.
+    Cost is expressed in quote_currency (and its exchange aliases, e.g. oPLN).
+    Crypto to crypto exchanges are not taxable events: the cost of the
+    consumed lots is carried over to the acquired currency.
+    """
+
+    def __init__(self, method: str = "FIFO", quote_currency: str = "PLN"):
+        method = method.upper()
+        if method not in COST_BASIS_METHODS:
+            raise ValueError(
+                f"Unknown cost basis method: {method}. "
+                f"Use one of {COST_BASIS_METHODS}."
+            )
+        self.method = method
+        self.quote_currency = quote_currency
+        self._quote_currencies = {quote_currency} | {
+            alias
+            for alias, currency in FIAT_CURRENCY_ALIASES.items()
+            if currency == quote_currency
+        }
+        self._lots: dict[str, deque] = {}
+
+    def is_quote(self, currency: str) -> bool:
+        return currency in self._quote_currencies
+
+    def _add_lot(self, currency: str, amount: Decimal, cost: Decimal) -> None:
+        if amount <= 0:
+            return
+        lots = self._lots.setdefault(currency, deque())
+        if self.method == "AVERAGE" and lots:
+            # Average cost keeps a single pooled lot per currency
+            lots[0][0] += amount
+            lots[0][1] += cost
+            return
+        lots.append([amount, cost])
+
+    def _consume(self, currency: str, amount: Decimal) -> tuple[Decimal, Decimal]:
+        """
+        Removes amount from the open lots of currency.
+        Returns cost of the consumed lots and the amount not covered by any lot.
+        """
+        lots = self._lots.get(currency)
+        cost = ZERO
+        remaining = amount
+        while remaining > 0 and lots:
+            lot = lots[-1] if self.method == "LIFO" else lots[0]
+            lot_amount, lot_cost = lot
+            if lot_amount <= remaining:
+                cost += lot_cost
+                remaining -= lot_amount
+                if self.method == "LIFO":
+                    lots.pop()
+                else:
+                    lots.popleft()
+                continue
+            part_cost = lot_cost * remaining / lot_amount
+            cost += part_cost
+            lot[0] = lot_amount - remaining
+            lot[1] = lot_cost - part_cost
+            remaining = ZERO
+        if lots is not None and not lots:
+            del self._lots[currency]
+        return cost, remaining
+
+    def process(self, trade) -> dict | None:
+        """
+        Applies a single trade (any object with Trades column attributes).
+        Returns the realized disposal record or None if nothing was realized.
+        """
+        bought_currency: str = trade.bought_currency
+        sold_currency: str = trade.sold_currency
+        bought_amount = Decimal(trade.bought_amount or 0)
+        sold_amount = Decimal(trade.sold_amount or 0)
+        fee_currency: str = trade.fee_currency
+        fee_amount = Decimal(trade.fee_amount or 0)
+        if not bought_amount and not sold_amount:
+            # Placeholder rows (e.g. Kanga "no trades for date" markers)
+            return None
+        if self.is_quote(bought_currency) and self.is_quote(sold_currency):
+            return None
+
+        net_bought = bought_amount
+        fee_cost = ZERO
+        if fee_amount:
+            if fee_currency == bought_currency:
+                net_bought -= fee_amount
+            elif self.is_quote(fee_currency):
+                fee_cost = fee_amount
+            else:
+                fee_cost, _ = self._consume(fee_currency, fee_amount)
+
+        if self.is_quote(sold_currency):
+            self._add_lot(bought_currency, net_bought, sold_amount + fee_cost)
+            return None
+
+        cost, unmatched = self._consume(sold_currency, sold_amount)
+        if not self.is_quote(bought_currency):
+            self._add_lot(bought_currency, net_bought, cost + fee_cost)
+            return None
+
+        cost += fee_cost
+        return {
+            "utc_time": trade.utc_time,
+            "trade_id": trade.id,
+            "currency": sold_currency,
+            "amount": sold_amount,
+            "proceeds": net_bought,
+            "cost": cost,
+            "gain": net_bought - cost,
+            "unmatched_amount": unmatched,
+        }
+
+    def run(self, trades: Iterable) -> Iterator[dict]:
+        """Processes trades in the given order, yielding realized disposals."""
+        for trade in trades:
+            disposal = self.process(trade)
+            if disposal is not None:
+                yield disposal
+
+    def open_positions(self) -> dict[str, dict]:
+        """Returns remaining amount and cost for every currency with open lots."""
+        positions = {}
+        for currency, lots in self._lots.items():
+            amount = sum((lot[0] for lot in lots), ZERO)
+            cost = sum((lot[1] for lot in lots), ZERO)
+            positions[currency] = {"amount": amount, "cost": cost}
+        return positions
+
+
+def summarize_disposals(
+    disposals: Iterable[dict], year: int | None = None, keep_limit: int = 0
+) -> dict:
+    """
+    Aggregates disposal records into totals per currency.
+    Only up to keep_limit individual disposals are kept in the result.
+    """
+    totals = {"proceeds": ZERO, "cost": ZERO, "gain": ZERO}
+    by_currency: dict[str, dict] = {}
+    kept: list[dict] = []
+    count = 0
+    for disposal in disposals:
+        if year is not None and disposal["utc_time"].year != year:
+            continue
+        count += 1
+        currency_totals = by_currency.setdefault(
+            disposal["currency"],
+            {"amount": ZERO, "proceeds": ZERO, "cost": ZERO, "gain": ZERO},
+        )
+        currency_totals["amount"] += disposal["amount"]
+        for key in totals:
+            totals[key] += disposal[key]
+            currency_totals[key] += disposal[key]
+        if len(kept) < keep_limit:
+            kept.append(disposal)
+    return {
+        "disposals_count": count,
+        **totals,
+        "by_currency": by_currency,
+        "disposals": kept,
+    }
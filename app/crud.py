@@ -1,10 +1,17 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, select
-from app import models
+from sqlalchemy import and_, insert, or_, select
+from app import conversion, metrics, models, price_lookup
+from app.candle_archive import get_candle_archive
 from app.tools import chunked
 from datetime import datetime, date
 from sqlalchemy.inspection import inspect
 from sqlalchemy.exc import IntegrityError
+from app.logging_config import get_logger
+from typing import Iterable
+
+logger = get_logger(__name__)
+# Candle values besides the open price; missing in candles stored before OHLCV
+CANDLE_VALUES = ("high", "low", "close", "volume", "trade_count")
 
 
 def candle_exists(
@@ -28,14 +35,82 @@ def create_candle(db_session: Session, candle: dict):
         interval=candle["interval"],
         time=candle["time"],
         price=candle["price"],
+        **{name: candle.get(name) for name in CANDLE_VALUES},
         source=candle.get("source", "binance"),
     )
     db_session.add(db_candle)
     db_session.commit()
     db_session.refresh(db_candle)
+    _archive_candles([candle])
+    _prices_changed([(candle["symbol"], candle["interval"])])
     return db_candle
 
 
+def _archive_candles(candles: list[dict]) -> None:
+    """Keeps the candle archive, when enabled, in sync with stored candles."""
+    archive = get_candle_archive()
+    if archive is not None:
+        archive.store(candles)
+
+
+def _prices_changed(series: Iterable[tuple[str, str]]) -> None:
+    """Drops the stored series from the price caches of this process."""
+    for symbol, interval in series:
+        price_lookup.series_changed(symbol, interval)
+    conversion.markets_changed()
+
+
+def upsert_candles(db_session: Session, candles: list[dict]) -> int:
+    """
+    Bulk stores candles skipping the ones already in the database and
+    repeats within candles (same symbol, interval and time). Existing times
+    are read with one query per series and all new candles are inserted
+    with a single executemany INSERT and commit.
+    """
+    series: dict[tuple[str, str], dict[datetime, dict]] = {}
+    for candle in candles:
+        key = (candle["symbol"], candle["interval"])
+        series.setdefault(key, {}).setdefault(candle["time"], candle)
+    new_candles = []
+    for (symbol, interval), by_time in series.items():
+        existing = set(
+            db_session.scalars(
+                select(models.PriceHistory.time).where(
+                    models.PriceHistory.symbol == symbol,
+                    models.PriceHistory.interval == interval,
+                    models.PriceHistory.time >= min(by_time),
+                    models.PriceHistory.time <= max(by_time),
+                )
+            )
+        )
+        new_candles.extend(
+            {
+                "symbol": candle["symbol"],
+                "interval": candle["interval"],
+                "time": candle["time"],
+                "price": candle["price"],
+                **{name: candle.get(name) for name in CANDLE_VALUES},
+                "source": candle.get("source", "binance"),
+            }
+            for candle_time, candle in sorted(by_time.items())
+            if candle_time not in existing
+        )
+    if new_candles:
+        # Core table insert: the ORM bulk path costs more than the INSERT itself
+        db_session.execute(insert(models.PriceHistory.__table__), new_candles)
+        db_session.commit()
+        _archive_candles(new_candles)
+        _prices_changed(
+            {(candle["symbol"], candle["interval"]) for candle in new_candles}
+        )
+    metrics.count_rows(
+        "binance_candles",
+        inserted=len(new_candles),
+        duplicate=len(candles) - len(new_candles),
+    )
+    return len(new_candles)
+
+
 def rate_exists(
     db_session: Session, base_currency: str, quote_currency: str, date: date
 ) -> bool:
@@ -62,9 +137,63 @@ def create_rate(db_session: Session, rate: dict):
     db_session.add(db_rate)
     db_session.commit()
     db_session.refresh(db_rate)
+    _prices_changed(
+        [(f"{db_rate.base_currency}/{db_rate.quote_currency}", "daily_rates")]
+    )
     return db_rate
 
 
+def upsert_rates(db_session: Session, rates: list[dict]) -> int:
+    """
+    Bulk stores daily rates skipping the ones already in the database.
+    Existing dates are read with one query per currency pair and all new
+    rates are inserted with a single commit.
+    """
+    pairs: dict[tuple[str, str], dict[date, dict]] = {}
+    for rate in rates:
+        rate_date = rate["date"]
+        if isinstance(rate_date, str):
+            rate_date = date.fromisoformat(rate_date)
+        key = (rate["base_currency"], rate["quote_currency"])
+        pairs.setdefault(key, {})[rate_date] = {**rate, "date": rate_date}
+    new_rates = []
+    for (base_currency, quote_currency), by_date in pairs.items():
+        existing = set(
+            db_session.scalars(
+                select(models.DailyPriceHistory.date).where(
+                    models.DailyPriceHistory.base_currency == base_currency,
+                    models.DailyPriceHistory.quote_currency == quote_currency,
+                    models.DailyPriceHistory.date >= min(by_date),
+                    models.DailyPriceHistory.date <= max(by_date),
+                )
+            )
+        )
+        new_rates.extend(
+            {
+                "base_currency": rate["base_currency"],
+                "quote_currency": rate["quote_currency"],
+                "date": rate["date"],
+                "price": rate["price"],
+                "source": rate["source"],
+            }
+            for rate_date, rate in sorted(by_date.items())
+            if rate_date not in existing
+        )
+    if new_rates:
+        db_session.execute(insert(models.DailyPriceHistory), new_rates)
+        db_session.commit()
+        _prices_changed(
+            {
+                (f"{rate['base_currency']}/{rate['quote_currency']}", "daily_rates")
+                for rate in new_rates
+            }
+        )
+    metrics.count_rows(
+        "nbp_rates", inserted=len(new_rates), duplicate=len(rates) - len(new_rates)
+    )
+    return len(new_rates)
+
+
 def binance_symbol_exists(db_session: Session, symbol: str) -> bool:
     return (
         db_session.query(models.BinanceSymbols)
@@ -99,7 +228,7 @@ def upsert_binance_symbols(db_session: Session, symbols_data: list[dict]) -> dic
     """Store the rates in the database."""
     saved_count = 0
     updated_count = 0
-    print(f"Storing {len(symbols_data)} Binance symbols in the database...")
+    logger.info("Storing %d Binance symbols in the database...", len(symbols_data))
     for symbol_data in symbols_data:
         if not binance_symbol_exists(db_session, symbol_data["symbol"]):
             create_binance_symbol(db_session, symbol_data)
@@ -114,6 +243,7 @@ def upsert_binance_symbols(db_session: Session, symbols_data: list[dict]) -> dic
                 setattr(existing_symbol, key, value)
             db_session.commit()
             updated_count += 1
+    conversion.markets_changed()
     return {
         "saved_symbols": saved_count,
         "updated_symbols": updated_count,
@@ -149,7 +279,7 @@ def upsert_tickers(db_session: Session, tickers: list, venue: str) -> dict:
     """Store the tickers in the database."""
     saved_count = 0
     updated_count = 0
-    print(f"Storing {len(tickers)} tickers in the database...")
+    logger.info("Storing %d tickers in the database...", len(tickers))
     for ticker in tickers:
         existing_ticker = get_ticker(db_session, ticker, venue)
         if existing_ticker is None:
@@ -160,6 +290,7 @@ def upsert_tickers(db_session: Session, tickers: list, venue: str) -> dict:
         existing_ticker.quote_asset = ticker.split("-")[1] if "-" in ticker else None
         db_session.commit()
         updated_count += 1
+    conversion.markets_changed()
     return {
         "saved_tickers": saved_count,
         "updated_tickers": updated_count,
@@ -242,7 +373,7 @@ def create_exchange_record(db_session: Session, name: str):
 
 def upsert_user(db_session: Session, name: str) -> int:
     """Store the tickers in the database."""
-    print(f"Adding {name} user to the database...")
+    logger.info("Adding %s user to the database...", name)
     existing_user = get_user(db_session=db_session, name=name)
     if existing_user is None:
         create_user_record(db_session=db_session, name=name)
@@ -253,7 +384,7 @@ def upsert_user(db_session: Session, name: str) -> int:
 
 def upsert_exchange(db_session: Session, name: str) -> int:
     """Store the exchange in the database."""
-    print(f"Adding {name} exchange to the database...")
+    logger.info("Adding %s exchange to the database...", name)
     existing_exchange = get_exchange(db_session=db_session, name=name)
     if existing_exchange is None:
         create_exchange_record(db_session=db_session, name=name)
@@ -316,7 +447,7 @@ def upsert_trade_records(
     db_session: Session, user: str, exchange: str, trades_data: list[dict]
 ) -> dict:
     """Store trades in the database using a single bulk insert for new records."""
-    print(f"Storing {len(trades_data)} trades in the database...")
+    logger.info("Storing %d trades in the database...", len(trades_data))
 
     # Build set of keys to check existing records in one query
 
@@ -332,7 +463,6 @@ def upsert_trade_records(
     # print(f"trades_data[0]: {trades_data[0]}")
     for trade in trades_data:
         if "id" not in trade or "original_id" not in trade:
-            print(trade)
             if "message" in trade:
                 return {"message": trade["message"]}
             raise ValueError(f"Trade data missing 'id' or 'original_id': {trade}")
@@ -340,7 +470,6 @@ def upsert_trade_records(
     existing_keys = set()
     existing_ids_empty_original = set()
     existing_ids_not_empty_original = set()
-    print(f"Checking existing trade records for {len(keys)} keys...")
     if keys:
         batch_size = 300
         for keys_chunk in chunked(keys, batch_size):
@@ -373,14 +502,12 @@ def upsert_trade_records(
             existing_ids_empty_original.update(set(rows_ids_empty_original))
             existing_ids_not_empty_original.update(set(rows_ids_not_empty_original))
 
-    print(f"Found {len(existing_keys)} existing trade records in the database.")
-    print(
-        f"Found {len(existing_ids_empty_original)} existing trade IDs "
-        "with empty original_id."
-    )
-    print(
-        f"Found {len(existing_ids_not_empty_original)} existing trade IDs "
-        "with non-empty original_id."
+    logger.info(
+        "Found %d existing trade records, %d IDs with empty original_id"
+        " and %d IDs with non-empty original_id.",
+        len(existing_keys),
+        len(existing_ids_empty_original),
+        len(existing_ids_not_empty_original),
     )
     # Prepare mappings for insertion (skip existing)
     to_insert = []
@@ -414,14 +541,14 @@ def upsert_trade_records(
         to_insert.append(trade)
     try:
         if duplicate:
-            print(f"Found {len(duplicate)} duplicate trades.")
+            logger.info("Found %d duplicate trades.", len(duplicate))
             # print(f"Duplicate trades: {duplicate}")
         if to_insert:
-            print(f"Inserting {len(to_insert)} new trades...")
+            logger.info("Inserting %d new trades...", len(to_insert))
             # print(f"Trades to insert: {to_insert}")
             db_session.bulk_insert_mappings(models.Trades, to_insert)
         if to_update:
-            print(f"Updating {len(to_update)} existing trades...")
+            logger.info("Updating %d existing trades...", len(to_update))
             # print(f"Trades to update: {to_update}")
             for trade in to_update:
                 row = (
@@ -438,11 +565,12 @@ def upsert_trade_records(
         db_session.commit()
     except IntegrityError as ie:
         db_session.rollback()
-        print(f"IntegrityError during upsert_trade_records: {ie}")
-        if duplicate:
-            print(f"Example of duplicate trade: {duplicate[0]}")
-        else:
-            print("No duplicate trades found.")
+        logger.error(
+            "IntegrityError during upsert_trade_records: %s. Example duplicate: %s",
+            ie,
+            duplicate[0] if duplicate else None,
+        )
+        metrics.count_rows(f"{exchange.lower()}_trades", failed=len(trades_data))
         return {
             "fetched_trades": len(trades_data),
             "to_insert_trades": len(to_insert),
@@ -452,6 +580,12 @@ def upsert_trade_records(
             "message": ie.args[0],
         }
 
+    metrics.count_rows(
+        f"{exchange.lower()}_trades",
+        inserted=len(to_insert),
+        updated=len(to_update),
+        duplicate=len(duplicate),
+    )
     return {
         "fetched_trades": len(trades_data),
         "inserted_trades": len(to_insert),
@@ -461,6 +595,48 @@ def upsert_trade_records(
     }
 
 
+def upsert_trade_batches(
+    db_session: Session, user: str, exchange: str, batches: Iterable[list[dict]]
+) -> dict:
+    """
+    upsert_trade_records of every batch of a streamed import, counts summed.
+    Stops at the first batch that fails.
+    """
+    totals: dict = {}
+    for trades_data in batches:
+        result = upsert_trade_records(db_session, user, exchange, trades_data)
+        for key, value in result.items():
+            if isinstance(value, int):
+                totals[key] = totals.get(key, 0) + value
+            else:
+                totals[key] = value
+        if "message" in result:
+            break
+    return totals or upsert_trade_records(db_session, user, exchange, [])
+
+
+def get_uploads(
+    db_session: Session, user: str, exchange: str, file_type: str, options: str = ""
+) -> list[models.Uploads]:
+    return list(
+        db_session.scalars(
+            select(models.Uploads).where(
+                models.Uploads.user == user,
+                models.Uploads.exchange == exchange,
+                models.Uploads.file_type == file_type,
+                models.Uploads.options == options,
+            )
+        )
+    )
+
+
+def create_upload(db_session: Session, upload_data: dict) -> models.Uploads:
+    db_upload = models.Uploads(**upload_data)
+    db_session.add(db_upload)
+    db_session.commit()
+    return db_upload
+
+
 def get_first_trade_for_date_with_no_empty_original_id(
     db_session: Session,
     exchange: str,
@@ -526,3 +702,34 @@ def get_trades_for_date_with_empty_original_id(
 
 def row_to_dict(row):
     return {c.key: getattr(row, c.key) for c in inspect(row).mapper.column_attrs}
+
+
+def iter_user_trades(
+    db_session: Session,
+    user_id: int,
+    end_time: datetime | None = None,
+    batch_size: int = 5000,
+):
+    """
+    Stream trades of a user in utc_time order without loading them all.
+    Rows are fetched from a server side cursor in batches of batch_size.
+    """
+    stmt = (
+        select(
+            models.Trades.utc_time,
+            models.Trades.id,
+            models.Trades.bought_currency,
+            models.Trades.bought_amount,
+            models.Trades.sold_currency,
+            models.Trades.sold_amount,
+            models.Trades.fee_currency,
+            models.Trades.fee_amount,
+            models.Trades.exchange_id,
+        )
+        .where(models.Trades.user_id == user_id)
+        .order_by(models.Trades.utc_time, models.Trades.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if end_time is not None:
+        stmt = stmt.where(models.Trades.utc_time <= end_time)
+    yield from db_session.execute(stmt)
@@ -1,11 +1,51 @@
 import os
-from sqlalchemy import Engine, create_engine, or_, and_
+from sqlalchemy import Engine, create_engine, inspect, or_, and_, text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker, Session
 from fastapi import HTTPException
-from app import models
+from app import metrics, models
 from app.tools import chunked, datetime_from_miliseconds
 from app.base import Base
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def upgrade_schema(engine: Engine) -> list[str]:
+    """
+    Adds model columns missing from tables created by older versions;
+    create_all only creates missing tables. Only nullable columns can be
+    added this way, others are logged. Safe to run on every start.
+    """
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    logger.warning(
+                        "Column %s.%s is missing and cannot be added.",
+                        table.name,
+                        column.name,
+                    )
+                    continue
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} "
+                        f"ADD {preparer.format_column(column)} "
+                        f"{column.type.compile(dialect=engine.dialect)}"
+                    )
+                )
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info("Added columns: %s.", ", ".join(added))
+    return added
 
 
 class Database:
@@ -27,7 +67,9 @@ class Database:
         self.SessionLocal = sessionmaker(
             autocommit=False, autoflush=False, bind=self.engine
         )
+        metrics.instrument_engine(self.engine)
         Base.metadata.create_all(bind=self.engine)
+        upgrade_schema(self.engine)
 
     def get_db_session(self):
         db_session = self.SessionLocal()
@@ -38,15 +80,9 @@ class Database:
 
     def store_trades(self, db_session: Session, trades: list) -> int:
         try:
-            fields = trades[0].keys() if trades else []
-            print(f"Fields in trades: {fields}")
             incoming_trades = set(
                 (trade.get("id"), trade.get("symbol")) for trade in trades
             )
-            print(
-                f"Incoming keys: {list(incoming_trades)[:5]}... "
-                f"(total {len(incoming_trades)})"
-            )
             existing_trades = set()
             batch_size = 50
             for batch in chunked(incoming_trades, batch_size):
@@ -65,10 +101,6 @@ class Database:
                     .all()
                 )
                 existing_trades.update(rows)
-            print(
-                f"Existing keys: {list(existing_trades)[:5]}... "
-                f"(total {len(existing_trades)})"
-            )
             unique_trades = [
                 models.create_model_instance_from_dict(
                     model_class=models.TradesFromApi, data=trade
@@ -76,16 +108,23 @@ class Database:
                 for trade in trades
                 if (trade.get("id"), trade.get("symbol")) not in existing_trades
             ]
-            print(
-                f"Unique trades to insert: {unique_trades[:5]}... "
-                f"(total {len(unique_trades)})"
+            logger.info(
+                "Storing trades: %d incoming, %d existing, %d to insert",
+                len(incoming_trades),
+                len(existing_trades),
+                len(unique_trades),
             )
             db_session.bulk_save_objects(unique_trades)
             db_session.commit()
+            metrics.count_rows(
+                "binance_my_trades",
+                inserted=len(unique_trades),
+                duplicate=len(trades) - len(unique_trades),
+            )
             return unique_trades
         except SQLAlchemyError as e:
             db_session.rollback()
-            print(f"Database error: {str(e)}")
+            logger.error("Database error: %s", e)
             raise HTTPException(status_code=500, detail=f"DB error: {str(e)}")
 
     def store_deposits(self, db_session: Session, deposits: list) -> int:
@@ -121,10 +160,15 @@ class Database:
             ]
             db_session.bulk_save_objects(unique_deposits)
             db_session.commit()
+            metrics.count_rows(
+                "binance_deposits",
+                inserted=len(unique_deposits),
+                duplicate=len(deposits) - len(unique_deposits),
+            )
             return len(unique_deposits)
         except SQLAlchemyError as e:
             db_session.rollback()
-            print(f"Database error: {str(e)}")
+            logger.error("Database error: %s", e)
             raise HTTPException(status_code=500, detail=f"DB error: {str(e)}")
 
     def store_withdrawals(self, db_session: Session, withdrawals: list) -> int:
@@ -162,9 +206,16 @@ class Database:
             ]
             db_session.bulk_save_objects(unique_withdrawals)
             db_session.commit()
-            print(f"Stored {len(unique_withdrawals)} " "withdrawals in the database.")
+            metrics.count_rows(
+                "binance_withdrawals",
+                inserted=len(unique_withdrawals),
+                duplicate=len(withdrawals) - len(unique_withdrawals),
+            )
+            logger.info(
+                "Stored %d withdrawals in the database.", len(unique_withdrawals)
+            )
             return len(unique_withdrawals)
         except SQLAlchemyError as e:
             db_session.rollback()
-            print(f"Database error: {str(e)}")
+            logger.error("Database error: %s", e)
             raise HTTPException(status_code=500, detail=f"DB error: {str(e)}")
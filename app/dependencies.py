@@ -2,9 +2,12 @@ from typing import Annotated
 from fastapi import Depends
 from functools import lru_cache
 from app.binance_service import BinanceService
+from app.candle_archive import get_candle_archive
 from app.kanga_service import KangaService
 from app.database import Database
 from app.nbp_service import NbpService
+from app.price_lookup import PriceStore
+from app.conversion import ConversionService
 
 
 def get_binance_service():
@@ -25,5 +28,15 @@ def get_db() -> Database:
     return Database()
 
 
+@lru_cache()
+def get_price_store() -> PriceStore:
+    return PriceStore(candle_archive=get_candle_archive())
+
+
+@lru_cache()
+def get_conversion_service() -> ConversionService:
+    return ConversionService(price_store=get_price_store())
+
+
 def get_db_session(database: Annotated[Database, Depends(get_db)]):
     yield from database.get_db_session()
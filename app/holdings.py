@@ -0,0 +1,332 @@
+import heapq
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Iterator
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from app import models
+from app.conversion import ConversionService
+
+DEPOSIT_SUCCESS_STATUSES = (1, 6)
+WITHDRAWAL_COMPLETED_STATUS = 6
+WITHDRAWAL_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+BATCH_SIZE = 5000
+
+# Event: (time, [(currency, balance change), ...])
+Event = tuple[datetime, list[tuple[str, Decimal]]]
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def _trade_filters(user_id: int, start: datetime | None, end: datetime) -> list:
+    filters = [models.Trades.user_id == user_id, models.Trades.utc_time < end]
+    if start is not None:
+        filters.append(models.Trades.utc_time >= start)
+    return filters
+
+
+def _deposit_filters(start: datetime | None, end: datetime) -> list:
+    filters = [
+        models.Deposit.status.in_(DEPOSIT_SUCCESS_STATUSES),
+        models.Deposit.insert_time < end,
+    ]
+    if start is not None:
+        filters.append(models.Deposit.insert_time >= start)
+    return filters
+
+
+def _withdrawal_filters(start: datetime | None, end: datetime) -> list:
+    # apply_time is stored as 'YYYY-MM-DD HH:MM:SS' text, which sorts like time
+    filters = [
+        models.Withdrawal.status == WITHDRAWAL_COMPLETED_STATUS,
+        models.Withdrawal.apply_time < end.strftime(WITHDRAWAL_TIME_FORMAT),
+    ]
+    if start is not None:
+        filters.append(
+            models.Withdrawal.apply_time >= start.strftime(WITHDRAWAL_TIME_FORMAT)
+        )
+    return filters
+
+
+def _trade_events(
+    db_session: Session, user_id: int, start: datetime | None, end: datetime
+) -> Iterator[Event]:
+    stmt = (
+        select(
+            models.Trades.utc_time,
+            models.Trades.bought_currency,
+            models.Trades.bought_amount,
+            models.Trades.sold_currency,
+            models.Trades.sold_amount,
+            models.Trades.fee_currency,
+            models.Trades.fee_amount,
+        )
+        .where(*_trade_filters(user_id, start, end))
+        .order_by(models.Trades.utc_time)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    for row in db_session.execute(stmt):
+        changes = []
+        if row.bought_amount:
+            changes.append((row.bought_currency, Decimal(row.bought_amount)))
+        if row.sold_amount:
+            changes.append((row.sold_currency, -Decimal(row.sold_amount)))
+        if row.fee_amount:
+            changes.append((row.fee_currency, -Decimal(row.fee_amount)))
+        yield row.utc_time, changes
+
+
+def _deposit_events(
+    db_session: Session, start: datetime | None, end: datetime
+) -> list[Event]:
+    stmt = (
+        select(models.Deposit.insert_time, models.Deposit.coin, models.Deposit.amount)
+        .where(*_deposit_filters(start, end))
+        .order_by(models.Deposit.insert_time)
+    )
+    return [
+        (insert_time.replace(tzinfo=None), [(coin, Decimal(amount or 0))])
+        for insert_time, coin, amount in db_session.execute(stmt)
+    ]
+
+
+def _withdrawal_events(
+    db_session: Session, start: datetime | None, end: datetime
+) -> list[Event]:
+    stmt = (
+        select(
+            models.Withdrawal.apply_time,
+            models.Withdrawal.coin,
+            models.Withdrawal.amount,
+            models.Withdrawal.transaction_fee,
+        )
+        .where(*_withdrawal_filters(start, end))
+        .order_by(models.Withdrawal.apply_time)
+    )
+    return [
+        (
+            datetime.strptime(apply_time, WITHDRAWAL_TIME_FORMAT),
+            [(coin, -(Decimal(amount or 0) + Decimal(fee or 0)))],
+        )
+        for apply_time, coin, amount, fee in db_session.execute(stmt)
+    ]
+
+
+def _count_events(
+    db_session: Session, user_id: int, end: datetime, include_transfers: bool
+) -> int:
+    count = db_session.scalar(
+        select(func.count())
+        .select_from(models.Trades)
+        .where(*_trade_filters(user_id, None, end))
+    )
+    if include_transfers:
+        count += db_session.scalar(
+            select(func.count())
+            .select_from(models.Deposit)
+            .where(*_deposit_filters(None, end))
+        )
+        count += db_session.scalar(
+            select(func.count())
+            .select_from(models.Withdrawal)
+            .where(*_withdrawal_filters(None, end))
+        )
+    return count
+
+
+def _latest_balances(db_session: Session, user_id: int) -> dict[str, Decimal]:
+    latest = (
+        select(
+            models.DailyBalances.currency,
+            func.max(models.DailyBalances.date).label("date"),
+        )
+        .where(models.DailyBalances.user_id == user_id)
+        .group_by(models.DailyBalances.currency)
+        .subquery()
+    )
+    stmt = select(models.DailyBalances.currency, models.DailyBalances.balance).join(
+        latest,
+        (models.DailyBalances.currency == latest.c.currency)
+        & (models.DailyBalances.date == latest.c.date),
+    )
+    stmt = stmt.where(models.DailyBalances.user_id == user_id)
+    return {
+        currency: Decimal(balance) for currency, balance in db_session.execute(stmt)
+    }
+
+
+def refresh_snapshots(
+    db_session: Session,
+    user_id: int,
+    include_transfers: bool = False,
+    until: date | None = None,
+) -> dict:
+    """
+    Extends per-day balance snapshots of a user up to until (default: yesterday).
+
+    Only closed days are stored. When events were added before the last
+    snapshot date (e.g. an older export was imported) or include_transfers
+    changed, snapshots are rebuilt from scratch; otherwise only new days are
+    replayed. Deposits and withdrawals are not attributed to users in the
+    database, so they are only replayed when include_transfers is set.
+    """
+    until = until or datetime.now(timezone.utc).date() - timedelta(days=1)
+    state = db_session.get(models.BalanceSnapshotState, user_id)
+    balances: dict[str, Decimal] = {}
+    start = None
+    rebuilt = True
+    if (
+        state is not None
+        and state.last_date
+        and bool(state.include_transfers) == bool(include_transfers)
+    ):
+        last_date = state.last_date
+        if isinstance(last_date, str):
+            last_date = date.fromisoformat(last_date)
+        if last_date >= until:
+            return {"last_date": last_date, "rows_written": 0, "rebuilt": False}
+        checked_end = _day_start(last_date + timedelta(days=1))
+        if (
+            _count_events(db_session, user_id, checked_end, include_transfers)
+            == state.events_count
+        ):
+            start = checked_end
+            balances = _latest_balances(db_session, user_id)
+            rebuilt = False
+    if rebuilt:
+        db_session.execute(
+            delete(models.DailyBalances).where(models.DailyBalances.user_id == user_id)
+        )
+    end = _day_start(until + timedelta(days=1))
+    # Transfers are few and read in full first: without MARS (pyodbc on SQL
+    # Server) no other query can run while the trades cursor is open.
+    streams = []
+    if include_transfers:
+        streams.append(_deposit_events(db_session, start, end))
+        streams.append(_withdrawal_events(db_session, start, end))
+    streams.append(_trade_events(db_session, user_id, start, end))
+
+    rows: list[dict] = []
+    changed: set[str] = set()
+    current_day = None
+    events_count = 0
+    for event_time, changes in heapq.merge(*streams, key=lambda event: event[0]):
+        day = event_time.date()
+        if day != current_day:
+            rows.extend(_snapshot_rows(user_id, current_day, balances, changed))
+            changed = set()
+            current_day = day
+        events_count += 1
+        for currency, change in changes:
+            balances[currency] = balances.get(currency, Decimal(0)) + change
+            changed.add(currency)
+    rows.extend(_snapshot_rows(user_id, current_day, balances, changed))
+
+    if rows:
+        db_session.execute(insert(models.DailyBalances), rows)
+    if state is None:
+        state = models.BalanceSnapshotState(user_id=user_id)
+        db_session.add(state)
+    state.last_date = until
+    state.include_transfers = int(include_transfers)
+    state.events_count = events_count + (0 if rebuilt else state.events_count)
+    db_session.commit()
+    return {"last_date": until, "rows_written": len(rows), "rebuilt": rebuilt}
+
+
+def _snapshot_rows(
+    user_id: int, day: date | None, balances: dict, changed: set
+) -> list[dict]:
+    if day is None:
+        return []
+    return [
+        {
+            "user_id": user_id,
+            "date": day,
+            "currency": currency,
+            "balance": balances[currency],
+        }
+        for currency in sorted(changed)
+    ]
+
+
+def portfolio_value(
+    db_session: Session,
+    conversion_service: ConversionService,
+    user_id: int,
+    start: date,
+    end: date,
+    quote_currency: str = "PLN",
+    interval: str = "1d",
+) -> dict:
+    """
+    Values daily balances in quote_currency at the end of every day.
+    Sparse snapshots are forward filled and priced in one vectorized pass.
+    Days with a held currency that has no rate get no value (None); the
+    (currency, day) pairs without a rate are listed in missing_rates.
+    """
+    days = pd.date_range(start, end, freq="D")
+    stmt = (
+        select(
+            models.DailyBalances.date,
+            models.DailyBalances.currency,
+            models.DailyBalances.balance,
+        )
+        .where(
+            models.DailyBalances.user_id == user_id,
+            models.DailyBalances.date <= end,
+        )
+        .order_by(models.DailyBalances.date)
+    )
+    frame = pd.DataFrame(
+        db_session.execute(stmt).all(), columns=["date", "currency", "balance"]
+    )
+    dates = [day.date().isoformat() for day in days]
+    if frame.empty or not len(days):
+        return {
+            "quote_currency": quote_currency,
+            "dates": dates,
+            "values": [0.0] * len(days),
+            "unpriced_currencies": [],
+            "missing_rates": [],
+        }
+    frame["date"] = pd.to_datetime(frame["date"])
+    frame["balance"] = frame["balance"].astype(float)
+    balances = frame.pivot(index="date", columns="currency", values="balance")
+    balances = balances.reindex(balances.index.union(days)).ffill().reindex(days)
+    balances = balances.fillna(0.0)
+    balances = balances.loc[:, (balances != 0).any()]
+    currencies = balances.columns.to_numpy(dtype=object)
+    if not len(currencies):
+        values = np.zeros(len(days))
+        unpriced = []
+        missing_rates = []
+    else:
+        day_ends = days.as_unit("ms").asi8 + 86_400_000 - 1
+        rates = conversion_service.convert(
+            db_session,
+            np.tile(currencies, len(days)),
+            np.repeat(day_ends, len(currencies)),
+            target=quote_currency,
+            interval=interval,
+        ).reshape(len(days), len(currencies))
+        amounts = balances.to_numpy()
+        missing = np.isnan(rates) & (amounts != 0)
+        unpriced = sorted(currencies[missing.any(axis=0)].tolist())
+        missing_rates = sorted(
+            (currencies[column], dates[row]) for row, column in zip(*missing.nonzero())
+        )
+        values = np.where(
+            missing.any(axis=1), np.nan, np.nansum(amounts * rates, axis=1)
+        )
+    return {
+        "quote_currency": quote_currency,
+        "dates": dates,
+        "values": [None if value != value else value for value in values.tolist()],
+        "unpriced_currencies": unpriced,
+        "missing_rates": missing_rates,
+    }
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
 from typing import Annotated
-from app.dependencies import get_kanga_service, get_db_session
+from app.dependencies import (
+    get_kanga_service,
+    get_db_session,
+)
 from app.kanga_service import KangaService
 from sqlalchemy.orm import Session
-from app import crud
+from app import crud, uploads
 from app.users_enum import UsersEnum
+from app.logging_config import get_logger
 
 router = APIRouter(prefix="/kanga", tags=["Kanga"])
+logger = get_logger(__name__)
 
 
 @router.get("/get_main_account_balances")
@@ -54,21 +59,28 @@ def get_and_store_trades(
     /kanga/get_transaction_history_list?start_time=2023-01-01T00:00:00.000Z&end_time=2023-01-312025-04-14T23:59:59.999Z
     """
     try:
-        response = kanga_service._get_transaction_history_list(start_time, end_time)
-        if response is None:
-            raise HTTPException(status_code=404, detail="No transactions found.")
-        if "list" in response:
-            # print(f"Response {response['list']}")
-            trades = [
-                kanga_service._parse_trade_from_api(kanga_trade)
-                for kanga_trade in response["list"]
-            ]
-            return crud.upsert_trade_records(
+        totals: dict = {}
+        # Pages are stored one by one, so memory stays bounded on busy ranges
+        for response in kanga_service.iter_transaction_history(start_time, end_time):
+            if response is None:
+                raise HTTPException(status_code=404, detail="No transactions found.")
+            if "list" not in response:
+                return totals | {"response": response}
+            if not response["list"]:
+                continue
+            trades = kanga_service._parse_trades_from_api(response["list"])
+            result = crud.upsert_trade_records(
                 db_session=db_session,
                 user=kanga_service.user,
                 exchange="Kanga",
                 trades_data=trades,
             )
+            for key, value in result.items():
+                if isinstance(value, int):
+                    totals[key] = totals.get(key, 0) + value
+                else:
+                    totals[key] = value
+        return totals
     except HTTPException as e:
         raise e
 
@@ -148,11 +160,12 @@ def get_market_tickers(
             status_code=404, detail="No tickers found in Kanga API response."
         )
     try:
-        return crud.upsert_tickers(
+        result = crud.upsert_tickers(
             db_session=db_session, tickers=tickers, venue="Kanga"
         )
+        return result
     except Exception as e:
-        print(f"Error storing Kanga symbols: {str(e)}")
+        logger.error("Error storing Kanga symbols: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error storing Kanga symbols: {str(e)}",
@@ -188,7 +201,7 @@ def get_user(
     try:
         return {"User": kanga_service.user}
     except Exception as e:
-        print(f"Error storing Kanga symbols: {str(e)}")
+        logger.error("Error storing Kanga symbols: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error storing Kanga symbols: {str(e)}",
@@ -211,19 +224,24 @@ async def upload_csv(
         raise HTTPException(status_code=400, detail="Provide user.")
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only .csv files are supported.")
+    upload = uploads.read_upload(
+        file.file, crud.get_uploads(db_session, user.value, "Kanga", "csv", timezone)
+    )
+    if upload.previous:
+        return uploads.duplicate_result(upload.previous)
+    # Tails are not parsed alone: moving repeated trades needs the earlier rows
     try:
-        contents: bytes = await file.read()
         trades_data = kanga_service.parse_trades_from_csv(
-            csv_file=contents, timezone=timezone, user=user.value
+            csv_file=upload.content, timezone=timezone, user=user.value
         )
     except Exception as e:
-        print(f"Error processing uploaded CSV file: {str(e)}")
+        logger.error("Error processing uploaded CSV file: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing uploaded CSV file: {str(e)}",
         )
     try:
-        return crud.upsert_trade_records(
+        result = crud.upsert_trade_records(
             db_session=db_session,
             user=user.value,
             exchange="Kanga",
@@ -231,3 +249,14 @@ async def upload_csv(
         )
     except HTTPException as e:
         raise e
+    uploads.record_upload(
+        db_session,
+        upload,
+        user.value,
+        "Kanga",
+        "csv",
+        row_count=len(trades_data),
+        result=result,
+        options=timezone,
+    )
+    return result
@@ -5,18 +5,25 @@ import hashlib
 import hmac
 import json
 import time as time_mod
+import warnings
+import numpy as np
 import pandas as pd
 from decimal import Decimal
 from time import time
 from fastapi import HTTPException
 from datetime import datetime, timezone, timedelta
 from io import StringIO
+from typing import Iterator
 from app.crud import (
     trade_exists_for_date_no_empty_original_id,
     get_trades_for_date_with_empty_original_id,
     Session,
 )
-from app.tools import generate_hash, string
+from app import metrics, parallel_parsing, trade_ids
+from app.logging_config import get_logger, get_row_logger
+from app.tools import string
+from app.rate_limiter import RateLimiter, get_limiter
+from app.response_cache import cached_fetch, range_closed
 
 KANGA_API_URL = "https://api.kanga.exchange"
 # in {https://api.kanga.exchange, https://trade.kanga.exchange/api/v2/}
@@ -30,9 +37,24 @@ KEYRING_SYSTEM_NAME = "kanga_marcelina_api_wallet_and_history"
 # "kanga_mariusz_api_portfel_and_history" (MARIUSZ)
 # "kanga_marcelina_api_wallet_and_history" (MARCELINA)
 # }
-PAUSE_SECONDS = 1.0
+# Maximum number of items Kanga returns for one history request
+HISTORY_PAGE_LIMIT = 500
+KANGA_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 MAX_RETRIES = 3
 BACKOFF_FACTOR = 1.0
+# Hashed trade fields that differ between trades
+KANGA_HASHED_COLUMNS = (
+    "utc_time",
+    "bought_currency",
+    "sold_currency",
+    "price",
+    "bought_amount",
+    "sold_amount",
+    "fee_currency",
+    "fee_amount",
+)
+logger = get_logger(__name__)
+row_logger = get_row_logger(__name__)
 
 
 class KangaService:
@@ -45,19 +67,27 @@ class KangaService:
     def __init__(
         self,
         keyring_system_name: str = KEYRING_SYSTEM_NAME,
-        pause_seconds: float = PAUSE_SECONDS,
+        pause_seconds: float | None = None,
         max_retries: int = MAX_RETRIES,
         backoff_factor: float = BACKOFF_FACTOR,
+        limiter: RateLimiter | None = None,
     ):
+        if pause_seconds is not None:
+            warnings.warn(
+                "pause_seconds is deprecated and ignored, requests are paced by"
+                " the shared rate limiter.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
         self.keyring_system_name = keyring_system_name
         self.api_url = KANGA_API_URL
         self.api_key: str = self._get_api_key()
         self.api_secret: str = self._get_api_secret()
         self.user: str = self._get_user()
-        # rate limiting / retry configuration
-        self.pause_seconds = float(pause_seconds)
+        # retry configuration; pacing is done by the limiter shared in process
         self.max_retries = int(max_retries)
         self.backoff_factor = float(backoff_factor)
+        self.limiter: RateLimiter = limiter or get_limiter("kanga")
 
     def _get_api_key(self) -> str:
         """
@@ -98,39 +128,42 @@ class KangaService:
             "api-sig": sign,
         }
         try:
+            self.limiter.acquire()
             response: requests.Response = requests.post(
                 self.api_url + "/api/v2/wallet/list", headers=headers, data=data_json
             )
-            print(f"Response status code: {response.status_code}")
+            self.limiter.update(response.headers, response.status_code)
             if response.status_code != 200 or response.json().get("result") != "ok":
-                print(f"Error: {response.status_code} - {response.text}")
+                logger.error("Error: %s - %s", response.status_code, response.text)
                 raise HTTPException(
                     status_code=response.status_code,
                     detail=f"Error fetching main account balances: {response.text}",
                 )
             return response.json().get("wallets")
         except requests.JSONDecodeError as error:
-            print(error)
+            logger.error("Invalid wallet list response: %s", error)
 
     def get_orderbook_raw(self, market) -> dict | None:
         try:
+            self.limiter.acquire()
             response = requests.get(
                 self.api_url + f"api/v2/market/orderbook/raw?market={market}"
             )
+            self.limiter.update(response.headers, response.status_code)
             return response.json()
         except requests.JSONDecodeError as error:
-            print(response)
-            print(f"Get orderbook_raw failed: {error}")
+            logger.error("Get orderbook_raw failed: %s (%s)", error, response)
 
     def get_orderbook(self, market) -> dict | None:
         try:
+            self.limiter.acquire()
             response = requests.get(
                 self.api_url + f"api/v2/market/depth?market={market}"
             )
+            self.limiter.update(response.headers, response.status_code)
             return response.json()
         except requests.JSONDecodeError as error:
-            print(response)
-            print(f"Get orderbook failed: {error}")
+            logger.error("Get orderbook failed: %s (%s)", error, response)
 
     def get_active_order_list(self, market) -> requests.Response | None:
         payload = {
@@ -147,13 +180,15 @@ class KangaService:
         headers = {
             "api-sig": sign,
         }
+        self.limiter.acquire()
         response = requests.post(
             self.api_url + "/api/v2/market/order/list", headers=headers, data=data_json
         )
+        self.limiter.update(response.headers, response.status_code)
         try:
             return response.json()
         except requests.JSONDecodeError as error:
-            print(f"Bad request: {error}")
+            logger.error("Bad request: %s", error)
             return {"result": {error}}
 
     def get_market_list(self) -> requests.Response:
@@ -167,14 +202,15 @@ class KangaService:
         headers = {
             "api-sig": sign,
         }
+        self.limiter.acquire()
         response = requests.post(
             self.api_url + "/api/markets", headers=headers, data=data_json
         )
+        self.limiter.update(response.headers, response.status_code)
         try:
-            print(response.json().keys())
             return response.json()
         except Exception as error:
-            print(error)
+            logger.error("Invalid market list response: %s", error)
 
     def get_order(self, order_id) -> requests.Response:
         payload = {
@@ -191,19 +227,45 @@ class KangaService:
         headers = {
             "api-sig": sign,
         }
-        return requests.post(
+        self.limiter.acquire()
+        response = requests.post(
             self.api_url + "/api/v2/market/order/get", headers=headers, data=data_json
         )
+        self.limiter.update(response.headers, response.status_code)
+        return response
 
     def _get_transaction_history_list(
-        self, start_time: str, end_time: str
+        self, start_time: str, end_time: str, limit: int = HISTORY_PAGE_LIMIT
+    ) -> dict | None:
+        """History of a closed time range never changes, so it may be cached."""
+        end_ms = int(
+            datetime.strptime(end_time, KANGA_TIME_FORMAT)
+            .replace(tzinfo=timezone.utc)
+            .timestamp()
+            * 1000
+        )
+        return cached_fetch(
+            "kanga/transactions/history/list",
+            {
+                "startTime": start_time,
+                "endTime": end_time,
+                "limit": limit,
+                "user": self.user,
+            },
+            lambda: self._request_transaction_history_list(start_time, end_time, limit),
+            immutable=range_closed(end_ms),
+            cacheable=lambda response: "list" in response,
+        )
+
+    def _request_transaction_history_list(
+        self, start_time: str, end_time: str, limit: int = HISTORY_PAGE_LIMIT
     ) -> dict | None:
         payload = {
             "nonce": int(time() * 1000),
             "appId": self.api_key,
             "startTime": start_time,
             "endTime": end_time,
-            "limit": 500,
+            "limit": limit,
         }
         data_json = json.dumps(payload)
         sign = hmac.new(
@@ -215,13 +277,15 @@ class KangaService:
 
         attempt = 0
         while attempt <= self.max_retries:
+            self.limiter.acquire()
             try:
-                response: requests.Response = requests.post(
-                    self.api_url + "/api/v2/market/transactions/history/list",
-                    headers=headers,
-                    data=data_json,
-                    timeout=30,
-                )
+                with metrics.track_request("kanga", "transactions/history/list"):
+                    response: requests.Response = requests.post(
+                        self.api_url + "/api/v2/market/transactions/history/list",
+                        headers=headers,
+                        data=data_json,
+                        timeout=30,
+                    )
             except requests.RequestException as exc:
                 # network error -> retry with backoff
                 if attempt == self.max_retries:
@@ -234,10 +298,15 @@ class KangaService:
                 attempt += 1
                 continue
 
+            self.limiter.update(response.headers, response.status_code)
             # handle rate limit / transient server responses
             if response.status_code == 200:
                 try:
-                    return response.json()
+                    data = response.json()
+                    if isinstance(data, dict) and data.get("code") == 429:
+                        # Kanga may report rate limiting inside a 200 response
+                        self.limiter.update(response.headers, 429)
+                    return data
                 except requests.JSONDecodeError:
                     # treat as transient and retry
                     if attempt == self.max_retries:
@@ -251,9 +320,7 @@ class KangaService:
                     continue
 
             if response.status_code == 429:
-                # rate limited -> exponential backoff then retry
-                wait = (2**attempt) * self.backoff_factor
-                time_mod.sleep(wait)
+                # rate limited -> the limiter holds back requests until retry
                 attempt += 1
                 continue
 
@@ -269,15 +336,71 @@ class KangaService:
             detail="Exceeded retries when fetching transaction history.",
         )
 
+    @staticmethod
+    def _format_time(moment: datetime) -> str:
+        """Formats datetime as 'YYYY-MM-DDTHH:MM:SS.sssZ' expected by Kanga API."""
+        return (
+            moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+        )
+
+    def iter_transaction_history(
+        self, start_time: str, end_time: str, limit: int = HISTORY_PAGE_LIMIT
+    ) -> Iterator[dict]:
+        """
+        Yields transaction history responses covering the whole time range.
+
+        Kanga returns at most limit items per request and has no cursor, so a
+        full page means the window may be truncated. Such a window is split in
+        half and both halves are requested instead, until every page is below
+        the limit. Pages are yielded in time order, items already yielded are
+        skipped. A response without "list" (error, no data) is yielded as is
+        and ends the iteration.
+        """
+        windows = [
+            (
+                datetime.strptime(start_time, KANGA_TIME_FORMAT),
+                datetime.strptime(end_time, KANGA_TIME_FORMAT),
+            )
+        ]
+        seen_ids: set[str] = set()
+        while windows:
+            window_start, window_end = windows.pop()
+            response = self._get_transaction_history_list(
+                self._format_time(window_start), self._format_time(window_end), limit
+            )
+            if response is None or "list" not in response:
+                yield response
+                return
+            middle = window_start + (window_end - window_start) / 2
+            middle = middle.replace(microsecond=middle.microsecond // 1000 * 1000)
+            if len(response["list"]) >= limit and middle > window_start:
+                logger.debug(
+                    "Kanga history page for %s - %s is full."
+                    " Splitting the time window.",
+                    window_start,
+                    window_end,
+                )
+                # Stack: the earlier half is requested first
+                windows.append((middle + timedelta(milliseconds=1), window_end))
+                windows.append((window_start, middle))
+                continue
+            page = [
+                item for item in response["list"] if str(item["id"]) not in seen_ids
+            ]
+            seen_ids.update(str(item["id"]) for item in page)
+            yield response | {"list": page}
+
     def get_market_tickers(self) -> list:
         """
         Fetches market tickers from Kanga API.
         """
+        self.limiter.acquire()
         response = requests.get(self.api_url + "/api/v2/market/ticker")
+        self.limiter.update(response.headers, response.status_code)
         try:
             return response.json().keys()
         except requests.JSONDecodeError as error:
-            print(f"Error fetching market tickers: {error}")
+            logger.error("Error fetching market tickers: %s", error)
             raise HTTPException(
                 status_code=500,
                 detail=f"Error fetching market tickers: {error}",
@@ -288,8 +411,7 @@ class KangaService:
         parsed_trade.update(
             {"utc_time": string_trade["utc_time"][:-3], "original_id": ""}
         )
-        print(f"Trade source for hash generation: {string_trade}")
-        print(f"Trade source for hash generation: {parsed_trade}")
+        row_logger.debug("Trade source for hash generation: %s", parsed_trade)
         parsed_trade: dict = string_trade | {
             "utc_time": datetime.strptime(
                 string_trade["utc_time"], "%Y-%m-%d %H:%M:%S"
@@ -299,62 +421,94 @@ class KangaService:
             "sold_amount": Decimal(string_trade["sold_amount"]),
             "fee_amount": Decimal(string_trade["fee_amount"]),
             "original_id": str(string_trade["original_id"]),
-            "id": generate_hash(input_dict=parsed_trade),
+            "id": trade_ids.trade_id(parsed_trade),
         }
         del parsed_trade["exchange"]
         del parsed_trade["user"]
-        print(f"Updated trade after hash generation: {parsed_trade}")
+        row_logger.debug("Updated trade after hash generation: %s", parsed_trade)
         return parsed_trade
 
     def _parse_trade_from_api(self, kanga_trade: dict) -> dict:
+        """Parses one Kanga history item, see _parse_trades_from_api."""
+        return self._parse_trades_from_api([kanga_trade])[0]
+
+    def _parse_trades_from_api(self, kanga_trades: list[dict]) -> list[dict]:
         """
-        Parses a Kanga trade dictionary into a standardized format.
-        The returned 'time' field is a timezone-aware datetime (UTC) or None.
+        Normalizes Kanga history items in one pass and hashes the ids of the
+        whole batch at once (fields as in _parse_trade_from_strings: empty
+        original_id and minute precision time). Amounts repeated across the
+        batch are converted once.
         """
-        if kanga_trade["side"] == "BUYER":
-            bought_currency: str = kanga_trade["buyingCurrency"]
-            sold_currency: str = kanga_trade["payingCurrency"]
-            bought_amount: Decimal = Decimal(kanga_trade["quantity"])
-            sold_amount: Decimal = Decimal(kanga_trade["value"])
-        else:
-            bought_currency: str = kanga_trade["payingCurrency"]
-            sold_currency: str = kanga_trade["buyingCurrency"]
-            bought_amount: Decimal = Decimal(kanga_trade["value"])
-            sold_amount: Decimal = Decimal(kanga_trade["quantity"])
-
-        utc_time_str: str = (
-            str(kanga_trade["created"]).replace("T", " ").replace("Z", "")
-        )
-        print(f"Parsing trade with time: {utc_time_str}")
-        trade_str = {
-            "utc_time": utc_time_str,
-            "bought_currency": bought_currency,
-            "sold_currency": sold_currency,
-            "price": str(kanga_trade["price"]),
-            "bought_amount": string(bought_amount),
-            "sold_amount": string(sold_amount),
-            "fee_currency": str(kanga_trade["feeCurrency"]),
-            "fee_amount": str(kanga_trade["fee"]),
-            "original_id": str(kanga_trade["id"]),
+        amounts: dict[str, tuple[str, Decimal]] = {}
+
+        def amount(value) -> tuple[str, Decimal]:
+            """Normalized text of an amount and its Decimal."""
+            if value not in amounts:
+                text = string(Decimal(value))
+                amounts[value] = (text, Decimal(text))
+            return amounts[value]
+
+        trades = []
+        hashed_rows = []
+        for kanga_trade in kanga_trades:
+            quantity, quantity_value = amount(kanga_trade["quantity"])
+            value, value_value = amount(kanga_trade["value"])
+            if kanga_trade["side"] == "BUYER":
+                bought_currency = kanga_trade["buyingCurrency"]
+                sold_currency = kanga_trade["payingCurrency"]
+                bought_amount, bought_value = quantity, quantity_value
+                sold_amount, sold_value = value, value_value
+            else:
+                bought_currency = kanga_trade["payingCurrency"]
+                sold_currency = kanga_trade["buyingCurrency"]
+                bought_amount, bought_value = value, value_value
+                sold_amount, sold_value = quantity, quantity_value
+            utc_time = str(kanga_trade["created"]).replace("T", " ").replace("Z", "")
+            price = str(kanga_trade["price"])
+            fee_currency = str(kanga_trade["feeCurrency"])
+            fee = str(kanga_trade["fee"])
+            hashed_rows.append(
+                (
+                    utc_time[:-3],
+                    bought_currency,
+                    sold_currency,
+                    price,
+                    bought_amount,
+                    sold_amount,
+                    fee_currency,
+                    fee,
+                )
+            )
+            trades.append(
+                {
+                    "utc_time": datetime.fromisoformat(utc_time),
+                    "bought_currency": bought_currency,
+                    "sold_currency": sold_currency,
+                    "price": Decimal(price),
+                    "bought_amount": bought_value,
+                    "sold_amount": sold_value,
+                    "fee_currency": fee_currency,
+                    "fee_amount": Decimal(fee),
+                    "original_id": str(kanga_trade["id"]),
+                    "id": "",
+                }
+            )
+        if not trades:
+            return trades
+        hashed = dict(zip(KANGA_HASHED_COLUMNS, zip(*hashed_rows)))
+        ids = trade_ids.trade_ids(self._hash_columns(hashed, self.user))
+        for trade, trade_id in zip(trades, ids):
+            trade["id"] = trade_id
+        return trades
+
+    @staticmethod
+    def _hash_columns(hashed: dict, user: str | None) -> dict:
+        return hashed | {
+            "original_id": "",
             "id": "",
             "exchange": "Kanga",
-            "user": self.user,
+            "user": user,
         }
-        # print(f"Trade source for hash generation: {trade_str}")
-        # parsed_trade: dict = trade_str | {
-        #     "utc_time": datetime.strptime(utc_time_str[:-3], "%Y-%m-%d %H:%M:%S"),
-        #     "price": Decimal(trade_str["price"]),
-        #     "bought_amount": Decimal(trade_str["bought_amount"]),
-        #     "sold_amount": Decimal(trade_str["sold_amount"]),
-        #     "fee_amount": Decimal(trade_str["fee_amount"]),
-        #     "original_id": str(kanga_trade["id"]),
-        #     "id": generate_hash(input_dict=trade_str),
-        # }
-        # del parsed_trade["exchange"]
-        # del parsed_trade["user"]
-        # print(f"Updated trade after hash generation: {parsed_trade}")
-        # return parsed_trade
-        return self._parse_trade_from_strings(string_trade=trade_str)
 
     def get_trades_for_date(self, db_session: Session, date: str) -> list[dict]:
         """
@@ -384,7 +538,6 @@ class KangaService:
         end_time_dt = datetime.strptime(end_time, "%Y-%m-%dT%H:%M:%S.%fZ").replace(
             tzinfo=timezone.utc
         )
-        print(f"End time: {end_time_dt}")
         if trade_exists_for_date_no_empty_original_id(
             db_session=db_session, exchange="Kanga", user=self.user, date=date
         ) and end_time_dt < datetime.now(timezone.utc):
@@ -393,7 +546,7 @@ class KangaService:
                 f" for user: {self.user}. It means no new trades can appear"
                 f" and no new api request needed. Date: {date} is skipped."
             )
-            print(already_checked_message)
+            logger.info(already_checked_message)
             return [{"message": already_checked_message}]
         no_trades_original_id: str = (
             f"No trades for user: {self.user}, exchange: Kanga, date: {date}"
@@ -401,12 +554,10 @@ class KangaService:
         no_data_original_id: str = (
             f"Data for {date} are unavailable ({date} < 2023-03-15)."
         )
-        print(datetime(year=2023, month=3, day=15, tzinfo=timezone.utc))
         if end_time_dt < datetime(year=2023, month=3, day=15, tzinfo=timezone.utc):
             trades_empty_original = get_trades_for_date_with_empty_original_id(
                 db_session=db_session, exchange="Kanga", user=self.user, date=date
             )
-            print(f"len(trades_empty_original: {len(trades_empty_original)}")
             if len(trades_empty_original):
                 trades_empty_original2 = [
                     trade.to_dict() for trade in trades_empty_original
@@ -415,15 +566,25 @@ class KangaService:
                     trade.update(
                         {"original_id": "Not available for dates before 2023-03-15"}
                     )
-                print(trades_empty_original2)
+                logger.info(
+                    "Found %d trades without original id for %s.",
+                    len(trades_empty_original2),
+                    date,
+                )
                 return trades_empty_original2
-            print(no_data_original_id)
+            logger.info(no_data_original_id)
             return [
                 self._parse_trade_from_strings(
                     _get_fake_trade(end_time_dt, no_data_original_id)
                 )
             ]
-        response = self._get_transaction_history_list(start_time, end_time)
+        trades = []
+        response = None
+        for response in self.iter_transaction_history(start_time, end_time):
+            if response is None or "list" not in response:
+                # Partial pages are dropped, so the day is fetched again later
+                break
+            trades.extend(self._parse_trades_from_api(response["list"]))
         # print(f"Transaction history response for date {date}: {response}")
         if response is None:
             raise HTTPException(status_code=404, detail="No transactions found.")
@@ -434,23 +595,21 @@ class KangaService:
                 )
             ]
         if "list" in response:
-            if len(response["list"]) == 0 and end_time_dt < datetime.now(timezone.utc):
+            if len(trades) == 0 and end_time_dt < datetime.now(timezone.utc):
                 return [
                     self._parse_trade_from_strings(
                         _get_fake_trade(end_time_dt, no_trades_original_id)
                     )
                 ]
-            return [
-                self._parse_trade_from_api(kanga_trade)
-                for kanga_trade in response["list"]
-            ]
+            return trades
         if "result" in response and "code" in response:
             if response["result"] == "fail" and response["code"] == 429:
                 message_429: str = "Too many calls."
-                print(message_429)
+                logger.warning(message_429)
                 return [{"message": message_429}]
-        print("Response in unexpected format, returning empty list")
-        print(f"Response {response}")
+        logger.error(
+            "Response in unexpected format, returning empty list: %s", response
+        )
         # Response {'result': 'fail', 'code': 429}
         return []
 
@@ -474,40 +633,40 @@ class KangaService:
             # ):
             #     print(f"Trades for date: {date} already exist in DB. Skipping ...")
             #     continue
-            print(f"Fetching trades for date: {date} ...")
+            logger.info("Fetching trades for date: %s ...", date)
             trades_for_date = self.get_trades_for_date(db_session=db_session, date=date)
             no_request_message = (
                 f"Last date: {date} didn't send request, so pause is not needed."
             )
             too_many_calls_message = (
-                f"For {date} request call results with api limit breach error.\n",
-                "So far fetched trades will be added to database, but fetching\n",
-                "process is stopped now.",
+                f"For {date} request call results with api limit breach error. "
+                "So far fetched trades will be added to database, but fetching "
+                "process is stopped now."
             )
             if len(trades_for_date) > 0:
                 if "message" in trades_for_date[0]:
                     if "was already checked" in trades_for_date[0]["message"]:
-                        print(no_request_message)
+                        logger.info(no_request_message)
                         continue
                     if "Too many calls." in trades_for_date[0]["message"]:
-                        print(too_many_calls_message)
+                        logger.warning(too_many_calls_message)
+                        metrics.count_rows("kanga_api", parsed=len(trades))
                         return trades
                 if "original_id" in trades_for_date[0]:
                     if "< 2023-03-15)" in trades_for_date[0]["original_id"]:
                         # print(trades_for_date[0]["original_id"])
-                        print(f"Found {len(trades_for_date)} trades for date: {date}.")
+                        logger.info(
+                            "Found %d trades for date: %s.", len(trades_for_date), date
+                        )
                         trades.extend(trades_for_date)
                         continue
-                print(f"Found {len(trades_for_date)} trades for date: {date}.")
+                logger.info("Found %d trades for date: %s.", len(trades_for_date), date)
                 trades.extend(trades_for_date)
                 # if trades_for_date[0]["fee_currency"] == "Not applicable":
                 #     print(no_request_message)
                 #     continue
-            # pause between requests to avoid being rate-limited / banned
-            # It looks like Kanga limit is 60 requests per minute.
-            print(f"Pausing for {self.pause_seconds} seconds ...")
-            if self.pause_seconds > 0:
-                time_mod.sleep(self.pause_seconds)
+            # Requests are paced by the shared Kanga rate limiter
+        metrics.count_rows("kanga_api", parsed=len(trades))
         return trades
 
     @staticmethod
@@ -528,9 +687,10 @@ class KangaService:
         start_dt = datetime.strptime(start_date, "%Y-%m-%d")
         end_dt = datetime.strptime(end_date, "%Y-%m-%d")
         if end_dt > datetime.now():
-            print(
-                f"end_date must be before or equal to today but it is {end_date}.\n"
-                "Instead today date will be taken as end_date."
+            logger.warning(
+                "end_date must be before or equal to today but it is %s. "
+                "Instead today date will be taken as end_date.",
+                end_date,
             )
             end_dt = datetime.now()
         if start_dt > end_dt:
@@ -581,81 +741,129 @@ class KangaService:
                 status_code=400, detail=f"Missing required columns: {missing}"
             )
 
-        trades_data = []
-        for _, row in df.iterrows():
-            try:
-                base_amount = Decimal(str(row["Ilość"]).split(" ")[0])
-                print(f"Initial base amount: {base_amount}")
-                quote_amount = Decimal(str(row["Suma"]).split(" ")[0])
-                fee, fee_currency = row["Opłata"].split(" ")
-                base_currency, quote_currency = self.alias_currencies(
-                    row["Para"]
-                ).split("/")
-                if row["Strona"] == "Kupujący":
-                    bought_currency: str = base_currency
-                    sold_currency: str = quote_currency
-                    bought_amount: Decimal = base_amount
-                    print(f"Initial bought amount: {bought_amount}")
-                    sold_amount: Decimal = -1 * quote_amount
-                if row["Strona"] == "Sprzedający":
-                    bought_currency: str = quote_currency
-                    sold_currency: str = base_currency
-                    bought_amount: Decimal = quote_amount
-                    sold_amount: Decimal = -1 * base_amount
-                if fee_currency == sold_currency:
-                    # In this case in Kanga csv files fee is counted twice
-                    # (one added to sold amount, one as separate fee amount)
-                    sold_amount -= Decimal(fee)
-                if fee_currency == bought_currency:
-                    # In this case in Kanga csv files fee is deducted twice
-                    # (one from bought amount, one as separate fee amount)
-                    bought_amount += Decimal(fee)
-                    print(
-                        f"Adjusted bought amount for fee: {bought_amount}, Fee: {fee}"
-                    )
-                    trade_time: pd.Timestamp = pd.to_datetime(row["Data"])
-                    trade_time_utc: pd.Timestamp = trade_time.tz_localize(
-                        timezone
-                    ).tz_convert("UTC")
-                    print(f"Parsing trade with time: {trade_time}")
-                trade_str = {
-                    "utc_time": trade_time_utc.strftime("%Y-%m-%d %H:%M"),
-                    "bought_currency": str(bought_currency),
-                    "sold_currency": str(sold_currency),
-                    "price": str(row["Cena"]).split(" ")[0],
-                    "bought_amount": string(bought_amount),
-                    "sold_amount": string(sold_amount),
-                    "fee_currency": str(fee_currency),
-                    "fee_amount": str(fee),
-                    "original_id": "",
-                    "id": "",
-                    "exchange": "Kanga",
-                    "user": user,
-                }
-                print(f"Trade source for hash generation: {trade_str}")
-                trade_hash = generate_hash(input_dict=trade_str)
-                for trade in trades_data:
-                    if trade["id"] == trade_hash:
-                        trade_time_utc = trade_time_utc + pd.Timedelta(seconds=1)
-                        print("""
-                            WARNING!!! Duplicate trade time in CSV detected.
-                            Adjusted time:
-                            """)
-                        print(f"trade: {trade}")
-                parsed_trade: dict = trade_str | {
-                    "utc_time": trade_time_utc,
-                    "price": Decimal(trade_str["price"]),
-                    "bought_amount": Decimal(trade_str["bought_amount"]),
-                    "sold_amount": Decimal(trade_str["sold_amount"]),
-                    "fee_amount": Decimal(trade_str["fee_amount"]),
-                    "id": trade_hash,
-                }
-                del parsed_trade["exchange"]
-                del parsed_trade["user"]
-
-                trades_data.append(parsed_trade)
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Error parsing row: {e}")
-        print(f"First 5: {trades_data[:5]}")
-        print(f"Last 5: {trades_data[-5:]}")
+        try:
+            trades_data = parallel_parsing.parse_in_parallel(
+                _parse_csv_rows, df, timezone=timezone, user=user
+            )
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error parsing row: {e}")
+        # Identical trades share a hash; each repeat is moved by one more second.
+        # Done after the row ranges are joined, repeats may span two ranges.
+        seen_hashes: dict[str, int] = {}
+        moved = 0
+        for trade in trades_data:
+            repeats = seen_hashes.get(trade["id"], 0)
+            seen_hashes[trade["id"]] = repeats + 1
+            if repeats:
+                trade["utc_time"] += pd.Timedelta(seconds=repeats)
+                moved += 1
+                row_logger.debug(
+                    "Time adjusted by %d second(s): %s", repeats, trade["id"]
+                )
+        if moved:
+            # Not sampled like the row logger, every import with repeats is seen
+            logger.warning(
+                "Duplicate trade time in CSV detected, time adjusted for %d trades.",
+                moved,
+            )
+        logger.debug("First 5: %s, last 5: %s", trades_data[:5], trades_data[-5:])
+        metrics.count_rows("kanga_csv", parsed=len(trades_data))
         return trades_data
+
+    @staticmethod
+    def _csv_columns(df: pd.DataFrame, timezone: str) -> list:
+        """
+        Normalizes the Kanga CSV columns at once. Returns UTC times, times
+        used for hashing (minute precision), bought and sold currencies,
+        price, bought and sold amounts, fee currency and fee as columns.
+        """
+
+        def first_word(column: str) -> pd.Series:
+            return df[column].astype(str).str.split(" ", n=1).str[0]
+
+        fee_parts = df["Opłata"].str.split(" ")
+        if not (fee_parts.str.len() == 2).all():
+            raise ValueError("Fee must be given as 'amount currency'.")
+        fee = fee_parts.str[0].to_numpy()
+        fee_currency = fee_parts.str[1].to_numpy()
+        pairs = {
+            pair: KangaService.alias_currencies(pair).split("/")
+            for pair in df["Para"].unique()
+        }
+        invalid = [pair for pair, currencies in pairs.items() if len(currencies) != 2]
+        if invalid:
+            raise ValueError(f"Invalid pair: {invalid[0]}")
+        base = df["Para"].map(lambda pair: pairs[pair][0]).to_numpy()
+        quote = df["Para"].map(lambda pair: pairs[pair][1]).to_numpy()
+        side = df["Strona"].to_numpy()
+        buy = side == "Kupujący"
+        unknown = ~buy & (side != "Sprzedający")
+        if unknown.any():
+            raise ValueError(f"Unknown side: {side[unknown][0]}")
+        base_amount = first_word("Ilość").map(Decimal).to_numpy()
+        quote_amount = first_word("Suma").map(Decimal).to_numpy()
+        bought_currency = np.where(buy, base, quote)
+        sold_currency = np.where(buy, quote, base)
+        bought_amount = np.where(buy, base_amount, quote_amount)
+        sold_amount = -1 * np.where(buy, quote_amount, base_amount)
+        fee_amount = np.array([Decimal(value) for value in fee], dtype=object)
+        # Kanga CSV files count a fee in the sold currency twice (added to the
+        # sold amount and as the fee) and deduct one in the bought currency twice
+        sold_amount = np.where(
+            fee_currency == sold_currency, sold_amount - fee_amount, sold_amount
+        )
+        bought_amount = np.where(
+            fee_currency == bought_currency, bought_amount + fee_amount, bought_amount
+        )
+        utc_time = (
+            pd.to_datetime(df["Data"]).dt.tz_localize(timezone).dt.tz_convert("UTC")
+        )
+        return [
+            list(utc_time),
+            utc_time.dt.strftime("%Y-%m-%d %H:%M").tolist(),
+            bought_currency.tolist(),
+            sold_currency.tolist(),
+            first_word("Cena").tolist(),
+            [string(amount) for amount in bought_amount],
+            [string(amount) for amount in sold_amount],
+            fee_currency.tolist(),
+            fee.tolist(),
+        ]
+
+
+def _parse_csv_rows(
+    rows: pd.DataFrame, first_row_number: int, timezone: str, user: str
+) -> list[dict]:
+    """
+    Trades of a range of Kanga CSV rows (run in import worker processes).
+    Repeated trades are not moved yet, that needs all rows.
+    """
+    columns = KangaService._csv_columns(rows, timezone)
+    ids = trade_ids.trade_ids(
+        KangaService._hash_columns(dict(zip(KANGA_HASHED_COLUMNS, columns[1:])), user)
+    )
+    return [
+        {
+            "utc_time": utc_time,
+            "bought_currency": bought_currency,
+            "sold_currency": sold_currency,
+            "price": Decimal(price),
+            "bought_amount": Decimal(bought_amount),
+            "sold_amount": Decimal(sold_amount),
+            "fee_currency": fee_currency,
+            "fee_amount": Decimal(fee),
+            "original_id": "",
+            "id": trade_hash,
+        }
+        for trade_hash, (
+            utc_time,
+            _,
+            bought_currency,
+            sold_currency,
+            price,
+            bought_amount,
+            sold_amount,
+            fee_currency,
+            fee,
+        ) in zip(ids, zip(*columns))
+    ]
@@ -0,0 +1,194 @@
+"""
+Imports candles from the kline dumps of Binance public data
+(data.binance.vision), e.g. BTCUSDT-1m-2024-01.zip with one CSV inside.
+Archives are decompressed as a stream and read in chunks, so a directory of
+monthly files backfills years of candles without API requests:
+
+    python -m app.kline_archive ~/Downloads/klines --resample 1h 4h 1d
+"""
+
+import argparse
+import re
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from app import crud
+from app.candle_resampling import can_resample, update_resampled
+from app.database import Database
+from app.logging_config import get_logger
+
+KLINE_ARCHIVE_COLUMNS = (
+    "open_time",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "close_time",
+    "quote_volume",
+    "count",
+    "taker_buy_volume",
+    "taker_buy_quote_volume",
+    "ignore",
+)
+# Stored columns besides open_time and their types
+KLINE_ARCHIVE_VALUES = {
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.float64,
+    "count": np.int64,
+}
+ARCHIVE_NAME = re.compile(
+    r"^(?P<symbol>[A-Z0-9]+)-(?P<interval>\d+[smhdwM])-\d{4}-\d{2}(-\d{2})?\.csv$"
+)
+ARCHIVE_SUFFIXES = (".zip", ".csv")
+CHUNK_ROWS = 100_000
+# Spot dumps from 2025 on have open times in microseconds instead of ms
+MICROSECOND_TIMES_FROM = 10**14
+logger = get_logger(__name__)
+
+
+def archive_series(name: str) -> tuple[str, str]:
+    """Symbol and interval from the name of a kline CSV."""
+    match = ARCHIVE_NAME.match(Path(name).name)
+    if not match:
+        raise ValueError(f"Not a Binance kline file name: {name}")
+    return match["symbol"], match["interval"]
+
+
+def read_kline_csv(
+    file: BinaryIO, symbol: str, interval: str, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[list[dict]]:
+    """Candles of a kline CSV in chunks, the way parse_klines builds them."""
+    for chunk in pd.read_csv(
+        file,
+        header=None,
+        names=KLINE_ARCHIVE_COLUMNS,
+        usecols=["open_time", *KLINE_ARCHIVE_VALUES],
+        chunksize=chunk_rows,
+    ):
+        # Newer dumps start with a header row
+        open_times = pd.to_numeric(chunk["open_time"], errors="coerce")
+        valid = open_times.notna().to_numpy()
+        open_times = open_times.to_numpy()[valid].astype(np.int64)
+        open_times = np.where(
+            open_times >= MICROSECOND_TIMES_FROM, open_times // 1000, open_times
+        )
+        times = pd.to_datetime(open_times, unit="ms").floor("min").to_pydatetime()
+        values = [
+            chunk[column].to_numpy()[valid].astype(kind).tolist()
+            for column, kind in KLINE_ARCHIVE_VALUES.items()
+        ]
+        yield [
+            {
+                "symbol": symbol,
+                "interval": interval,
+                "time": candle_time,
+                "price": price,
+                "high": high,
+                "low": low,
+                "close": close,
+                "volume": volume,
+                "trade_count": trade_count,
+                "source": "binance",
+            }
+            for candle_time, price, high, low, close, volume, trade_count in zip(
+                times, *values
+            )
+        ]
+
+
+def iter_kline_csvs(name: str, file: BinaryIO) -> Iterator[tuple[str, BinaryIO]]:
+    """The kline CSVs of a ZIP archive (streamed) or the CSV file itself."""
+    if not name.endswith(".zip"):
+        yield name, file
+        return
+    with zipfile.ZipFile(file) as archive:
+        for member in archive.namelist():
+            if member.endswith(".csv"):
+                with archive.open(member) as stream:
+                    yield member, stream
+
+
+def iter_directory(directory: str | Path) -> Iterator[tuple[str, BinaryIO]]:
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix in ARCHIVE_SUFFIXES:
+            with open(path, "rb") as file:
+                yield path.name, file
+
+
+def import_kline_archives(
+    db_session: Session,
+    files: Iterable[tuple[str, BinaryIO]],
+    resample: Iterable[str] = (),
+) -> dict:
+    """
+    Stores the candles of (name, file) pairs of ZIP archives or CSVs and
+    updates the resample intervals derived from every imported series of
+    finer candles.
+    """
+    csv_files = 0
+    rows = 0
+    inserted = 0
+    # First and last imported open time of every series
+    series: dict[tuple[str, str], tuple[datetime, datetime]] = {}
+    for name, file in files:
+        for csv_name, stream in iter_kline_csvs(name, file):
+            symbol, interval = archive_series(csv_name)
+            for candles in read_kline_csv(stream, symbol, interval):
+                if not candles:
+                    continue
+                rows += len(candles)
+                inserted += crud.upsert_candles(db_session, candles)
+                times = [candle["time"] for candle in candles]
+                times.extend(series.get((symbol, interval), ()))
+                series[(symbol, interval)] = (min(times), max(times))
+            csv_files += 1
+            logger.info("Imported %s, %d candles so far.", csv_name, rows)
+    resampled = {}
+    for (symbol, source_interval), (start, end) in sorted(series.items()):
+        for interval in resample:
+            if can_resample(source_interval, interval):
+                resampled[f"{symbol}-{interval}"] = update_resampled(
+                    db_session, symbol, interval, source_interval, start=start, end=end
+                )
+    return {
+        "files": csv_files,
+        "fetched_candles": rows,
+        "inserted_candles": inserted,
+        "series": [f"{symbol}-{interval}" for symbol, interval in sorted(series)],
+        "resampled_candles": resampled,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Import Binance kline dumps")
+    parser.add_argument("paths", nargs="+", help="ZIP/CSV files or directories")
+    parser.add_argument(
+        "--resample",
+        nargs="*",
+        default=[],
+        help="intervals derived from the imported candles, e.g. 1h 4h 1d",
+    )
+    args = parser.parse_args(argv)
+
+    def files() -> Iterator[tuple[str, BinaryIO]]:
+        for path in map(Path, args.paths):
+            if path.is_dir():
+                yield from iter_directory(path)
+            else:
+                with open(path, "rb") as file:
+                    yield path.name, file
+
+    with Database().SessionLocal() as db_session:
+        print(import_kline_archives(db_session, files(), args.resample))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOG_LEVEL_ENV = "LOG_LEVEL"
+LOG_FORMAT_ENV = "LOG_FORMAT"
+LOG_SAMPLE_ENV = "LOG_SAMPLE_EVERY"
+DEFAULT_LEVEL = "WARNING"
+DEFAULT_FORMAT = "json"
+# Per-row messages: only every n-th record of each call site is emitted
+DEFAULT_SAMPLE_EVERY = 1000
+ROWS_SUFFIX = ".rows"
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with extra= fields as top level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through the first and then every n-th record of each call site."""
+
+    def __init__(self, every: int = DEFAULT_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counts: dict[tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(site, 0)
+            self._counts[site] = count + 1
+        if count % self.every:
+            return False
+        if count:
+            record.sampled = f"1/{self.every}"
+        return True
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+def get_row_logger(name: str) -> logging.Logger:
+    """
+    Logger for messages logged once per processed row. Its records are
+    sampled, and below DEBUG level the calls cost a single level check.
+    """
+    logger = logging.getLogger(name + ROWS_SUFFIX)
+    if not any(isinstance(item, SamplingFilter) for item in logger.filters):
+        every = os.getenv(LOG_SAMPLE_ENV, DEFAULT_SAMPLE_EVERY)
+        logger.addFilter(SamplingFilter(int(every)))
+    return logger
+
+
+def configure_logging(
+    level: str | None = None, log_format: str | None = None, stream=None
+) -> logging.Logger:
+    """
+    Sets up the "app" logger from arguments or LOG_LEVEL / LOG_FORMAT
+    (json or text). Calling it again replaces the previous handler.
+    """
+    level = (level or os.getenv(LOG_LEVEL_ENV, DEFAULT_LEVEL)).upper()
+    log_format = (log_format or os.getenv(LOG_FORMAT_ENV, DEFAULT_FORMAT)).lower()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(
+        JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT)
+    )
+    logger = logging.getLogger("app")
+    for previous in list(logger.handlers):
+        logger.removeHandler(previous)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    # Records are written here only, not again by handlers of the root logger
+    logger.propagate = False
+    return logger
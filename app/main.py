@@ -1,24 +1,36 @@
-import asyncio
 import time
 import pandas as pd
 from typing import Annotated
 from dotenv import load_dotenv
-from io import BytesIO, StringIO
-from fastapi import FastAPI, Depends, Query, HTTPException, UploadFile, File
+from io import StringIO
+from fastapi import FastAPI, Depends, Query, HTTPException, UploadFile, File, Request
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.routing import APIRoute
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from app.database import Database
-from app import models, crud
+from app.logging_config import configure_logging, get_logger
+from app import metrics, models, crud, profiling, rate_limiter
+from app.response_cache import get_response_cache
 from app.binance_service import BinanceService
 from app.tools import datetime_from_str, timestamp_from_str
-from app.dependencies import get_binance_service, get_db_session, get_db
+from app.xlsx_reader import XlsxBatches
+from app.dependencies import (
+    get_binance_service,
+    get_db_session,
+    get_db,
+)
 from app.nbp_router import router as nbp_router
 from app.binance_router import router as binance_router
 from app.kanga_router import router as kanga_router
 from app.users_router import router as users_router
+from app.portfolio_router import router as portfolio_router
+from app.prices_router import router as prices_router
+from app.parquet_router import router as parquet_router
 
 load_dotenv()
+configure_logging()
+logger = get_logger(__name__)
 
 
 app = FastAPI(
@@ -31,6 +43,45 @@ app.include_router(nbp_router)
 app.include_router(binance_router)
 app.include_router(kanga_router)
 app.include_router(users_router)
+app.include_router(portfolio_router)
+app.include_router(prices_router)
+app.include_router(parquet_router)
+
+
+@app.middleware("http")
+async def record_route_latency(request: Request, call_next):
+    """Observes the latency of every request under its route path template."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    With PROFILING_ENABLED=true a request sent with the X-Profile: 1 header
+    or ?profile=1 is profiled; the stored profile is named in X-Profile-Id.
+    """
+    if not (
+        profiling.profiling_enabled()
+        and profiling.profile_requested(request.headers, request.query_params)
+    ):
+        return await call_next(request)
+    with profiling.RequestProfile(request.method, request.url.path) as profile:
+        response = await call_next(request)
+    response.headers[profiling.PROFILE_ID_HEADER] = profile.name
+    return response
 
 
 @app.get("/health")
@@ -38,6 +89,53 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/rate_limits", tags=["Utility"], summary="Exchange API rate limit usage")
+def rate_limits() -> list[dict]:
+    """Current utilization of the shared exchange rate limiters."""
+    return rate_limiter.utilization()
+
+
+@app.get("/response_cache", tags=["Utility"], summary="Response cache statistics")
+def response_cache_stats() -> dict:
+    """Statistics of the on-disk cache of immutable exchange responses."""
+    cache = get_response_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get(
+    "/metrics",
+    tags=["Utility"],
+    summary="Metrics in Prometheus text format",
+    response_class=PlainTextResponse,
+)
+def metrics_endpoint() -> PlainTextResponse:
+    """Exchange, rate limiter, pipeline, database and route metrics."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def _profile_store() -> profiling.ProfileStore:
+    if not profiling.profiling_enabled():
+        raise HTTPException(status_code=404, detail="Profiling is not enabled.")
+    return profiling.get_profile_store()
+
+
+@app.get("/profiles", tags=["Utility"], summary="List recent request profiles")
+def list_profiles() -> list[dict]:
+    """Stored request profiles, newest first."""
+    return _profile_store().profiles()
+
+
+@app.get("/profiles/{name}", tags=["Utility"], summary="Download a request profile")
+def download_profile(name: str) -> FileResponse:
+    """Profile in the folded stacks format read by flame graph tools."""
+    path = _profile_store().path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {name} not found.")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+
 @app.get("/routes", tags=["Utility"], summary="List all API routes")
 def show_routes() -> list[dict]:
     """
@@ -162,12 +260,7 @@ def fetch_prices_endpoint(
         raise HTTPException(status_code=404, detail="No prices found")
 
     saved_count = 0
-    if len(prices):
-        print(f"prices[0]: {prices[0]}")
-    if len(prices) == 1000:
-        print(f"prices[999]: {prices[999]}")
-    else:
-        print("prices[999] not exist")
+    logger.debug("Fetched %d prices, first: %s", len(prices), prices[0])
 
     for price in prices:
         if not crud.candle_exists(
@@ -242,13 +335,12 @@ async def get_binance_trades(
         trades = binance_service.fetch_all_trades_for_symbol(symbol, start_ts, end_ts)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    print(f"Fetched {len(trades)} trades for symbol {symbol}.")
     if not trades:
         raise HTTPException(
             status_code=404, detail="No trades found for the specified symbol."
         )
     stored_trades = database.store_trades(db_session=db_session, trades=trades)
-    print(f"Stored {len(stored_trades)} trades for symbol {symbol}.")
+    logger.info("Stored %d trades for symbol %s.", len(stored_trades), symbol)
     return {
         "Stored trades": len(stored_trades),
         "Fetched trades": len(trades),
@@ -282,7 +374,6 @@ async def fetch_and_store_trades_for_all_symbols(
             .all()
         )
         symbols_from_xlsx = set(row[0].replace("/", "") for row in pairs_from_xlsx)
-        print(f"Unique pairs found in XLSX: {symbols_from_xlsx}")
         pairs_from_csv = (
             db_session.query(models.TradesFromCsv.pair)
             .filter(*filters_for_csv)
@@ -290,9 +381,8 @@ async def fetch_and_store_trades_for_all_symbols(
             .all()
         )
         symbols_from_csv = set(row[0] for row in pairs_from_csv)
-        print(f"Unique pairs found in CSV: {symbols_from_csv}")
         symbols = list(symbols_from_xlsx | symbols_from_csv)
-        print(f"Unique pairs found in database: {symbols}")
+        logger.info("Unique pairs found in database: %s", symbols)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB error: {e}")
     results = []
@@ -303,7 +393,6 @@ async def fetch_and_store_trades_for_all_symbols(
             end_time=timestamp_from_str(end_time),
         )
         results.extend(data)
-        await asyncio.sleep(0.5)
     stored_trades = database.store_trades(db_session=db_session, trades=results)
     if not results:
         raise HTTPException(status_code=404, detail="No trades found for any symbol.")
@@ -369,8 +458,7 @@ async def upload_xlsx(
     if not file.filename.endswith(".xlsx"):
         raise HTTPException(status_code=400, detail="Only .xlsx files are supported.")
     try:
-        contents = await file.read()
-        df = pd.read_excel(BytesIO(contents), engine="openpyxl")
+        sheet = XlsxBatches(file.file)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error reading Excel file: {e}")
     # Adjust these columns to match your Transaction model
@@ -386,37 +474,49 @@ async def upload_xlsx(
         "Fee",
         "Fee Coin",
     }
-    if not required_columns.issubset(df.columns):
-        missing = required_columns - set(df.columns)
-        raise HTTPException(
-            status_code=400,
-            detail=f"Missing required columns: {missing}",
-        )
-    records = []
-    for _, row in df.iterrows():
-        try:
-            trade = models.TradesFromXlsx(
-                date_utc=row["Date(UTC)"],
-                pair=row["Pair"],
-                base_asset=row["Base Asset"],
-                quote_asset=row["Quote Asset"],
-                type=row["Type"].lower(),
-                price=float(row["Price"]),
-                amount=float(row["Amount"]),
-                total=float(row["Total"]),
-                fee=float(row["Fee"]),
-                fee_coin=row["Fee Coin"],
+    inserted = 0
+    with sheet:
+        if not required_columns.issubset(sheet.columns):
+            missing = required_columns - set(sheet.columns)
+            raise HTTPException(
+                status_code=400,
+                detail=f"Missing required columns: {missing}",
             )
-            records.append(trade)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error parsing row: {e}")
+        # Stored batch by batch, the sheet is never loaded as a whole
+        for df in sheet:
+            records = []
+            for _, row in df.iterrows():
+                try:
+                    trade = models.TradesFromXlsx(
+                        date_utc=row["Date(UTC)"],
+                        pair=row["Pair"],
+                        base_asset=row["Base Asset"],
+                        quote_asset=row["Quote Asset"],
+                        type=row["Type"].lower(),
+                        price=float(row["Price"]),
+                        amount=float(row["Amount"]),
+                        total=float(row["Total"]),
+                        fee=float(row["Fee"]),
+                        fee_coin=row["Fee Coin"],
+                    )
+                    records.append(trade)
+                except Exception as e:
+                    db_session.rollback()
+                    raise HTTPException(
+                        status_code=400, detail=f"Error parsing row: {e}"
+                    )
+            try:
+                db_session.bulk_save_objects(records)
+            except SQLAlchemyError as e:
+                db_session.rollback()
+                raise HTTPException(status_code=500, detail=f"Database error: {e}")
+            inserted += len(records)
     try:
-        db_session.bulk_save_objects(records)
         db_session.commit()
     except SQLAlchemyError as e:
         db_session.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
-    return {"inserted": len(records)}
+    return {"inserted": inserted}
 
 
 @app.post("/upload-csv")
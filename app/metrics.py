@@ -0,0 +1,253 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base of labelled metrics; values are kept per label values tuple."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._lines(key, value))
+        return lines
+
+    def _lines(self, key: tuple, value) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _lines(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {float(value)}"]
+
+
+class Histogram(Metric):
+    """Cumulative buckets, sum and count per label values (Prometheus style)."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            return self._values.get(self._key(labels), [None, 0.0, 0])[2]
+
+    def sum(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), [None, 0.0, 0])[1]
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _lines(self, key: tuple, value) -> list[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labels, key, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels, key, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels=()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels=(), **kwargs):
+        return self.register(Histogram(name, documentation, labels, **kwargs))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def clear(self) -> None:
+        """Resets all values (used by tests)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+EXCHANGE_REQUEST_SECONDS = REGISTRY.histogram(
+    "exchange_request_seconds",
+    "Latency of exchange API requests.",
+    ("exchange", "endpoint"),
+)
+EXCHANGE_REQUESTS = REGISTRY.counter(
+    "exchange_requests_total",
+    "Exchange API requests by outcome (ok or error).",
+    ("exchange", "endpoint", "outcome"),
+)
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    "rate_limit_wait_seconds",
+    "Time requests waited for the rate limiter.",
+    ("limiter",),
+    buckets=(0.0, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0),
+)
+RATE_LIMIT_HITS = REGISTRY.counter(
+    "rate_limit_hits_total",
+    "Responses that reported an exceeded rate limit.",
+    ("limiter", "status"),
+)
+PIPELINE_ROWS = REGISTRY.counter(
+    "pipeline_rows_total",
+    "Rows per pipeline and stage (parsed, inserted, updated, duplicate, failed).",
+    ("pipeline", "stage"),
+)
+DB_STATEMENT_SECONDS = REGISTRY.histogram(
+    "db_statement_seconds",
+    "Latency of SQL statements by operation.",
+    ("operation",),
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds",
+    "Latency of API routes.",
+    ("method", "route", "status"),
+)
+
+
+@contextmanager
+def track_request(exchange: str, endpoint: str):
+    """Times one exchange API request and counts it as ok or error."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        EXCHANGE_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, exchange=exchange, endpoint=endpoint
+        )
+        EXCHANGE_REQUESTS.inc(exchange=exchange, endpoint=endpoint, outcome=outcome)
+
+
+def count_rows(pipeline: str, **stages: int) -> None:
+    """count_rows("kanga_csv", parsed=100) adds rows to each given stage."""
+    for stage, rows in stages.items():
+        if rows:
+            PIPELINE_ROWS.inc(rows, pipeline=pipeline, stage=stage)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is dropped with failing statements
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = context._metrics_start
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    DB_STATEMENT_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Records the latency of every statement executed by engine."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -84,7 +84,13 @@ class PriceHistory(Base):
     symbol = Column(String(20), index=True)
     interval = Column(String(5), index=True)
     time = Column(transaction_time_type, index=True)
+    # Open price of the candle
     price = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Float)
+    trade_count = Column(Integer)
     source = Column(String(20), default="binance")
 
 
@@ -99,6 +105,19 @@ class DailyPriceHistory(Base):
     source = Column(String(20))
 
 
+class DailyPriceCoverage(Base):
+    """Date ranges already fetched from a source; days without a rate are holidays."""
+
+    __tablename__ = "daily_price_coverage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    base_currency = Column(String(10), index=True)
+    quote_currency = Column(String(10))
+    start_date = Column(DATE)
+    end_date = Column(DATE)
+    source = Column(String(20))
+
+
 class Deposit(Base):
     __tablename__ = "deposits"
 
@@ -158,6 +177,23 @@ class Tickers(Base):
     quote_asset = Column(String(20))
 
 
+class Uploads(Base):
+    """Ledger of imported export files, see app.uploads."""
+
+    __tablename__ = "uploads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), index=True)  # sha256 hex digest
+    size = Column(BigInteger)
+    user = Column(String(20))
+    exchange = Column(String(20))
+    file_type = Column(String(8))  # csv or xlsx
+    options = Column(String(64), default="")  # parser options, e.g. timezone
+    row_count = Column(Integer)
+    result = Column(String(1024))  # JSON summary of the import
+    uploaded_at = Column(transaction_time_type)
+
+
 class Users(Base):
     __tablename__ = "users"
     id = Column(SmallInteger, primary_key=True)
@@ -190,6 +226,25 @@ class Trades(Base):
         return {c.key: getattr(self, c.key) for c in inspect(self).mapper.column_attrs}
 
 
+# End of day balances, stored only for days on which a balance changed
+class DailyBalances(Base):
+    __tablename__ = "daily_balances"
+
+    user_id = Column(SmallInteger, primary_key=True)
+    date = Column(DATE, primary_key=True, index=True)
+    currency = Column(String(16), primary_key=True)
+    balance = Column(DECIMAL(38, 18))
+
+
+class BalanceSnapshotState(Base):
+    __tablename__ = "balance_snapshot_state"
+
+    user_id = Column(SmallInteger, primary_key=True)
+    last_date = Column(DATE)
+    events_count = Column(Integer)
+    include_transfers = Column(Integer)  # 0 or 1
+
+
 def create_model_instance_from_dict(
     model_class, data: dict, key_map: dict | None = None
 ):
@@ -1,12 +1,31 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
+from datetime import date
 from typing import Annotated
 from sqlalchemy.orm import Session
 from app.nbp_service import NbpService
-from app.dependencies import get_nbp_service, get_db_session
+from app.dependencies import (
+    get_nbp_service,
+    get_db_session,
+)
 
 import requests
+from app.logging_config import get_logger
 
 router = APIRouter(prefix="/nbp", tags=["NBP"])
+logger = get_logger(__name__)
+
+
+def _date_range(start_date: str, end_date: str) -> tuple[date, date]:
+    """Dates of the query parameters; malformed or reversed ranges give 400."""
+    try:
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if start > end:
+        raise HTTPException(
+            status_code=400, detail="start_date must be before or equal to end_date."
+        )
+    return start, end
 
 
 @router.get("/fetch_rates")
@@ -25,15 +44,30 @@ def get_exchange_rate_with_dates(
     end_date: str = Query(
         ...,
         description=(
-            "End date in YYYY-MM-DD format; cannot be a future date "
-            "and must be within 367 days of start_date."
+            "End date in YYYY-MM-DD format; cannot be a future date. "
+            "Without local rates it must be within 367 days of start_date."
         ),
     ),
 ) -> dict:
     """
     Get exchange rate for a given currency code and table.
+    Rates already stored locally (and known holidays) are not requested again.
     Example: /nbp/rates/A/USD
     """
+    if "x" not in (code, start_date, end_date):
+        start, end = _date_range(start_date, end_date)
+        try:
+            stored_rates = nbp_service.ensure_rates(
+                db_session=db_session,
+                code=code,
+                start_date=start,
+                end_date=end,
+                table=table,
+            )
+        except (ValueError, requests.RequestException) as e:
+            logger.error("Error fetching NBP rates: %s", e)
+            raise HTTPException(status_code=502, detail=str(e))
+        return {"stored_rates": stored_rates}
     response: requests.Response = nbp_service.get_exchange_rate_with_dates(
         table=table, code=code, start_date=start_date, end_date=end_date
     )
@@ -42,10 +76,89 @@ def get_exchange_rate_with_dates(
             f"Error fetching data from NBP API: {response.status_code} - "
             f"{response.text}"
         )
-        print(message)
+        logger.error(message)
         raise HTTPException(status_code=response.status_code, detail=message)
-    return {
-        "stored_rates": nbp_service.store_rates(
-            db_session=db_session, rates=nbp_service.parse_rates(response=response)
+    stored_rates = nbp_service.store_rates(
+        db_session=db_session, rates=nbp_service.parse_rates(response=response)
+    )
+    return {"stored_rates": stored_rates}
+
+
+@router.post("/sync_rates")
+def sync_rates(
+    nbp_service: Annotated[NbpService, Depends(get_nbp_service)],
+    db_session: Annotated[Session, Depends(get_db_session)],
+    start_date: date,
+    end_date: date,
+    codes: list[str] = Query(
+        default=["EUR", "USD"],
+        description="Currency codes; with use_tables empty means all currencies.",
+    ),
+    table: str = "a",
+    use_tables: bool = Query(
+        default=False,
+        description="Fetch whole tables (all currencies) per date window.",
+    ),
+) -> dict:
+    """
+    Fetch and store NBP rates of many currencies over any date range.
+    The range is split into 367-day windows fetched concurrently.
+    Example: /nbp/sync_rates?codes=EUR&start_date=2015-01-01&end_date=2024-12-31
+    """
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=400, detail="start_date must be before or equal to end_date."
         )
+    if not codes and not use_tables:
+        raise HTTPException(status_code=400, detail="Provide at least one code.")
+    try:
+        result = nbp_service.sync_rates(
+            db_session=db_session,
+            codes=codes,
+            start_date=start_date,
+            end_date=end_date,
+            table=table,
+            use_tables=use_tables,
+        )
+    except (ValueError, requests.RequestException) as e:
+        logger.error("Error syncing NBP rates: %s", e)
+        raise HTTPException(status_code=502, detail=str(e))
+    return result
+
+
+@router.get("/rates")
+def get_rates(
+    nbp_service: Annotated[NbpService, Depends(get_nbp_service)],
+    db_session: Annotated[Session, Depends(get_db_session)],
+    start_date: date,
+    end_date: date,
+    code: str = "eur",
+    table: str = "a",
+    fetch_missing: bool = Query(
+        default=False, description="Request days missing locally from NBP."
+    ),
+) -> dict:
+    """
+    Get rates of a currency served from the local cache.
+    Example: /nbp/rates?code=usd&start_date=2024-01-01&end_date=2024-01-31
+    """
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=400, detail="start_date must be before or equal to end_date."
+        )
+    try:
+        rates = nbp_service.get_rates(
+            db_session=db_session,
+            code=code,
+            start_date=start_date,
+            end_date=end_date,
+            fetch_missing=fetch_missing,
+            table=table,
+        )
+    except (ValueError, requests.RequestException) as e:
+        logger.error("Error fetching NBP rates: %s", e)
+        raise HTTPException(status_code=502, detail=str(e))
+    return {
+        "code": code.upper(),
+        "rates": {day.isoformat(): price for day, price in rates.items()},
     }
@@ -1,14 +1,52 @@
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 from typing import Dict
-from app import crud
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from app import crud, metrics, models
+from app.logging_config import get_logger
+from app.tools import as_date
+from app.response_cache import cached_fetch
 
 NBP_API_URL = "https://api.nbp.pl/api/"
+# NBP rejects queries covering more than 367 days
+MAX_DAYS_PER_REQUEST = 367
+MAX_WORKERS = 4
+REQUEST_TIMEOUT = 30
+logger = get_logger(__name__)
 
 
 class NbpService:
 
-    def __init__(self):
+    def __init__(self, max_workers: int = MAX_WORKERS):
         self.base_url = NBP_API_URL
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        # Hot cache: rates and days already resolved (rate or known gap) per
+        # (code, table)
+        self._rates: dict[tuple[str, str], dict[date, float]] = {}
+        self._resolved: dict[tuple[str, str], set[date]] = {}
+        self._lock = threading.Lock()
+
+    def build_url(
+        self,
+        table: str,
+        code: str | None = None,
+        start_date: str | None = None,
+        end_date: str | None = None,
+    ) -> str:
+        """
+        Builds NBP exchange rates URL. Without code the whole table is requested.
+        Example: exchangerates/rates/a/eur/2024-01-01/2024-01-31/?format=json
+        """
+        parts = ["exchangerates", "rates" if code else "tables", table.lower()]
+        if code:
+            parts.append(code.lower())
+        if start_date and end_date:
+            parts.extend([str(start_date), str(end_date)])
+        return f"{self.base_url}{'/'.join(parts)}/?format=json"
 
     def get_exchange_rate_with_dates(
         self, table: str, code: str, start_date: str, end_date: str
@@ -17,14 +55,16 @@ class NbpService:
         Get exchange rate for a given currency code and table.
         Example: /nbp/rates/A/USD
         """
-        base_url = f"{self.base_url}exchangerates/rates/{table}/?format=json"
         if code != "x":
-            url = base_url.replace("?", f"{code}/?")
-            if start_date != "x" and end_date != "x":
-                url = url.replace("?", f"{start_date}/{end_date}/?")
+            url = self.build_url(
+                table=table,
+                code=code,
+                start_date=start_date if start_date != "x" else None,
+                end_date=end_date if end_date != "x" else None,
+            )
         else:
-            url = base_url.replace("/rates/", "/tables/")
-        print(f"Fetching NBP rates from: {url}")
+            url = self.build_url(table=table)
+        logger.info("Fetching NBP rates from: %s", url)
         return requests.get(url)
 
     def parse_rates(self, response: requests.Response) -> list[Dict]:
@@ -48,6 +88,24 @@ class NbpService:
         else:
             raise ValueError("Unexpected response format")
 
+    def parse_tables(self, tables: list[dict], codes: set[str] | None = None):
+        """
+        Parse whole table responses (all currencies for every day).
+        If codes are given, only those currencies are returned.
+        """
+        return [
+            {
+                "base_currency": rate["code"],
+                "quote_currency": "PLN",
+                "date": table["effectiveDate"],
+                "price": float(rate["mid"]),
+                "source": "NBP",
+            }
+            for table in tables
+            for rate in table["rates"]
+            if codes is None or rate["code"] in codes
+        ]
+
     def store_rates(self, db_session, rates: list[Dict]) -> int:
         """Store the rates in the database."""
         saved_count = 0
@@ -58,3 +116,314 @@ class NbpService:
                 crud.create_rate(db_session, rate)
                 saved_count += 1
         return saved_count
+
+    @staticmethod
+    def split_date_range(
+        start_date: date, end_date: date, max_days: int = MAX_DAYS_PER_REQUEST
+    ) -> list[tuple[date, date]]:
+        """Splits an inclusive date range into windows of at most max_days."""
+        if start_date > end_date:
+            raise ValueError("start_date must be before or equal to end_date.")
+        windows = []
+        window_start = start_date
+        while window_start <= end_date:
+            window_end = min(window_start + timedelta(days=max_days - 1), end_date)
+            windows.append((window_start, window_end))
+            window_start = window_end + timedelta(days=1)
+        return windows
+
+    def _fetch_json(self, url: str, end_date: date | None = None) -> dict | list | None:
+        """
+        GET an NBP url; None means NBP has no data for the requested window.
+        Windows that ended before today are immutable and may be cached.
+        """
+        today = datetime.now(timezone.utc).date()
+        return cached_fetch(
+            "nbp",
+            {"url": url},
+            lambda: self._request_json(url),
+            immutable=end_date is not None and end_date < today,
+        )
+
+    def _request_json(self, url: str) -> dict | list | None:
+        endpoint = "rates" if "/rates/" in url else "tables"
+        with metrics.track_request("nbp", endpoint):
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise ValueError(
+                f"Error fetching data from NBP API: {response.status_code} - "
+                f"{response.text}"
+            )
+        return response.json()
+
+    def fetch_rates_window(
+        self, table: str, code: str, start_date: date, end_date: date
+    ) -> list[dict]:
+        url = self.build_url(table, code, start_date.isoformat(), end_date.isoformat())
+        data = self._fetch_json(url, end_date)
+        if data is None:
+            return []
+        return [
+            {
+                "base_currency": data["code"],
+                "quote_currency": "PLN",
+                "date": rate["effectiveDate"],
+                "price": float(rate["mid"]),
+                "source": "NBP",
+            }
+            for rate in data["rates"]
+        ]
+
+    def fetch_table_window(
+        self,
+        table: str,
+        start_date: date,
+        end_date: date,
+        codes: set[str] | None = None,
+    ) -> list[dict]:
+        url = self.build_url(
+            table, start_date=start_date.isoformat(), end_date=end_date.isoformat()
+        )
+        data = self._fetch_json(url, end_date)
+        if data is None:
+            return []
+        return self.parse_tables(data, codes=codes)
+
+    def fetch_rates(
+        self,
+        codes: list[str],
+        start_date: date,
+        end_date: date,
+        table: str = "a",
+        use_tables: bool = False,
+    ) -> list[dict]:
+        """
+        Fetches rates of many currencies over any date range.
+        The range is split into NBP sized windows which are requested
+        concurrently. With use_tables every window is a single whole-table
+        request covering all currencies.
+        """
+        windows = self.split_date_range(start_date, end_date)
+        codes = [code.upper() for code in codes]
+        if use_tables:
+            wanted = set(codes) if codes else None
+            jobs = [
+                (self.fetch_table_window, (table, start, end, wanted))
+                for start, end in windows
+            ]
+        else:
+            jobs = [
+                (self.fetch_rates_window, (table, code, start, end))
+                for code in codes
+                for start, end in windows
+            ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(job, *args) for job, args in jobs]
+            return [rate for future in futures for rate in future.result()]
+
+    def sync_rates(
+        self,
+        db_session,
+        codes: list[str],
+        start_date: date,
+        end_date: date,
+        table: str = "a",
+        use_tables: bool = False,
+    ) -> dict:
+        """Fetches rates for the whole range and stores the new ones at once."""
+        rates = self.fetch_rates(
+            codes=codes,
+            start_date=start_date,
+            end_date=end_date,
+            table=table,
+            use_tables=use_tables,
+        )
+        return {
+            "fetched_rates": len(rates),
+            "stored_rates": crud.upsert_rates(db_session=db_session, rates=rates),
+        }
+
+    @staticmethod
+    def _business_days(start_date: date, end_date: date) -> list[date]:
+        days = (end_date - start_date).days + 1
+        return [
+            day
+            for day in (start_date + timedelta(days=offset) for offset in range(days))
+            if day.weekday() < 5
+        ]
+
+    def _unresolved_days(self, key: tuple[str, str], start_date: date, end_date: date):
+        with self._lock:
+            resolved = self._resolved.get(key, set())
+            return [
+                day
+                for day in self._business_days(start_date, end_date)
+                if day not in resolved
+            ]
+
+    def _remember(
+        self, key: tuple[str, str], rates: dict[date, float], resolved
+    ) -> None:
+        with self._lock:
+            self._rates.setdefault(key, {}).update(rates)
+            self._resolved.setdefault(key, set()).update(rates, resolved)
+
+    def _load_local(
+        self,
+        db_session: Session,
+        key: tuple[str, str],
+        start_date: date,
+        end_date: date,
+    ) -> None:
+        """Moves stored rates and covered ranges of (code, table) into the hot cache."""
+        code, table = key
+        rates = {
+            as_date(rate_date): price
+            for rate_date, price in db_session.execute(
+                select(
+                    models.DailyPriceHistory.date, models.DailyPriceHistory.price
+                ).where(
+                    models.DailyPriceHistory.base_currency == code,
+                    models.DailyPriceHistory.quote_currency == "PLN",
+                    models.DailyPriceHistory.date >= start_date,
+                    models.DailyPriceHistory.date <= end_date,
+                )
+            )
+        }
+        resolved = set(rates)
+        for covered_start, covered_end in db_session.execute(
+            select(
+                models.DailyPriceCoverage.start_date,
+                models.DailyPriceCoverage.end_date,
+            ).where(
+                models.DailyPriceCoverage.base_currency == code,
+                models.DailyPriceCoverage.quote_currency == "PLN",
+                models.DailyPriceCoverage.source == _coverage_source(table),
+                models.DailyPriceCoverage.start_date <= end_date,
+                models.DailyPriceCoverage.end_date >= start_date,
+            )
+        ):
+            resolved.update(
+                self._business_days(
+                    max(as_date(covered_start), start_date),
+                    min(as_date(covered_end), end_date),
+                )
+            )
+        self._remember(key, rates, resolved)
+
+    @staticmethod
+    def _record_coverage(
+        db_session: Session,
+        code: str,
+        start_date: date,
+        end_date: date,
+        table: str = "a",
+    ) -> None:
+        """
+        Stores start_date..end_date as fetched for code from table. Overlapping
+        and adjacent ranges are merged with it, so one row is kept per gapless
+        range.
+        """
+        coverage = models.DailyPriceCoverage
+        source = _coverage_source(table)
+        condition = (
+            (coverage.base_currency == code)
+            & (coverage.quote_currency == "PLN")
+            & (coverage.source == source)
+            & (coverage.start_date <= end_date + timedelta(days=1))
+            & (coverage.end_date >= start_date - timedelta(days=1))
+        )
+        for covered_start, covered_end in db_session.execute(
+            select(coverage.start_date, coverage.end_date).where(condition)
+        ):
+            start_date = min(start_date, as_date(covered_start))
+            end_date = max(end_date, as_date(covered_end))
+        db_session.execute(delete(coverage).where(condition))
+        db_session.execute(
+            insert(coverage),
+            [
+                {
+                    "base_currency": code,
+                    "quote_currency": "PLN",
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "source": source,
+                }
+            ],
+        )
+
+    def ensure_rates(
+        self,
+        db_session: Session,
+        code: str,
+        start_date: date,
+        end_date: date,
+        table: str = "a",
+    ) -> int:
+        """
+        Makes sure rates of code for the range are stored locally.
+        Only business days that are neither stored nor inside an already
+        fetched range are requested. Past rates never change, so fetched
+        ranges ending before today are recorded and holiday gaps within them
+        are not requested again. Returns the number of stored rates.
+        """
+        code = code.upper()
+        key = (code, table.lower())
+        missing = self._unresolved_days(key, start_date, end_date)
+        if missing:
+            self._load_local(db_session, key, missing[0], missing[-1])
+            missing = self._unresolved_days(key, start_date, end_date)
+        if not missing:
+            return 0
+        fetched = self.fetch_rates(
+            codes=[code], start_date=missing[0], end_date=missing[-1], table=table
+        )
+        stored = crud.upsert_rates(db_session=db_session, rates=fetched)
+        today = datetime.now(timezone.utc).date()
+        closed_end = min(missing[-1], today - timedelta(days=1))
+        if missing[0] <= closed_end:
+            self._record_coverage(db_session, code, missing[0], closed_end, table)
+            db_session.commit()
+        self._remember(
+            key,
+            {date.fromisoformat(rate["date"]): rate["price"] for rate in fetched},
+            (
+                self._business_days(missing[0], closed_end)
+                if missing[0] <= closed_end
+                else ()
+            ),
+        )
+        return stored
+
+    def get_rates(
+        self,
+        db_session: Session,
+        code: str,
+        start_date: date,
+        end_date: date,
+        fetch_missing: bool = True,
+        table: str = "a",
+    ) -> dict[date, float]:
+        """
+        Returns rates of code for the range, served from the hot cache and
+        the database. With fetch_missing disabled the network is never used.
+        """
+        key = (code.upper(), table.lower())
+        if fetch_missing:
+            self.ensure_rates(db_session, code, start_date, end_date, table)
+        elif self._unresolved_days(key, start_date, end_date):
+            self._load_local(db_session, key, start_date, end_date)
+        with self._lock:
+            rates = self._rates.get(key, {})
+            return {
+                day: rates[day]
+                for day in sorted(rates)
+                if start_date <= day <= end_date
+            }
+
+
+def _coverage_source(table: str) -> str:
+    """Source of coverage rows fetched from table; the default table A is NBP."""
+    return "NBP" if table.lower() == "a" else f"NBP-{table.upper()}"
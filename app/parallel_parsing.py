@@ -0,0 +1,60 @@
+"""
+Parses large exchange exports on several cores. The rows of an export are
+split into contiguous ranges, each range is parsed in a worker process and
+the results are joined back in file order.
+
+Parsers of a range are module level functions (worker processes import
+them by name) called as parse_chunk(rows, first_row_number, **arguments).
+Anything a parser needs from the database has to be loaded beforehand and
+passed in the arguments; sessions do not cross process boundaries.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+import pandas as pd
+from app.logging_config import get_logger
+
+IMPORT_PROCESSES_ENV = "IMPORT_PROCESSES"
+# Below this many rows starting the workers costs more than it saves
+PARALLEL_MIN_ROWS = 50_000
+logger = get_logger(__name__)
+
+
+def import_processes() -> int:
+    """Worker processes for imports: IMPORT_PROCESSES, by default all cores."""
+    return int(os.getenv(IMPORT_PROCESSES_ENV) or os.cpu_count() or 1)
+
+
+def row_ranges(rows: int, parts: int) -> list[tuple[int, int]]:
+    """rows split into at most parts contiguous [start, stop) ranges."""
+    size = max(-(-rows // max(parts, 1)), 1)
+    return [(start, min(start + size, rows)) for start in range(0, rows, size)]
+
+
+def parse_in_parallel(
+    parse_chunk: Callable[..., list],
+    df: pd.DataFrame,
+    processes: int | None = None,
+    first_row_number: int = 1,
+    **arguments,
+) -> list:
+    """
+    parse_chunk applied to row ranges of df, results concatenated in row
+    order. Every range gets the number of its first row, so parsers that
+    depend on row numbers give the same results as one serial pass.
+    """
+    if processes is None:
+        processes = import_processes()
+    if processes < 2 or len(df) < PARALLEL_MIN_ROWS:
+        return parse_chunk(df, first_row_number, **arguments)
+    ranges = row_ranges(len(df), processes)
+    logger.info("Parsing %d rows in %d processes.", len(df), len(ranges))
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [
+            executor.submit(
+                parse_chunk, df.iloc[start:stop], first_row_number + start, **arguments
+            )
+            for start, stop in ranges
+        ]
+        return [item for future in futures for item in future.result()]
@@ -0,0 +1,311 @@
+"""
+Bulk export and import of tables as Parquet, e.g. for analysis and tax
+tooling outside the API or to clone an environment:
+
+    python -m app.parquet_io export ~/backup trades price_history
+    python -m app.parquet_io import ~/backup --replace
+
+Rows are read with server-side cursors (yield_per) and written as record
+batches, so memory stays bounded by the batch size whatever the table size.
+A table is exported to a directory of part files of at most rows_per_file
+rows. pyarrow is optional and imported only when Parquet is used.
+"""
+
+import argparse
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+from sqlalchemy import Table, delete, insert, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import sqltypes
+from app import conversion, models, price_lookup
+from app.candle_archive import get_candle_archive
+from app.database import Database
+from app.logging_config import get_logger
+
+EXPORT_TABLES: dict[str, Table] = {
+    model.__tablename__: model.__table__
+    for model in (
+        models.Trades,
+        models.PriceHistory,
+        models.DailyPriceHistory,
+        models.Deposit,
+        models.Withdrawal,
+    )
+}
+BATCH_ROWS = 50_000
+ROWS_PER_FILE = 5_000_000
+logger = get_logger(__name__)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Parquet export and import need pyarrow: pip install pyarrow"
+        ) from e
+    return pyarrow
+
+
+def table_of(table_name: str) -> Table:
+    if table_name not in EXPORT_TABLES:
+        raise ValueError(
+            f"Unknown table {table_name}, one of: {', '.join(EXPORT_TABLES)}"
+        )
+    return EXPORT_TABLES[table_name]
+
+
+def arrow_schema(table: Table):
+    """Arrow types of the columns of a table."""
+    pa = _pyarrow()
+    fields = []
+    for column in table.columns:
+        column_type = column.type
+        if isinstance(column_type, sqltypes.Float):
+            arrow_type = pa.float64()
+        elif isinstance(column_type, sqltypes.Numeric):
+            arrow_type = pa.decimal128(column_type.precision, column_type.scale)
+        elif isinstance(column_type, sqltypes.Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column_type, sqltypes.DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column_type, sqltypes.Date):
+            arrow_type = pa.date32()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type, nullable=True))
+    return pa.schema(fields)
+
+
+def record_batches(
+    db_session: Session, table: Table, batch_rows: int = BATCH_ROWS
+) -> Iterator:
+    """Rows of a table as Arrow record batches, read with a server-side cursor."""
+    pa = _pyarrow()
+    schema = arrow_schema(table)
+    stmt = select(table).execution_options(yield_per=batch_rows)
+    for rows in db_session.execute(stmt).partitions(batch_rows):
+        columns = zip(*rows)
+        yield pa.RecordBatch.from_arrays(
+            [
+                pa.array(column, type=field.type)
+                for column, field in zip(columns, schema)
+            ],
+            schema=schema,
+        )
+
+
+def export_table(
+    db_session: Session,
+    table_name: str,
+    directory: str | Path,
+    batch_rows: int = BATCH_ROWS,
+    rows_per_file: int = ROWS_PER_FILE,
+) -> dict:
+    """
+    Writes a table to directory/table_name/part-NNNNN.parquet files of at
+    most rows_per_file rows; earlier part files of the table are removed.
+    """
+    pq = _pyarrow().parquet
+    table = table_of(table_name)
+    target = Path(directory) / table_name
+    target.mkdir(parents=True, exist_ok=True)
+    for old_part in target.glob("part-*.parquet"):
+        old_part.unlink()
+    schema = arrow_schema(table)
+    files: list[str] = []
+    rows = 0
+    writer = None
+    file_rows = 0
+    try:
+        for batch in record_batches(db_session, table, batch_rows):
+            if writer is None or file_rows + batch.num_rows > rows_per_file:
+                if writer is not None:
+                    writer.close()
+                path = target / f"part-{len(files):05d}.parquet"
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+                files.append(path.name)
+                file_rows = 0
+            writer.write_batch(batch)
+            file_rows += batch.num_rows
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if not files:
+        # An empty part keeps the schema, so importing it empties the table
+        pq.write_table(schema.empty_table(), target / "part-00000.parquet")
+        files.append("part-00000.parquet")
+    logger.info("Exported %d rows of %s to %s.", rows, table_name, target)
+    return {"table": table_name, "rows": rows, "files": files}
+
+
+class _ChunkSink:
+    """Write-only file object collecting what a ParquetWriter writes."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_table(
+    session_factory: Callable[[], Session],
+    table_name: str,
+    batch_rows: int = BATCH_ROWS,
+) -> Iterator[bytes]:
+    """
+    A table as one Parquet file, yielded a row group at a time. The table
+    name and pyarrow are checked before the first chunk is asked for. Rows
+    are read in a session of its own, opened by the first chunk and closed
+    with the last, as a response body is sent after request scoped sessions
+    are closed.
+    """
+    pa = _pyarrow()
+    table = table_of(table_name)
+
+    def chunks() -> Iterator[bytes]:
+        with session_factory() as db_session:
+            sink = _ChunkSink()
+            writer = pa.parquet.ParquetWriter(
+                pa.PythonFile(sink, mode="w"), arrow_schema(table), compression="zstd"
+            )
+            for batch in record_batches(db_session, table, batch_rows):
+                writer.write_batch(batch)
+                yield sink.take()
+            writer.close()
+            yield sink.take()
+
+    return chunks()
+
+
+def _identity_insert(db_session: Session, table: Table, enabled: bool) -> bool:
+    """
+    On SQL Server, allows or stops inserting the exported values of the
+    IDENTITY primary key of table. Returns whether a statement was needed.
+    """
+    dialect = db_session.get_bind().dialect
+    if dialect.name != "mssql" or table.autoincrement_column is None:
+        return False
+    db_session.execute(
+        text(
+            f"SET IDENTITY_INSERT {dialect.identifier_preparer.format_table(table)}"
+            f" {'ON' if enabled else 'OFF'}"
+        )
+    )
+    return True
+
+
+def import_parquet(
+    db_session: Session,
+    table_name: str,
+    files: list[str | Path | BinaryIO],
+    replace: bool = False,
+    batch_rows: int = BATCH_ROWS,
+) -> dict:
+    """
+    Inserts the rows of Parquet files of a table in record batches, all in
+    one transaction. With replace the rows already in the table are
+    deleted first; otherwise rows with stored keys fail the import. Ids
+    are kept, also for the IDENTITY keys of SQL Server.
+    """
+    pq = _pyarrow().parquet
+    table = table_of(table_name)
+    names = {column.name for column in table.columns}
+    rows = 0
+    try:
+        if replace:
+            db_session.execute(delete(table))
+        identity_insert = _identity_insert(db_session, table, True)
+        try:
+            for file in files:
+                parquet_file = pq.ParquetFile(file)
+                missing = names - set(parquet_file.schema_arrow.names)
+                if missing:
+                    raise ValueError(
+                        f"Columns missing for {table_name}: "
+                        f"{', '.join(sorted(missing))}"
+                    )
+                for batch in parquet_file.iter_batches(
+                    batch_size=batch_rows, columns=sorted(names)
+                ):
+                    if batch.num_rows:
+                        db_session.execute(insert(table), batch.to_pylist())
+                        rows += batch.num_rows
+        finally:
+            # A session setting, not undone by a rollback; turned off on the
+            # connection of the transaction before it ends
+            if identity_insert:
+                _identity_insert(db_session, table, False)
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+    archive = get_candle_archive()
+    if table is models.PriceHistory.__table__ and archive is not None:
+        # Archived series are built again from the imported candles
+        archive.clear()
+    if table is models.PriceHistory.__table__:
+        price_lookup.series_changed()
+        conversion.markets_changed()
+    elif table is models.DailyPriceHistory.__table__:
+        price_lookup.series_changed(interval="daily_rates")
+        conversion.markets_changed()
+    logger.info("Imported %d rows of %s.", rows, table_name)
+    return {"table": table_name, "rows": rows}
+
+
+def import_directory(
+    db_session: Session, table_name: str, directory: str | Path, replace: bool = False
+) -> dict:
+    """Imports the part files export_table wrote for a table."""
+    files = sorted((Path(directory) / table_name).glob("*.parquet"))
+    return import_parquet(db_session, table_name, files, replace)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Parquet export and import")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("directory")
+    parser.add_argument(
+        "tables", nargs="*", default=list(EXPORT_TABLES), help="all by default"
+    )
+    parser.add_argument(
+        "--replace", action="store_true", help="delete stored rows before import"
+    )
+    args = parser.parse_args(argv)
+    with Database().SessionLocal() as db_session:
+        for table_name in args.tables:
+            if args.command == "export":
+                print(export_table(db_session, table_name, args.directory))
+            else:
+                print(
+                    import_directory(
+                        db_session, table_name, args.directory, args.replace
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
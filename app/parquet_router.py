@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from typing import Annotated
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database import Database
+from app.dependencies import (
+    get_db,
+    get_db_session,
+)
+from app.parquet_io import import_parquet, stream_table
+
+router = APIRouter(prefix="/parquet", tags=["Parquet"])
+
+
+@router.get("/export/{table}")
+def export_parquet(
+    database: Annotated[Database, Depends(get_db)], table: str
+) -> StreamingResponse:
+    """
+    Stream trades, price_history, daily_price_history, deposits or
+    withdrawals as a Parquet file, read and written in record batches.
+    """
+    try:
+        chunks = stream_table(database.SessionLocal, table)
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": f'attachment; filename="{table}.parquet"'},
+    )
+
+
+@router.post("/import/{table}")
+def import_parquet_files(
+    db_session: Annotated[Session, Depends(get_db_session)],
+    table: str,
+    files: list[UploadFile] = File(..., description="Parquet files of the table"),
+    replace: bool = Query(default=False, description="Delete stored rows first"),
+) -> dict:
+    """Insert the rows of exported Parquet files, e.g. to clone an environment."""
+    try:
+        result = import_parquet(
+            db_session, table, [file.file for file in files], replace=replace
+        )
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except IntegrityError:
+        raise HTTPException(
+            status_code=409, detail="Rows already stored, import with replace."
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result
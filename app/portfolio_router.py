@@ -0,0 +1,129 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Annotated
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from app import crud, holdings, tax_report
+from app.conversion import ConversionService
+from app.cost_basis import CostBasisEngine, COST_BASIS_METHODS, summarize_disposals
+from app.dependencies import get_conversion_service, get_db_session
+from app.users_enum import UsersEnum
+
+router = APIRouter(prefix="/portfolio", tags=["Portfolio"])
+
+
+@router.get("/realized")
+def get_realized_gains(
+    db_session: Annotated[Session, Depends(get_db_session)],
+    user: UsersEnum,
+    method: str = Query(
+        default="FIFO", description=f"Cost basis method: {COST_BASIS_METHODS}"
+    ),
+    quote_currency: str = Query(
+        default="PLN", description="Currency in which cost and gains are measured"
+    ),
+    year: int | None = Query(
+        default=None, description="Only report disposals made in this year"
+    ),
+    disposals_limit: int = Query(
+        default=0, ge=0, description="Number of individual disposals to return"
+    ),
+) -> dict:
+    """
+    Compute realized gains for a user from the unified trades table.
+    """
+    try:
+        engine = CostBasisEngine(method=method, quote_currency=quote_currency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        user_id = crud.get_user_id(db_session, user.value)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    summary = summarize_disposals(
+        engine.run(crud.iter_user_trades(db_session=db_session, user_id=user_id)),
+        year=year,
+        keep_limit=disposals_limit,
+    )
+    return {
+        "user": user.value,
+        "method": engine.method,
+        "quote_currency": quote_currency,
+        "year": year,
+        **summary,
+        "open_positions": engine.open_positions(),
+    }
+
+
+@router.get("/tax_report")
+def get_tax_report(
+    db_session: Annotated[Session, Depends(get_db_session)],
+    user: UsersEnum,
+    year: int | None = Query(
+        default=None, description="Tax year; all years are returned if omitted"
+    ),
+) -> dict:
+    """
+    PIT-38 style yearly revenue, costs and income in PLN.
+    Fiat legs are valued at the NBP mid rate from the previous business day.
+    """
+    try:
+        user_id = crud.get_user_id(db_session, user.value)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    end_time = datetime(year + 1, 1, 1) if year is not None else None
+    trades = crud.iter_user_trades(
+        db_session=db_session, user_id=user_id, end_time=end_time
+    )
+    span = tax_report.TradeSpan.load(db_session, user_id, end_time)
+    return {
+        "user": user.value,
+        **tax_report.generate_tax_report(
+            db_session=db_session, trades=trades, year=year, span=span
+        ),
+    }
+
+
+@router.get("/value")
+def get_portfolio_value(
+    conversion_service: Annotated[ConversionService, Depends(get_conversion_service)],
+    db_session: Annotated[Session, Depends(get_db_session)],
+    user: UsersEnum,
+    from_date: date | None = Query(
+        default=None, alias="from", description="First day, default: a year ago"
+    ),
+    to_date: date | None = Query(
+        default=None, alias="to", description="Last day, default: yesterday"
+    ),
+    quote: str = Query(default="PLN", description="Currency to value holdings in"),
+    include_transfers: bool = Query(
+        default=False,
+        description="Replay Binance deposits and withdrawals into the balances",
+    ),
+) -> dict:
+    """
+    Daily value of the holdings of a user.
+    Balance snapshots are extended incrementally before valuation.
+    """
+    try:
+        user_id = crud.get_user_id(db_session, user.value)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    to_date = to_date or datetime.now(timezone.utc).date() - timedelta(days=1)
+    from_date = from_date or to_date - timedelta(days=365)
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="from must not be after to.")
+    snapshots = holdings.refresh_snapshots(
+        db_session=db_session, user_id=user_id, include_transfers=include_transfers
+    )
+    return {
+        "user": user.value,
+        "snapshots": snapshots,
+        **holdings.portfolio_value(
+            db_session=db_session,
+            conversion_service=conversion_service,
+            user_id=user_id,
+            start=from_date,
+            end=to_date,
+            quote_currency=quote,
+        ),
+    }
@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+import weakref
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Callable, Iterable
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app import models
+from app.candle_archive import CandleArchive
+
+PRICE_CACHE_MAX_BYTES = int(os.getenv("PRICE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Cached series are checked against the database at most this often, so rows
+# written by other processes (CLI imports, other workers) are picked up.
+PRICE_CACHE_CHECK_SECONDS = float(os.getenv("PRICE_CACHE_CHECK_SECONDS", 10))
+
+# Price stores of this process, invalidated by the crud writers
+_price_stores: "weakref.WeakSet[PriceStore]" = weakref.WeakSet()
+
+
+def series_changed(symbol: str | None = None, interval: str | None = None) -> None:
+    """Drops series matching symbol and interval from every price store."""
+    for store in list(_price_stores):
+        store.invalidate(symbol, interval)
+
+
+class PriceSeries:
+    """Column store of a single (symbol, interval) series sorted by time."""
+
+    __slots__ = ("times", "prices")
+
+    def __init__(self, times: np.ndarray, prices: np.ndarray):
+        self.times = np.asarray(times, dtype=np.int64)
+        self.prices = np.asarray(prices, dtype=np.float64)
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.prices.nbytes
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def asof(self, timestamps_ms: np.ndarray) -> np.ndarray:
+        """
+        Returns the last price at or before every timestamp (epoch ms).
+        Timestamps before the first candle get NaN.
+        """
+        timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+        positions = np.searchsorted(self.times, timestamps_ms, side="right") - 1
+        result = np.full(len(timestamps_ms), np.nan)
+        found = positions >= 0
+        result[found] = self.prices[positions[found]]
+        return result
+
+
+def to_epoch_ms(values: Iterable) -> np.ndarray:
+    """
+    Converts datetimes, ISO strings or epoch milliseconds to int64 epoch ms.
+    Naive datetimes are treated as UTC, as everywhere in the database.
+    """
+    values = values if isinstance(values, (np.ndarray, pd.Series)) else list(values)
+    if len(values) == 0:
+        return np.empty(0, dtype=np.int64)
+    array = np.asarray(values)
+    if np.issubdtype(array.dtype, np.integer):
+        return array.astype(np.int64)
+    index = pd.DatetimeIndex(pd.to_datetime(values, utc=True))
+    return index.as_unit("ms").asi8
+
+
+def load_price_series(db_session: Session, symbol: str, interval: str) -> PriceSeries:
+    """Reads the whole series with a single query."""
+    stmt = (
+        select(models.PriceHistory.time, models.PriceHistory.price)
+        .where(
+            models.PriceHistory.symbol == symbol,
+            models.PriceHistory.interval == interval,
+        )
+        .order_by(models.PriceHistory.time)
+    )
+    rows = db_session.execute(stmt).all()
+    if not rows:
+        return PriceSeries(np.empty(0), np.empty(0))
+    times, prices = zip(*rows)
+    return PriceSeries(to_epoch_ms(times), np.array(prices, dtype=np.float64))
+
+
+def price_series_version(db_session: Session, symbol: str, interval: str) -> tuple:
+    """Row count and last id of a series; changes whenever rows are written."""
+    return tuple(
+        db_session.execute(
+            select(func.count(), func.max(models.PriceHistory.id)).where(
+                models.PriceHistory.symbol == symbol,
+                models.PriceHistory.interval == interval,
+            )
+        ).one()
+    )
+
+
+def rate_series_version(
+    db_session: Session, base_currency: str, quote_currency: str
+) -> tuple:
+    """Row count and last id of the daily rates of a currency pair."""
+    return tuple(
+        db_session.execute(
+            select(func.count(), func.max(models.DailyPriceHistory.id)).where(
+                models.DailyPriceHistory.base_currency == base_currency,
+                models.DailyPriceHistory.quote_currency == quote_currency,
+            )
+        ).one()
+    )
+
+
+def load_rate_series(
+    db_session: Session, base_currency: str, quote_currency: str
+) -> PriceSeries:
+    """Reads daily rates (e.g. NBP) as a series starting at midnight UTC."""
+    stmt = (
+        select(models.DailyPriceHistory.date, models.DailyPriceHistory.price)
+        .where(
+            models.DailyPriceHistory.base_currency == base_currency,
+            models.DailyPriceHistory.quote_currency == quote_currency,
+        )
+        .order_by(models.DailyPriceHistory.date)
+    )
+    rows = db_session.execute(stmt).all()
+    if not rows:
+        return PriceSeries(np.empty(0), np.empty(0))
+    dates, prices = zip(*rows)
+    return PriceSeries(to_epoch_ms(dates), np.array(prices, dtype=np.float64))
+
+
+class PriceStore:
+    """
+    Answers batch as-of price queries from series cached in memory.
+    Series are evicted in least recently used order once the cache grows
+    above max_bytes, and reloaded when a check every check_seconds finds
+    rows written since they were read.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = PRICE_CACHE_MAX_BYTES,
+        candle_archive: CandleArchive | None = None,
+        check_seconds: float = PRICE_CACHE_CHECK_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        # Candle series are mapped from the archive instead of read row by row
+        self.candle_archive = candle_archive
+        self.check_seconds = check_seconds
+        # key -> (series, version when read, time of the last version check)
+        self._series: OrderedDict[tuple, tuple[PriceSeries, tuple | None, float]] = (
+            OrderedDict()
+        )
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        _price_stores.add(self)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def _cached(
+        self, key: tuple, version_of: Callable[[], tuple]
+    ) -> PriceSeries | None:
+        """Cached series of key, None when missing or found out of date."""
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is None:
+                return None
+            self._series.move_to_end(key)
+        series, version, checked_at = entry
+        now = time.monotonic()
+        if now - checked_at < self.check_seconds:
+            return series
+        if version_of() != version:
+            return None
+        with self._lock:
+            if self._series.get(key) is entry:
+                self._series[key] = (series, version, now)
+        return series
+
+    def put(self, key: tuple, series: PriceSeries, version: tuple | None = None):
+        with self._lock:
+            previous = self._series.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous[0].nbytes
+            self._series[key] = (series, version, time.monotonic())
+            self._nbytes += series.nbytes
+            while self._nbytes > self.max_bytes and len(self._series) > 1:
+                _, evicted = self._series.popitem(last=False)
+                self._nbytes -= evicted[0].nbytes
+
+    def get_series(
+        self, db_session: Session, symbol: str, interval: str
+    ) -> PriceSeries:
+        key = (symbol, interval)
+        series = self._cached(
+            key, lambda: price_series_version(db_session, symbol, interval)
+        )
+        if series is None:
+            # Read before the rows, so a concurrent write shows up as a change
+            version = price_series_version(db_session, symbol, interval)
+            candles = None
+            if self.candle_archive is not None:
+                candles = self.candle_archive.series(db_session, symbol, interval)
+            if candles is None:
+                series = load_price_series(db_session, symbol, interval)
+            else:
+                series = PriceSeries(candles.times, candles.open)
+            self.put(key, series, version)
+        return series
+
+    def get_rate_series(
+        self, db_session: Session, base_currency: str, quote_currency: str
+    ) -> PriceSeries:
+        key = (f"{base_currency}/{quote_currency}", "daily_rates")
+        series = self._cached(
+            key, lambda: rate_series_version(db_session, base_currency, quote_currency)
+        )
+        if series is None:
+            version = rate_series_version(db_session, base_currency, quote_currency)
+            series = load_rate_series(db_session, base_currency, quote_currency)
+            self.put(key, series, version)
+        return series
+
+    def asof(
+        self, db_session: Session, symbol: str, interval: str, timestamps: Iterable
+    ) -> np.ndarray:
+        """Prices of symbol at or before each of the timestamps."""
+        series = self.get_series(db_session, symbol, interval)
+        return series.asof(to_epoch_ms(timestamps))
+
+    def rate_asof(
+        self,
+        db_session: Session,
+        base_currency: str,
+        quote_currency: str,
+        timestamps: Iterable,
+    ) -> np.ndarray:
+        """Daily rates of base_currency in quote_currency as of each timestamp."""
+        series = self.get_rate_series(db_session, base_currency, quote_currency)
+        return series.asof(to_epoch_ms(timestamps))
+
+    def invalidate(self, symbol: str | None = None, interval: str | None = None):
+        """Drops cached series matching symbol and interval (None matches all)."""
+        with self._lock:
+            for key in list(self._series):
+                if symbol not in (None, key[0]) or interval not in (None, key[1]):
+                    continue
+                self._nbytes -= self._series.pop(key)[0].nbytes
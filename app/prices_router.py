@@ -0,0 +1,155 @@
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, UploadFile
+from typing import Annotated
+from sqlalchemy.orm import Session
+from app.candle_archive import VALUE_COLUMNS, load_candles
+from app.candle_resampling import update_resampled
+from app.conversion import ConversionService
+from app.dependencies import get_conversion_service, get_db_session, get_price_store
+from app.kline_archive import import_kline_archives
+from app.price_lookup import PriceStore, to_epoch_ms
+
+router = APIRouter(prefix="/prices", tags=["Prices"])
+
+
+@router.post("/asof")
+def get_prices_asof(
+    price_store: Annotated[PriceStore, Depends(get_price_store)],
+    db_session: Annotated[Session, Depends(get_db_session)],
+    symbol: str = Body(default="BTCUSDT", description="Trading symbol"),
+    interval: str = Body(default="1d", description="Candle interval"),
+    timestamps: list[int | str] = Body(
+        ..., description="UNIX timestamps in ms or ISO8601 strings (UTC)"
+    ),
+) -> dict:
+    """
+    Return the candle price at or before every given timestamp.
+    Prices for timestamps before the first stored candle are null.
+    """
+    try:
+        prices = price_store.asof(db_session, symbol, interval, timestamps)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "symbol": symbol,
+        "interval": interval,
+        "prices": [None if price != price else price for price in prices.tolist()],
+    }
+
+
+def _query_time(value: str | None) -> int | None:
+    """Epoch ms from a query parameter in epoch ms or ISO8601 (UTC)."""
+    if value is None:
+        return None
+    try:
+        return int(value) if value.isdigit() else int(to_epoch_ms([value])[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/candles")
+def get_candles(
+    db_session: Annotated[Session, Depends(get_db_session)],
+    symbol: str = Query(default="BTCUSDT", description="Trading symbol"),
+    interval: str = Query(default="1d", description="Candle interval"),
+    start: str | None = Query(default=None, description="Epoch ms or ISO8601"),
+    end: str | None = Query(default=None, description="Epoch ms or ISO8601"),
+) -> dict:
+    """
+    OHLCV candles opened from start to end (inclusive) as columns, e.g. for
+    charts. Read from the candle archive when it is enabled.
+    """
+    candles = load_candles(
+        db_session, symbol, interval, _query_time(start), _query_time(end)
+    )
+    return {
+        "symbol": symbol,
+        "interval": interval,
+        "times": candles.times.tolist(),
+        **{
+            name: [None if value != value else value for value in column.tolist()]
+            for name, column in zip(VALUE_COLUMNS, candles[1:])
+        },
+    }
+
+
+@router.post("/import-klines")
+def import_klines(
+    db_session: Annotated[Session, Depends(get_db_session)],
+    files: list[UploadFile] = File(
+        default=[], description="Binance kline dumps (ZIP or CSV)"
+    ),
+    resample: list[str] = Query(
+        default=[], description="Intervals derived from the imported candles"
+    ),
+) -> dict:
+    """
+    Store candles from Binance public data kline dumps, e.g.
+    BTCUSDT-1m-2024-01.zip from data.binance.vision, without API requests.
+    Dumps in a server directory are imported with python -m app.kline_archive.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="Provide kline dump files.")
+    sources = [(file.filename, file.file) for file in files]
+    try:
+        result = import_kline_archives(db_session, sources, resample)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result
+
+
+@router.post("/resample")
+def resample_candles(
+    db_session: Annotated[Session, Depends(get_db_session)],
+    symbol: str = Body(default="BTCUSDT", description="Trading symbol"),
+    intervals: list[str] = Body(
+        default=["1h", "4h", "1d"], description="Intervals to derive"
+    ),
+    source_interval: str = Body(default="1m", description="Stored finer candles"),
+) -> dict:
+    """
+    Derive candles of coarser intervals from stored finer candles, e.g. a 1m
+    backfill. Only candles after the last derived one are computed.
+    """
+    stored = {}
+    for interval in intervals:
+        try:
+            stored[interval] = update_resampled(
+                db_session, symbol, interval, source_interval
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return {"symbol": symbol, "source_interval": source_interval, "stored": stored}
+
+
+@router.post("/convert")
+def convert_assets(
+    conversion_service: Annotated[ConversionService, Depends(get_conversion_service)],
+    db_session: Annotated[Session, Depends(get_db_session)],
+    assets: list[str] = Body(..., description="Asset codes, e.g. BTC, oPLN"),
+    timestamps: list[int | str] = Body(
+        ..., description="UNIX timestamps in ms or ISO8601 strings (UTC)"
+    ),
+    target: str = Body(default="PLN", description="Currency to value assets in"),
+    interval: str = Body(default="1d", description="Candle interval for markets"),
+) -> dict:
+    """
+    Value one unit of every asset at the matching timestamp in target currency.
+    Chains such as X -> USDT -> USD -> PLN are resolved through the cheapest
+    path of markets, NBP rates and stablecoin pegs.
+    """
+    try:
+        rates = conversion_service.convert(
+            db_session, assets, timestamps, target=target, interval=interval
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    graph = conversion_service.get_graph(db_session, interval)
+    paths = {}
+    for asset in set(assets):
+        path = graph.path(asset, target)
+        paths[asset] = None if path is None else [step._asdict() for step in path]
+    return {
+        "target": target,
+        "rates": [None if rate != rate else rate for rate in rates.tolist()],
+        "paths": paths,
+    }
@@ -0,0 +1,145 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Opt-in: requests are profiled only when this is "true"
+PROFILING_ENV = "PROFILING_ENABLED"
+PROFILE_DIR_ENV = "PROFILE_DIR"
+PROFILE_MAX_FILES_ENV = "PROFILE_MAX_FILES"
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY = "profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_MAX_FILES = 20
+SAMPLE_INTERVAL = 0.005
+PROFILE_SUFFIX = ".folded"
+TRUE_VALUES = ("1", "true", "yes")
+
+
+def profiling_enabled() -> bool:
+    return os.getenv(PROFILING_ENV, "false").lower() == "true"
+
+
+def profile_requested(headers, query_params) -> bool:
+    flag = headers.get(PROFILE_HEADER) or query_params.get(PROFILE_QUERY) or ""
+    return flag.lower() in TRUE_VALUES
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads, so work handed to the thread pool is
+    seen as well. Stacks are counted in the folded format of flame graph
+    tools (speedscope, flamegraph.pl).
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+
+
+class ProfileStore:
+    """Profiles on disk; only the max_files newest ones are kept."""
+
+    def __init__(self, directory: str | Path, max_files: int = DEFAULT_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max(1, int(max_files))
+
+    def save(self, method: str, path: str, duration: float, stacks: Counter) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        moment = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+        name = f"{moment}-{method.lower()}-{slug}-{int(duration * 1000)}ms"
+        name += PROFILE_SUFFIX
+        with open(self.directory / name, "w", encoding="utf-8") as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        self._evict()
+        return name
+
+    def _files(self) -> list[Path]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob("*" + PROFILE_SUFFIX))
+
+    def _evict(self) -> None:
+        # Names start with the UTC time, so name order is age order
+        files = self._files()
+        for old in files[: max(len(files) - self.max_files, 0)]:
+            old.unlink(missing_ok=True)
+
+    def profiles(self) -> list[dict]:
+        return [
+            {"name": file.name, "bytes": file.stat().st_size}
+            for file in reversed(self._files())
+        ]
+
+    def path(self, name: str) -> Path | None:
+        """Path of a stored profile; names from outside the store give None."""
+        if Path(name).name != name or not name.endswith(PROFILE_SUFFIX):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+
+def get_profile_store() -> ProfileStore:
+    return ProfileStore(
+        os.getenv(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR),
+        int(os.getenv(PROFILE_MAX_FILES_ENV, DEFAULT_MAX_FILES)),
+    )
+
+
+class RequestProfile:
+    """Profiles one request: with RequestProfile(method, path) as profile: ..."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.name: str | None = None
+
+    def __enter__(self) -> "RequestProfile":
+        self._started = time.perf_counter()
+        self._profiler = SamplingProfiler().start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        stacks = self._profiler.stop()
+        self.name = get_profile_store().save(
+            self.method, self.path, time.perf_counter() - self._started, stacks
+        )
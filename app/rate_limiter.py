@@ -0,0 +1,215 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Mapping
+from app import metrics
+from app.logging_config import get_logger
+
+WINDOW_SECONDS = 60.0
+# Part of the budget that may be used; the rest is headroom for other clients
+SAFETY_MARGIN = 0.9
+BACKOFF_FACTOR = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+RATE_LIMIT_STATUSES = (418, 429)
+logger = get_logger(__name__)
+
+# Request weights per endpoint (Binance REQUEST_WEIGHT limit is 6000 per minute).
+BINANCE_WEIGHTS = {
+    "klines": 2,
+    "myTrades": 20,
+    "exchangeInfo": 20,
+    "account": 20,
+    "allOrderList": 20,
+    "deposit_history": 1,
+    "withdraw_history": 1,
+    "dust_log": 1,
+}
+
+LIMITER_SETTINGS = {
+    "binance": {
+        "max_weight": 6000,
+        "weights": BINANCE_WEIGHTS,
+        "used_weight_header": "X-MBX-USED-WEIGHT-1M",
+    },
+    # Kanga documents no weights; it allows about 60 requests per minute.
+    "kanga": {"max_weight": 60},
+}
+
+
+def _header(headers: Mapping | None, name: str) -> int | None:
+    """Returns an integer header value (case insensitive) or None."""
+    if not headers:
+        return None
+    lowered = name.lower()
+    for key in headers.keys():
+        if isinstance(key, str) and key.lower() == lowered:
+            value = headers[key]
+            if isinstance(value, (int, str)) and str(value).strip().isdigit():
+                return int(value)
+    return None
+
+
+class RateLimiter:
+    """
+    Request weight budget over a one minute window shared by threads and
+    coroutines. Local accounting is corrected by the used weight reported by
+    the exchange, and 429/418 responses block all callers until Retry-After.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_weight: int,
+        weights: Mapping[str, int] | None = None,
+        default_weight: int = 1,
+        used_weight_header: str | None = None,
+        safety_margin: float = SAFETY_MARGIN,
+        window_seconds: float = WINDOW_SECONDS,
+        backoff_factor: float = BACKOFF_FACTOR,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.name = name
+        self.max_weight = max_weight
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.used_weight_header = used_weight_header
+        self.budget = max(1, int(max_weight * safety_margin))
+        self.window_seconds = window_seconds
+        self.backoff_factor = backoff_factor
+        self.clock = clock
+        self._events: deque[tuple[float, int]] = deque()
+        self._local_used = 0
+        self._server_used = 0
+        self._server_used_until = 0.0
+        self._blocked_until = 0.0
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def weight(self, endpoint: str = "") -> int:
+        return self.weights.get(endpoint, self.default_weight)
+
+    def _purge(self, now: float) -> None:
+        while self._events and self._events[0][0] <= now - self.window_seconds:
+            self._local_used -= self._events.popleft()[1]
+
+    def _used(self, now: float) -> int:
+        server_used = self._server_used if now < self._server_used_until else 0
+        return max(self._local_used, server_used)
+
+    def _reserve(self, weight: int, not_before: float = 0.0) -> float:
+        """Takes weight from the budget or returns seconds to wait first."""
+        with self._lock:
+            # After a sleep the caller's time is at least the planned wake-up
+            now = max(self.clock(), not_before)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._purge(now)
+            used = self._used(now)
+            # A request heavier than the whole budget still goes through alone
+            if used + weight <= self.budget or used == 0:
+                self._events.append((now, weight))
+                self._local_used += weight
+                if now < self._server_used_until:
+                    self._server_used += weight
+                return 0.0
+            waits = []
+            if self._events:
+                waits.append(self._events[0][0] + self.window_seconds - now)
+            if now < self._server_used_until:
+                waits.append(self._server_used_until - now)
+            return max(min(waits), 0.001)
+
+    def acquire(self, endpoint: str = "", weight: int | None = None) -> None:
+        """Blocks the thread until the request fits into the budget."""
+        weight = self.weight(endpoint) if weight is None else weight
+        wake_up = waited = 0.0
+        while (wait := self._reserve(weight, wake_up)) > 0:
+            wake_up = max(self.clock(), wake_up) + wait
+            waited += wait
+            time.sleep(wait)
+        metrics.RATE_LIMIT_WAIT_SECONDS.observe(waited, limiter=self.name)
+
+    async def acquire_async(self, endpoint: str = "", weight: int | None = None):
+        """Waits without blocking the event loop until the request fits."""
+        weight = self.weight(endpoint) if weight is None else weight
+        wake_up = waited = 0.0
+        while (wait := self._reserve(weight, wake_up)) > 0:
+            wake_up = max(self.clock(), wake_up) + wait
+            waited += wait
+            await asyncio.sleep(wait)
+        metrics.RATE_LIMIT_WAIT_SECONDS.observe(waited, limiter=self.name)
+
+    def update(self, headers: Mapping | None = None, status_code: int = 200) -> float:
+        """
+        Feeds response headers and status back into the limiter.
+        Returns the number of seconds all callers are now blocked for.
+        """
+        with self._lock:
+            now = self.clock()
+            if self.used_weight_header:
+                used = _header(headers, self.used_weight_header)
+                if used is not None:
+                    # Exchange counters reset with every wall-clock minute
+                    self._server_used = used
+                    self._server_used_until = (
+                        now - now % self.window_seconds + self.window_seconds
+                    )
+            if status_code not in RATE_LIMIT_STATUSES:
+                self._failures = 0
+                return max(self._blocked_until - now, 0.0)
+            retry_after = _header(headers, "Retry-After")
+            if retry_after is None:
+                retry_after = min(
+                    self.backoff_factor * 2**self._failures, MAX_BACKOFF_SECONDS
+                )
+            self._failures += 1
+            metrics.RATE_LIMIT_HITS.inc(limiter=self.name, status=status_code)
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            logger.warning(
+                "%s rate limit hit (%s), pausing requests for %s seconds.",
+                self.name,
+                status_code,
+                retry_after,
+            )
+            return self._blocked_until - now
+
+    def utilization(self) -> dict:
+        with self._lock:
+            now = self.clock()
+            self._purge(now)
+            used = self._used(now)
+            return {
+                "name": self.name,
+                "used_weight": used,
+                "max_weight": self.max_weight,
+                "budget": self.budget,
+                "utilization": round(used / self.max_weight, 4),
+                "requests_in_window": len(self._events),
+                "blocked_for_seconds": round(max(self._blocked_until - now, 0.0), 3),
+            }
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> RateLimiter:
+    """Process wide limiter shared by every client of one exchange."""
+    with _limiters_lock:
+        if name not in _limiters:
+            settings = LIMITER_SETTINGS.get(name, {"max_weight": 60})
+            _limiters[name] = RateLimiter(name=name, **settings)
+        return _limiters[name]
+
+
+def utilization() -> list[dict]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.utilization() for limiter in limiters]
+
+
+def reset_limiters() -> None:
+    """Forgets all shared limiters (used by tests)."""
+    with _limiters_lock:
+        _limiters.clear()
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, Callable
+
+# Opt-in: responses are cached only when this points to a SQLite file
+RESPONSE_CACHE_ENV = "RESPONSE_CACHE_PATH"
+# Request parameters that change on every call and do not identify the data
+VOLATILE_PARAMS = frozenset({"signature", "timestamp", "nonce", "recvWindow"})
+
+
+def cache_key(endpoint: str, params: dict | None = None) -> str:
+    normalized = {
+        key: value
+        for key, value in (params or {}).items()
+        if key not in VOLATILE_PARAMS and value is not None
+    }
+    source = json.dumps([endpoint, normalized], sort_keys=True, default=str)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def range_closed(end_ms: int | None, margin_ms: int = 0) -> bool:
+    """True when the time range ended (plus margin) before now."""
+    if end_ms is None:
+        return False
+    return int(end_ms) + margin_ms < int(time.time() * 1000)
+
+
+class ResponseCache:
+    """
+    Compressed JSON payloads of immutable exchange responses in SQLite.
+    Callers decide what is immutable (e.g. only fully closed time ranges).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, endpoint TEXT, payload BLOB, created_at REAL)"
+            )
+            self._connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, endpoint: str, params: dict | None = None) -> Any | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT payload FROM responses WHERE key = ?",
+                (cache_key(endpoint, params),),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, endpoint: str, params: dict | None, payload: Any) -> None:
+        blob = zlib.compress(json.dumps(payload).encode("utf-8"))
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (cache_key(endpoint, params), endpoint, blob, time.time()),
+            )
+            self._connection.commit()
+
+    def fetch(
+        self,
+        endpoint: str,
+        params: dict | None,
+        fetch: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = lambda payload: True,
+    ) -> Any:
+        """Returns the cached payload or fetches, stores and returns it."""
+        payload = self.get(endpoint, params)
+        if payload is not None:
+            return payload
+        payload = fetch()
+        if payload is not None and cacheable(payload):
+            self.put(endpoint, params, payload)
+        return payload
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM responses"
+            ).fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "compressed_bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+@lru_cache()
+def get_response_cache() -> ResponseCache | None:
+    """Process wide cache, or None when caching is not enabled."""
+    path = os.getenv(RESPONSE_CACHE_ENV)
+    return ResponseCache(path) if path else None
+
+
+def cached_fetch(
+    endpoint: str,
+    params: dict | None,
+    fetch: Callable[[], Any],
+    immutable: bool,
+    cacheable: Callable[[Any], bool] = lambda payload: True,
+) -> Any:
+    """Goes through the response cache only for immutable data when enabled."""
+    cache = get_response_cache()
+    if cache is None or not immutable:
+        return fetch()
+    return cache.fetch(endpoint, params, fetch, cacheable)
@@ -0,0 +1,248 @@
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, NamedTuple
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import Session
+from app import models
+from app.config import FIAT_CURRENCY_ALIASES
+from app.tools import as_date
+
+BASE_CURRENCY = "PLN"
+TAX_RATE = Decimal("0.19")
+# NBP does not publish rates on weekends and holidays, so the as-of window
+# has to reach back a bit further than the first trade.
+RATE_LOOKBACK_DAYS = 14
+ZERO = Decimal(0)
+
+
+class RateIndex:
+    """
+    In-memory as-of index of daily rates quoted in PLN.
+    For every currency keeps a sorted list of date ordinals and matching rates.
+    """
+
+    def __init__(self, rows: Iterable[tuple[str, date, float]] = ()):
+        self._dates: dict[str, list[int]] = {}
+        self._rates: dict[str, list[Decimal]] = {}
+        for currency, rate_date, price in sorted(rows, key=lambda r: (r[0], r[1])):
+            self._dates.setdefault(currency, []).append(rate_date.toordinal())
+            self._rates.setdefault(currency, []).append(Decimal(str(price)))
+
+    @classmethod
+    def load(
+        cls,
+        db_session: Session,
+        currencies: Iterable[str],
+        start_date: date,
+        end_date: date,
+        quote_currency: str = BASE_CURRENCY,
+    ) -> "RateIndex":
+        """Loads all needed rates with a single query."""
+        currencies = list(currencies)
+        if not currencies:
+            return cls()
+        stmt = select(
+            models.DailyPriceHistory.base_currency,
+            models.DailyPriceHistory.date,
+            models.DailyPriceHistory.price,
+        ).where(
+            models.DailyPriceHistory.base_currency.in_(currencies),
+            models.DailyPriceHistory.quote_currency == quote_currency,
+            models.DailyPriceHistory.date >= start_date,
+            models.DailyPriceHistory.date <= end_date,
+        )
+        return cls(
+            (currency.upper(), as_date(rate_date), price)
+            for currency, rate_date, price in db_session.execute(stmt)
+        )
+
+    def __contains__(self, currency: str) -> bool:
+        return currency in self._dates
+
+    def asof(self, currency: str, day: date) -> Decimal | None:
+        """Returns the last rate published on or before day."""
+        dates = self._dates.get(currency)
+        if not dates:
+            return None
+        position = bisect_right(dates, day.toordinal()) - 1
+        if position < 0:
+            return None
+        return self._rates[currency][position]
+
+    def previous_day_rate(self, currency: str, day: date) -> Decimal | None:
+        """Rate from the last business day before day (NBP D-1 rule)."""
+        if currency == BASE_CURRENCY:
+            return Decimal(1)
+        return self.asof(currency, day - timedelta(days=1))
+
+
+class TradeSpan(NamedTuple):
+    """First and last trade day and the currencies the trades touch."""
+
+    first_day: date | None
+    last_day: date | None
+    currencies: set[str]
+
+    @classmethod
+    def of(cls, trades: Iterable) -> "TradeSpan":
+        """Span of trades held in memory."""
+        days = set()
+        currencies = set()
+        for trade in trades:
+            days.add(trade.utc_time.date())
+            currencies.update(
+                (trade.bought_currency, trade.sold_currency, trade.fee_currency)
+            )
+        return cls(min(days, default=None), max(days, default=None), currencies)
+
+    @classmethod
+    def load(
+        cls, db_session: Session, user_id: int, end_time: datetime | None = None
+    ) -> "TradeSpan":
+        """Span of the stored trades of a user, from MIN/MAX and DISTINCT queries."""
+        conditions = [models.Trades.user_id == user_id]
+        if end_time is not None:
+            conditions.append(models.Trades.utc_time <= end_time)
+        first_time, last_time = db_session.execute(
+            select(
+                func.min(models.Trades.utc_time), func.max(models.Trades.utc_time)
+            ).where(*conditions)
+        ).one()
+        currencies = db_session.execute(
+            union(
+                *(
+                    select(column).where(*conditions)
+                    for column in (
+                        models.Trades.bought_currency,
+                        models.Trades.sold_currency,
+                        models.Trades.fee_currency,
+                    )
+                )
+            )
+        ).scalars()
+        return cls(
+            first_time and as_date(first_time),
+            last_time and as_date(last_time),
+            set(currencies),
+        )
+
+
+def canonical_currency(currency: str) -> str:
+    return FIAT_CURRENCY_ALIASES.get(currency, currency)
+
+
+def get_fiat_currencies(db_session: Session) -> set[str]:
+    """Currencies treated as legal tender: PLN and everything NBP publishes."""
+    stmt = (
+        select(models.DailyPriceHistory.base_currency)
+        .where(models.DailyPriceHistory.quote_currency == BASE_CURRENCY)
+        .distinct()
+    )
+    return {BASE_CURRENCY} | {
+        currency.upper() for currency in db_session.execute(stmt).scalars()
+    }
+
+
+def _round_pln(value: Decimal) -> Decimal:
+    return value.quantize(Decimal(1), rounding=ROUND_HALF_UP)
+
+
+def compute_yearly_totals(
+    trades: Iterable, fiat_currencies: set[str], rates: RateIndex
+) -> dict:
+    """
+    Values fiat legs of trades in PLN and sums PIT-38 revenue and costs per year.
+    Crypto to crypto trades are tax neutral and are skipped.
+    """
+    years: dict[int, dict] = {}
+    missing_rates: set[tuple[str, str]] = set()
+
+    def value_in_pln(currency: str, amount, day: date) -> Decimal:
+        rate = rates.previous_day_rate(currency, day)
+        if rate is None:
+            missing_rates.add((currency, day.isoformat()))
+            return ZERO
+        return Decimal(amount or 0) * rate
+
+    for trade in trades:
+        bought = canonical_currency(trade.bought_currency)
+        sold = canonical_currency(trade.sold_currency)
+        bought_is_fiat = bought in fiat_currencies
+        sold_is_fiat = sold in fiat_currencies
+        if bought_is_fiat == sold_is_fiat:
+            continue
+        day: date = trade.utc_time.date()
+        totals = years.setdefault(
+            day.year, {"revenue": ZERO, "costs": ZERO, "trades": 0}
+        )
+        totals["trades"] += 1
+        if sold_is_fiat:
+            totals["costs"] += value_in_pln(sold, trade.sold_amount, day)
+        else:
+            totals["revenue"] += value_in_pln(bought, trade.bought_amount, day)
+        fee_currency = canonical_currency(trade.fee_currency or "")
+        if trade.fee_amount and fee_currency in fiat_currencies:
+            totals["costs"] += value_in_pln(fee_currency, trade.fee_amount, day)
+
+    report = []
+    carried_costs = ZERO
+    for year in sorted(years):
+        totals = years[year]
+        costs_total = totals["costs"] + carried_costs
+        income = max(totals["revenue"] - costs_total, ZERO)
+        tax_base = _round_pln(income)
+        report.append(
+            {
+                "year": year,
+                "trades": totals["trades"],
+                "revenue": totals["revenue"],
+                "costs": totals["costs"],
+                "costs_carried_in": carried_costs,
+                "income": income,
+                "costs_carried_out": max(costs_total - totals["revenue"], ZERO),
+                "tax_base": tax_base,
+                "tax_due": _round_pln(tax_base * TAX_RATE),
+            }
+        )
+        carried_costs = report[-1]["costs_carried_out"]
+    return {
+        "years": report,
+        "missing_rates": sorted(missing_rates),
+    }
+
+
+def generate_tax_report(
+    db_session: Session,
+    trades: Iterable,
+    year: int | None = None,
+    span: TradeSpan | None = None,
+) -> dict:
+    """
+    Builds PIT-38 style yearly totals in PLN for the given trades.
+    Rates are loaded once for all foreign fiat currencies the trades touch.
+    With the span of the trades given (e.g. TradeSpan.load for a stream of
+    crud.iter_user_trades) the trades are iterated once and never held in
+    memory; otherwise they are read into a list to find it.
+    """
+    if span is None:
+        trades = list(trades)
+        span = TradeSpan.of(trades)
+    fiat_currencies = get_fiat_currencies(db_session)
+    foreign_fiat = {
+        canonical_currency(currency or "") for currency in span.currencies
+    } & (fiat_currencies - {BASE_CURRENCY})
+    rates = RateIndex()
+    if foreign_fiat:
+        rates = RateIndex.load(
+            db_session=db_session,
+            currencies=foreign_fiat,
+            start_date=span.first_day - timedelta(days=RATE_LOOKBACK_DAYS),
+            end_date=span.last_day,
+        )
+    report = compute_yearly_totals(trades, fiat_currencies, rates)
+    if year is not None:
+        report["years"] = [
+            totals for totals in report["years"] if totals["year"] == year
+        ]
+    return report
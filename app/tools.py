@@ -1,9 +1,12 @@
 import hashlib
 import json
 import re
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 from fastapi import HTTPException
 from decimal import Decimal
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
 
 
 def chunked(iterable, n):
@@ -25,6 +28,15 @@ def datetime_from_str(date_str: str | None) -> datetime | None:
         )
 
 
+def as_date(value) -> date:
+    """Date of a datetime or ISO string as returned by the database drivers."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
 def timestamp_from_str(date_str: str | None) -> int | None:
     if not date_str:
         return None
@@ -40,18 +52,15 @@ def datetime_from_miliseconds(miliseconds: int | None) -> datetime | None:
 
 
 def convert_time_to_ms(time: str) -> int:
-    print(f"Provided time string: {time}")
     if not isinstance(time, datetime):
         dt = datetime.strptime(time, "%Y-%m-%d %H:%M")
     else:
         dt = time
     dt = dt.replace(tzinfo=timezone.utc)
     now = datetime.now(timezone.utc)
-    print(f"Provided time: {dt}")
-    print(f"Current time: {now}")
     if dt > now:
+        logger.debug("Time %s is in the future, %s is used instead.", dt, now)
         dt = now  # Think about raising error here
-    print(f"Used time: {dt}")
     timestamp_ms = int(dt.timestamp() * 1000)
     return timestamp_ms
 
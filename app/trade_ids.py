@@ -0,0 +1,278 @@
+"""
+Trade ids (primary key part of trades) derived from the trade's fields.
+
+v1: sha256 of the fields serialized with json.dumps(sort_keys=True), the
+    same as tools.generate_hash. Default, so existing ids keep matching.
+v2: blake2b of the fields in a fixed order joined by a separator, prefixed
+    with "v2" (64 characters like v1). Numbers are written normalized, so v2
+    ids can be recomputed from stored rows (see migrate_trade_ids).
+
+The scheme is chosen with TRADE_ID_SCHEME. Switch to v2 only after running
+the migration, otherwise imports no longer recognize stored trades:
+
+    python -m app.trade_ids migrate
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from functools import partial
+from json.encoder import encode_basestring_ascii
+from typing import Sequence
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+from app import models
+from app.database import Database
+from app.logging_config import get_logger
+from app.tools import generate_hash, string
+
+TRADE_ID_SCHEME_ENV = "TRADE_ID_SCHEME"
+TRADE_ID_PROCESSES_ENV = "TRADE_ID_PROCESSES"
+DEFAULT_SCHEME = "v1"
+SCHEMES = ("v1", "v2")
+V2_PREFIX = "v2"
+# 31 bytes are 62 hex characters, with the prefix 64 like a sha256 hex digest
+V2_DIGEST_SIZE = 31
+V2_SEPARATOR = "\x1f"
+V2_FIELDS = (
+    "utc_time",
+    "bought_currency",
+    "sold_currency",
+    "price",
+    "bought_amount",
+    "sold_amount",
+    "fee_currency",
+    "fee_amount",
+    "original_id",
+    "exchange",
+    "user",
+)
+NUMBER_FIELDS = ("price", "bought_amount", "sold_amount", "fee_amount")
+# Below this many trades a process pool costs more than it saves
+PROCESS_POOL_MIN_ROWS = 100_000
+# Precision of utc_time in the hashed fields of each exchange's parsers
+HASH_TIME_FORMATS = {"Binance": "%Y-%m-%d %H:%M:%S", "Kanga": "%Y-%m-%d %H:%M"}
+MIGRATION_BATCH_SIZE = 1000
+logger = get_logger(__name__)
+
+
+def current_scheme() -> str:
+    scheme = os.getenv(TRADE_ID_SCHEME_ENV, DEFAULT_SCHEME).lower()
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown trade id scheme: {scheme}")
+    return scheme
+
+
+def _json_value(value) -> str:
+    """value written the way json.dumps writes it."""
+    return encode_basestring_ascii(value) if type(value) is str else json.dumps(value)
+
+
+def _number(value) -> str:
+    if value is None:
+        return ""
+    return string(value if isinstance(value, Decimal) else Decimal(str(value)))
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def trade_id_v1(fields: dict) -> str:
+    return generate_hash(input_dict=fields)
+
+
+def trade_id_v2(fields: dict) -> str:
+    source = V2_SEPARATOR.join(
+        _number(fields[name]) if name in NUMBER_FIELDS else _text(fields[name])
+        for name in V2_FIELDS
+    )
+    digest = hashlib.blake2b(source.encode("utf-8"), digest_size=V2_DIGEST_SIZE)
+    return V2_PREFIX + digest.hexdigest()
+
+
+def trade_id(fields: dict, scheme: str | None = None) -> str:
+    """Id of one trade from its hashed fields (strings as built by parsers)."""
+    if (scheme or current_scheme()) == "v2":
+        return trade_id_v2(fields)
+    return trade_id_v1(fields)
+
+
+def _is_constant(values) -> bool:
+    return values is None or isinstance(values, str)
+
+
+def _rows(columns: dict) -> int:
+    lengths = {len(values) for values in columns.values() if not _is_constant(values)}
+    if len(lengths) > 1:
+        raise ValueError("Columns of trade fields differ in length.")
+    return lengths.pop() if lengths else 1
+
+
+def _column(values, rows: int, convert) -> list[str]:
+    """Converted column; values repeated within it are converted once."""
+    if _is_constant(values):
+        return [convert(values)] * rows
+    converted: dict = {}
+    result = []
+    for value in values:
+        # Typed key: 0 and 0.0 are equal but are written differently
+        key = (value.__class__, value)
+        if key not in converted:
+            converted[key] = convert(value)
+        result.append(converted[key])
+    return result
+
+
+def _json_field(name: str, value) -> str:
+    return f'"{name}":{_json_value(value)}'
+
+
+def _ids_v1(columns: dict) -> list[str]:
+    rows = _rows(columns)
+    names = sorted(columns)
+    parts = [_column(columns[name], rows, partial(_json_field, name)) for name in names]
+    return [
+        hashlib.sha256(("{" + ",".join(row) + "}").encode("utf-8")).hexdigest()
+        for row in zip(*parts)
+    ]
+
+
+def _ids_v2(columns: dict) -> list[str]:
+    rows = _rows(columns)
+    parts = [
+        _column(columns[name], rows, _number if name in NUMBER_FIELDS else _text)
+        for name in V2_FIELDS
+    ]
+    return [
+        V2_PREFIX
+        + hashlib.blake2b(
+            V2_SEPARATOR.join(row).encode("utf-8"), digest_size=V2_DIGEST_SIZE
+        ).hexdigest()
+        for row in zip(*parts)
+    ]
+
+
+def _ids_of_chunk(scheme: str, columns: dict) -> list[str]:
+    return _ids_v2(columns) if scheme == "v2" else _ids_v1(columns)
+
+
+def trade_ids(
+    columns: dict[str, Sequence | str],
+    scheme: str | None = None,
+    processes: int | None = None,
+) -> list[str]:
+    """
+    Ids of many trades at once, equal to trade_id of each row. columns maps
+    every hashed field to a column of values or to one string shared by all
+    trades. With processes (default TRADE_ID_PROCESSES) large inputs are
+    hashed in parallel worker processes.
+    """
+    scheme = scheme or current_scheme()
+    if processes is None:
+        processes = int(os.getenv(TRADE_ID_PROCESSES_ENV, 0))
+    rows = _rows(columns)
+    if processes < 2 or rows < PROCESS_POOL_MIN_ROWS:
+        return _ids_of_chunk(scheme, columns)
+    size = -(-rows // processes)
+    chunks = [
+        {
+            name: values if _is_constant(values) else values[start : start + size]
+            for name, values in columns.items()
+        }
+        for start in range(0, rows, size)
+    ]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = executor.map(_ids_of_chunk, [scheme] * len(chunks), chunks)
+        return [trade_id for chunk_ids in results for trade_id in chunk_ids]
+
+
+def stored_trade_id_v2(trade: dict, exchange: str, user: str) -> str:
+    """
+    v2 id of a stored trade row, the same one its parser computes: time at
+    the exchange's hash precision and original_id left out like in parsing.
+    """
+    time_format = HASH_TIME_FORMATS.get(exchange, HASH_TIME_FORMATS["Binance"])
+    return trade_id_v2(
+        {
+            **trade,
+            "utc_time": trade["utc_time"].strftime(time_format),
+            "original_id": "",
+            "exchange": exchange,
+            "user": user,
+        }
+    )
+
+
+def migrate_trade_ids(
+    db_session: Session, batch_size: int = MIGRATION_BATCH_SIZE
+) -> dict:
+    """
+    Rewrites v1 ids in trades to v2 in batches, each batch one executemany
+    UPDATE. Rows already on v2 are left alone, so the job can be resumed.
+    v1 cannot be recomputed from stored rows (it hashed the raw exported
+    text), so there is no way back.
+    """
+    exchanges = dict(
+        db_session.execute(select(models.Exchanges.id, models.Exchanges.name)).all()
+    )
+    users = dict(db_session.execute(select(models.Users.id, models.Users.name)).all())
+    trades = models.Trades.__table__
+    rename = (
+        update(trades)
+        .where(
+            trades.c.id == bindparam("old_id"),
+            trades.c.utc_time == bindparam("old_time"),
+        )
+        .values(id=bindparam("new_id"))
+    )
+    migrated = 0
+    while True:
+        rows = (
+            db_session.execute(
+                select(trades)
+                .where(trades.c.id.not_like(V2_PREFIX + "%"))
+                .order_by(trades.c.utc_time, trades.c.id)
+                .limit(batch_size)
+            )
+            .mappings()
+            .all()
+        )
+        if not rows:
+            break
+        db_session.execute(
+            rename,
+            [
+                {
+                    "old_id": row["id"],
+                    "old_time": row["utc_time"],
+                    "new_id": stored_trade_id_v2(
+                        dict(row),
+                        exchanges.get(row["exchange_id"], ""),
+                        users.get(row["user_id"], ""),
+                    ),
+                }
+                for row in rows
+            ],
+        )
+        db_session.commit()
+        migrated += len(rows)
+        logger.info("Migrated %d trade ids to v2.", migrated)
+    return {"migrated_trades": migrated}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Trade id scheme tools")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    with Database().SessionLocal() as db_session:
+        result = migrate_trade_ids(db_session, batch_size=args.batch_size)
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
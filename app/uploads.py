@@ -0,0 +1,137 @@
+"""
+Ledger of imported export files. Uploads are hashed while they are read;
+a file identical to an earlier import of the same user, exchange, file type
+and parser options is answered from the ledger without parsing it again.
+For CSV exports that extend an earlier import (the old file plus appended
+rows) only the appended rows need parsing.
+"""
+
+import hashlib
+import json
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import BinaryIO, Sequence
+from sqlalchemy.orm import Session
+from app import crud, models
+from app.logging_config import get_logger
+
+UPLOAD_CHUNK_SIZE = 1 << 20
+logger = get_logger(__name__)
+
+
+@dataclass
+class Upload:
+    content: bytes | None
+    content_hash: str
+    size: int
+    # Earlier import of the same bytes
+    previous: models.Uploads | None = None
+    # Longest earlier import whose bytes begin this upload
+    prefix: models.Uploads | None = None
+
+
+def read_upload(
+    file: BinaryIO, earlier: Sequence[models.Uploads], keep_content: bool = True
+) -> Upload:
+    """
+    Reads an upload in chunks, hashing on the way. Chunks end at the sizes
+    of earlier imports, so the running digest at those offsets tells
+    whether an earlier import is a prefix of this one. The file is left at
+    its start for readers that stream it again.
+    """
+    by_size: dict[int, list[models.Uploads]] = {}
+    for upload in earlier:
+        by_size.setdefault(upload.size, []).append(upload)
+    stops = sorted(by_size)
+    sha256 = hashlib.sha256()
+    chunks: list[bytes] = []
+    prefix_hashes: dict[int, str] = {}
+    size = 0
+    file.seek(0)
+    while True:
+        limit = UPLOAD_CHUNK_SIZE
+        next_stop = bisect_right(stops, size)
+        if next_stop < len(stops):
+            limit = min(limit, stops[next_stop] - size)
+        chunk = file.read(limit)
+        if not chunk:
+            break
+        sha256.update(chunk)
+        size += len(chunk)
+        if keep_content:
+            chunks.append(chunk)
+        if size in by_size:
+            prefix_hashes[size] = sha256.hexdigest()
+    file.seek(0)
+    upload = Upload(
+        content=b"".join(chunks) if keep_content else None,
+        content_hash=sha256.hexdigest(),
+        size=size,
+    )
+    for earlier_upload in by_size.get(size, []):
+        if earlier_upload.content_hash == upload.content_hash:
+            upload.previous = earlier_upload
+    for prefix_size in reversed(stops[: bisect_right(stops, size - 1)]):
+        for earlier_upload in by_size[prefix_size]:
+            if earlier_upload.content_hash == prefix_hashes.get(prefix_size):
+                upload.prefix = earlier_upload
+                return upload
+    return upload
+
+
+def csv_tail(content: bytes, prefix_size: int) -> bytes | None:
+    """
+    The header line and the rows after the first prefix_size bytes of a CSV
+    file, or None when the prefix does not end with a whole row.
+    """
+    header_end = content.find(b"\n") + 1
+    if not 0 < header_end <= prefix_size or content[prefix_size - 1] != ord("\n"):
+        return None
+    return content[:header_end] + content[prefix_size:]
+
+
+def duplicate_result(previous: models.Uploads) -> dict:
+    return {
+        "duplicate_upload": True,
+        "upload_id": previous.id,
+        "uploaded_at": previous.uploaded_at,
+        "row_count": previous.row_count,
+        "result": json.loads(previous.result or "{}"),
+    }
+
+
+def record_upload(
+    db_session: Session,
+    upload: Upload,
+    user: str,
+    exchange: str,
+    file_type: str,
+    row_count: int,
+    result: dict,
+    options: str = "",
+) -> None:
+    """Adds a successful import to the ledger; failed ones are parsed again."""
+    if "message" in result:
+        return
+    crud.create_upload(
+        db_session,
+        {
+            "content_hash": upload.content_hash,
+            "size": upload.size,
+            "user": user,
+            "exchange": exchange,
+            "file_type": file_type,
+            "options": options,
+            "row_count": row_count,
+            "result": json.dumps(result, default=str),
+            "uploaded_at": datetime.now(timezone.utc).replace(tzinfo=None),
+        },
+    )
+    logger.info(
+        "Recorded upload %s (%d bytes, %d rows) of %s.",
+        upload.content_hash,
+        upload.size,
+        row_count,
+        user,
+    )
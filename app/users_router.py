@@ -3,8 +3,10 @@ from typing import Annotated
 from app.dependencies import get_db_session
 from sqlalchemy.orm import Session
 from app import crud
+from app.logging_config import get_logger
 
 router = APIRouter(prefix="/users", tags=["Users"])
+logger = get_logger(__name__)
 
 
 @router.get("/get_all_users")
@@ -25,7 +27,7 @@ def get_all_users(
         ]
         return {"Users": users_dicts}
     except Exception as e:
-        print(f"Error getting list of users: {str(e)}")
+        logger.error("Error getting list of users: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error getting list of users: {str(e)}",
@@ -41,7 +43,7 @@ def add_users(
     try:
         return crud.upsert_user(db_session=db_session, name=name)
     except Exception as e:
-        print(f"Error storing user: {str(e)}")
+        logger.error("Error storing user: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error storing user: {str(e)}",
@@ -0,0 +1,95 @@
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator
+import pandas as pd
+from openpyxl import load_workbook
+
+XLSX_BATCH_SIZE = 5000
+
+
+def _number_types(rows: Iterable[tuple], width: int) -> list[type | None]:
+    """
+    Type of the numbers of every column as pd.read_excel infers it over the
+    whole column: int when all values are whole numbers, float when some
+    are fractional or empty, None for columns with other values too.
+    """
+    fractional, empty, other = [False] * width, [False] * width, [False] * width
+    for row in rows:
+        if all(value is None for value in row):
+            continue
+        for column in range(width):
+            value = row[column] if column < len(row) else None
+            if value is None:
+                empty[column] = True
+            elif type(value) is float:
+                fractional[column] |= not value.is_integer()
+            elif type(value) is not int:
+                other[column] = True
+    return [
+        None if other[column] else float if fractional[column] or empty[column] else int
+        for column in range(width)
+    ]
+
+
+def _cell(value, number_type: type | None):
+    """
+    A number as read_excel gives it (ids hash str() of some of them): float
+    in float columns, else int when whole (Excel stores 30000 as 30000.0).
+    """
+    if type(value) is int or type(value) is float:
+        if number_type is float:
+            return float(value)
+        if type(value) is float and value.is_integer():
+            return int(value)
+    return value
+
+
+class XlsxBatches:
+    """
+    Rows of the first sheet of a workbook as DataFrames of at most batch_size
+    rows, read with openpyxl's read-only streaming parser, so memory does not
+    grow with the sheet. The first row names the columns. The sheet is read
+    twice, first to infer the number type of every column like read_excel.
+
+        with XlsxBatches(file) as sheet:
+            missing = required - set(sheet.columns)
+            for df in sheet: ...
+    """
+
+    def __init__(self, file: BinaryIO, batch_size: int = XLSX_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._workbook = load_workbook(file, read_only=True, data_only=True)
+        self._sheet = self._workbook.worksheets[0]
+        header = list(next(self._sheet.iter_rows(max_row=1, values_only=True), ()))
+        while header and header[-1] is None:
+            header.pop()
+        self.columns = [str(name) for name in header]
+        self._number_types = _number_types(
+            self._sheet.iter_rows(min_row=2, values_only=True), len(self.columns)
+        )
+        self.rows_read = 0
+
+    def __enter__(self) -> "XlsxBatches":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._workbook.close()
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        width = len(self.columns)
+        # Rows without any value (Excel leaves some after the data) are skipped
+        rows = (
+            [
+                _cell(value, number_type)
+                for value, number_type in zip(row[:width], self._number_types)
+            ]
+            + [None] * (width - len(row))
+            for row in self._sheet.iter_rows(min_row=2, values_only=True)
+            if any(value is not None for value in row)
+        )
+        while batch := list(islice(rows, self.batch_size)):
+            index = range(self.rows_read, self.rows_read + len(batch))
+            self.rows_read += len(batch)
+            yield pd.DataFrame(batch, columns=self.columns, index=index)
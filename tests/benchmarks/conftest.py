@@ -0,0 +1,285 @@
+"""
+Fixtures of the offline sync benchmarks.
+
+Upstream exchanges are synthetic: the first run of a flow is recorded into a
+cassette through a fake transport, the measured runs are served from that
+cassette by the replay stub server. Real recordings (made with
+tests.replay.recording) can be used instead by pointing BENCHMARK_CASSETTES
+to a directory with <flow>.jsonl files.
+"""
+
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+import keyring
+import pytest
+from fastapi.testclient import TestClient
+from app import crud, models
+from app.base import Base
+from app.binance_service import BinanceService
+from app.database import Database
+from app.dependencies import (
+    get_binance_service,
+    get_db,
+    get_db_session,
+    get_kanga_service,
+)
+from app.kanga_service import KangaService
+from app.main import app
+from app.rate_limiter import RateLimiter
+from tests.replay import Cassette, recording, replaying
+from tests.synthetic_data import make_symbols, symbol_records
+
+ROWS = int(os.getenv("BENCHMARK_ROWS", "1000"))
+ROUNDS = int(os.getenv("BENCHMARK_ROUNDS", "3"))
+SYMBOLS = int(os.getenv("BENCHMARK_SYMBOLS", "10"))
+DUPLICATE_RATIO = float(os.getenv("BENCHMARK_DUPLICATES", "0.01"))
+CASSETTES_DIR = os.getenv("BENCHMARK_CASSETTES")
+# Fixed "now" of the synthetic exchanges, so recorded requests are stable
+LAST_OPEN_TIME_MS = int(datetime(2024, 6, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _ms(moment: str) -> int:
+    parsed = datetime.strptime(moment, "%Y-%m-%dT%H:%M:%S.%fZ")
+    return int(parsed.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class KlineExchange:
+    """Binance klines of one symbol, one candle per minute back from the end."""
+
+    def __init__(self, rows: int):
+        self.open_times = [LAST_OPEN_TIME_MS - 60_000 * i for i in range(rows)][::-1]
+
+    def __call__(self, method, url, body):
+        query = dict(parse_qsl(urlsplit(url).query))
+        end = int(query.get("endTime", LAST_OPEN_TIME_MS))
+        limit = int(query.get("limit", 500))
+        page = [open_time for open_time in self.open_times if open_time <= end]
+        return 200, [
+            [open_time, "42000.5", "42010", "41990", "42005.5", "1.5"]
+            for open_time in page[-limit:]
+        ]
+
+
+class DepositExchange:
+    """Binance deposit history, evenly spread between first_day and last_day."""
+
+    def __init__(self, rows: int, first_day: datetime, last_day: datetime):
+        step = (last_day - first_day) / rows
+        self.deposits = [
+            {
+                "id": f"deposit-{i}",
+                "amount": "0.1",
+                "coin": "BTC",
+                "network": "BTC",
+                "status": 1,
+                "address": "bc1qbenchmark",
+                "addressTag": "",
+                "txId": f"tx-{i}",
+                "insertTime": int((first_day + step * i).timestamp() * 1000),
+                "transferType": 0,
+                "confirmTimes": "2/2",
+                "unlockConfirm": 2,
+                "walletType": 0,
+            }
+            for i in range(rows)
+        ]
+
+    def __call__(self, method, url, body):
+        query = dict(parse_qsl(urlsplit(url).query))
+        start, end = int(query["startTime"]), int(query["endTime"])
+        return 200, [
+            deposit
+            for deposit in self.deposits
+            if start <= deposit["insertTime"] <= end
+        ]
+
+
+class KangaHistoryExchange:
+    """Kanga transaction history returning at most limit items per window."""
+
+    def __init__(self, rows: int, first_day: datetime, days: int):
+        step = timedelta(days=days) / rows
+        self.trades = []
+        for i in range(rows):
+            created = first_day + step * i
+            self.trades.append(
+                {
+                    "id": f"kanga-{i}",
+                    "created": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "created_ms": int(created.timestamp() * 1000),
+                    "side": "BUYER" if i % 2 else "SELLER",
+                    "buyingCurrency": "BTC",
+                    "payingCurrency": "PLN",
+                    "quantity": "0.001",
+                    "value": "250.5",
+                    "price": "250500",
+                    "feeCurrency": "PLN",
+                    "fee": "0.25",
+                }
+            )
+
+    def __call__(self, method, url, body):
+        request = json.loads(body)
+        start, end = _ms(request["startTime"]), _ms(request["endTime"])
+        page = [trade for trade in self.trades if start <= trade["created_ms"] <= end]
+        return 200, {"result": "ok", "list": page[: int(request["limit"])]}
+
+
+@pytest.fixture
+def bench_database(monkeypatch, tmp_path):
+    """File backed SQLite database created the way the application does it."""
+    monkeypatch.setenv("USE_SQL_SERVER", "false")
+    monkeypatch.chdir(tmp_path)
+    database = Database()
+    app.dependency_overrides[get_db] = lambda: database
+    app.dependency_overrides[get_db_session] = database.get_db_session
+    yield database
+    app.dependency_overrides.clear()
+    database.engine.dispose()
+
+
+@pytest.fixture
+def reset_database(bench_database):
+    """
+    Setup of every measured round: empty tables, known Binance symbols, users
+    and exchanges (SmallInteger keys are not autoincremented by SQLite).
+    """
+
+    def reset():
+        Base.metadata.drop_all(bind=bench_database.engine)
+        Base.metadata.create_all(bind=bench_database.engine)
+        with bench_database.SessionLocal() as db_session:
+            db_session.add_all(
+                [
+                    models.Users(id=1, name="MARIUSZ"),
+                    models.Users(id=2, name="MARCELINA"),
+                    models.Users(id=3, name="bench-user"),
+                    models.Exchanges(id=1, name="Binance"),
+                    models.Exchanges(id=2, name="Kanga"),
+                ]
+            )
+            db_session.commit()
+            for symbol_data in symbol_records(make_symbols(SYMBOLS)):
+                crud.create_binance_symbol(db_session, symbol_data)
+
+    return reset
+
+
+@pytest.fixture
+def bench_client(monkeypatch, bench_database):
+    """Client with exchange services that are never throttled locally."""
+
+    def fake_get_password(service_name, username):
+        return {"api_key": "bench-key", "api_secret": "bench-secret"}.get(
+            username, "bench-user"
+        )
+
+    monkeypatch.setattr(keyring, "get_password", fake_get_password)
+    binance_service = BinanceService(
+        "bench", limiter=RateLimiter("binance-bench", max_weight=10**9)
+    )
+    kanga_service = KangaService(
+        "bench", limiter=RateLimiter("kanga-bench", max_weight=10**9)
+    )
+    app.dependency_overrides[get_binance_service] = lambda: binance_service
+    app.dependency_overrides[get_kanga_service] = lambda: kanga_service
+    return TestClient(app)
+
+
+@pytest.fixture
+def cassette_for(tmp_path):
+    """
+    Returns the cassette of a flow: a real recording from BENCHMARK_CASSETTES
+    or one recorded now by running the flow against the synthetic exchange.
+    """
+
+    def _cassette_for(name: str, transport, run) -> Cassette:
+        if CASSETTES_DIR and (Path(CASSETTES_DIR) / f"{name}.jsonl").exists():
+            return Cassette.load(Path(CASSETTES_DIR) / f"{name}.jsonl")
+        path = tmp_path / f"{name}.jsonl"
+        with recording(path, transport=transport):
+            run()
+        return Cassette.load(path)
+
+    return _cassette_for
+
+
+@pytest.fixture
+def run_replayed(benchmark, reset_database):
+    """
+    Measures run() served from the cassette, starting every round with an
+    empty database, and reports the rows stored per second.
+    """
+
+    def _run_replayed(cassette: Cassette | None, run, rows: int):
+        def setup():
+            reset_database()
+            if cassette is not None:
+                cassette.rewind()
+
+        if cassette is None:
+            result = benchmark.pedantic(run, setup=setup, rounds=ROUNDS)
+        else:
+            with replaying(cassette):
+                result = benchmark.pedantic(run, setup=setup, rounds=ROUNDS)
+        benchmark.extra_info["rows"] = rows
+        if benchmark.stats is not None:
+            benchmark.extra_info["rows_per_second"] = round(
+                rows / benchmark.stats.stats.mean, 1
+            )
+        return result
+
+    return _run_replayed
+
+
+@pytest.fixture
+def run_components(benchmark, reset_database):
+    """
+    Measures parse() followed by insert(parsed) from an empty database and
+    reports the time of both phases. A last unmeasured run is traced with
+    tracemalloc for the peak memory of each phase.
+    """
+
+    def _run_components(rows: int, parse, insert):
+        timings = {"parse": [], "insert": []}
+
+        def run():
+            started = time.perf_counter()
+            parsed = parse()
+            parsed_at = time.perf_counter()
+            result = insert(parsed)
+            timings["parse"].append(parsed_at - started)
+            timings["insert"].append(time.perf_counter() - parsed_at)
+            return result
+
+        result = benchmark.pedantic(run, setup=reset_database, rounds=ROUNDS)
+        reset_database()
+        tracemalloc.start()
+        try:
+            parsed = parse()
+            parsed_size, parse_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            insert(parsed)
+            insert_peak = tracemalloc.get_traced_memory()[1] - parsed_size
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info.update(
+            {
+                "rows": rows,
+                "parse_seconds": round(min(timings["parse"]), 4),
+                "insert_seconds": round(min(timings["insert"]), 4),
+                "parse_peak_mb": round(parse_peak / 2**20, 2),
+                "insert_peak_mb": round(insert_peak / 2**20, 2),
+                "rows_per_second": round(
+                    rows / min(a + b for a, b in zip(*timings.values())), 1
+                ),
+            }
+        )
+        return result
+
+    return _run_components
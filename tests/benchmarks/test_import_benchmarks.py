@@ -0,0 +1,247 @@
+"""
+Parse and insert timings and peak memory of the trade and candle importers
+on synthetic data. Sizes: BENCHMARK_ROWS, BENCHMARK_SYMBOLS and
+BENCHMARK_DUPLICATES (ratio of repeated trades).
+"""
+
+import zipfile
+from bisect import bisect_left
+from decimal import Decimal
+from functools import partial
+from io import BytesIO
+import pytest
+from app import crud
+from app.binance_service import BinanceService
+from app.kanga_service import KangaService
+from app.kline_archive import read_kline_csv
+from app.rate_limiter import RateLimiter
+from app.tools import string
+from tests.benchmarks.conftest import DUPLICATE_RATIO, ROUNDS, ROWS, SYMBOLS
+from tests.synthetic_data import (
+    binance_csv_lines,
+    csv_bytes,
+    generate_trades,
+    kanga_csv_lines,
+    kanga_history_items,
+    klines,
+    my_trades,
+    write_binance_xlsx,
+)
+
+pytest.importorskip("pytest_benchmark")
+
+
+class MyTradesClient:
+    """Stands in for the Spot client; pages myTrades by fromId like Binance."""
+
+    def __init__(self, trades: list[dict]):
+        self.trades: dict[str, list[dict]] = {}
+        for trade in trades:
+            self.trades.setdefault(trade["symbol"], []).append(trade)
+        self.ids = {
+            symbol: [trade["id"] for trade in symbol_trades]
+            for symbol, symbol_trades in self.trades.items()
+        }
+
+    def my_trades(self, symbol: str, limit: int = 500, fromId=None, **params):
+        start = bisect_left(self.ids.get(symbol, []), fromId or 0)
+        return self.trades.get(symbol, [])[start : start + limit]
+
+
+@pytest.fixture
+def binance_service():
+    return BinanceService(
+        "fake keyring system name",
+        limiter=RateLimiter("binance-bench", max_weight=10**9),
+    )
+
+
+@pytest.fixture
+def db_session(bench_database):
+    with bench_database.SessionLocal() as db_session:
+        yield db_session
+
+
+def _trades():
+    return generate_trades(ROWS, SYMBOLS, DUPLICATE_RATIO)
+
+
+def test_binance_csv_import(binance_service, db_session, run_components):
+    csv_file = csv_bytes(binance_csv_lines(_trades()))
+    result = run_components(
+        ROWS,
+        lambda: binance_service.parse_trades_from_csv(
+            db_session=db_session, csv_file=csv_file, user="MARIUSZ"
+        ),
+        lambda trades: crud.upsert_trade_records(
+            db_session=db_session,
+            user="MARIUSZ",
+            exchange="Binance",
+            trades_data=trades,
+        ),
+    )
+    assert result["fetched_trades"] == ROWS
+
+
+def test_binance_xlsx_import(binance_service, db_session, run_components):
+    xlsx_file = BytesIO()
+    write_binance_xlsx(xlsx_file, _trades())
+    result = run_components(
+        ROWS,
+        lambda: binance_service.parse_trades_from_xlsx(
+            db_session=db_session, xlsx_file=xlsx_file.getvalue(), user="MARIUSZ"
+        ),
+        lambda trades: crud.upsert_trade_records(
+            db_session=db_session,
+            user="MARIUSZ",
+            exchange="Binance",
+            trades_data=trades,
+        ),
+    )
+    assert result["fetched_trades"] == ROWS
+
+
+def test_binance_xlsx_stream_import(binance_service, db_session, run_components):
+    xlsx_file = BytesIO()
+    write_binance_xlsx(xlsx_file, _trades())
+    result = run_components(
+        ROWS,
+        lambda: binance_service.iter_trades_from_xlsx(
+            db_session=db_session,
+            xlsx_file=BytesIO(xlsx_file.getvalue()),
+            user="MARIUSZ",
+            batch_size=max(ROWS // 10, 1),
+        ),
+        lambda batches: crud.upsert_trade_batches(
+            db_session=db_session,
+            user="MARIUSZ",
+            exchange="Binance",
+            batches=batches,
+        ),
+    )
+    assert result["fetched_trades"] == ROWS
+
+
+def test_kanga_csv_import(monkeypatch, db_session, run_components):
+    monkeypatch.setattr("keyring.get_password", lambda system, key: key)
+    kanga_service = KangaService()
+    csv_file = csv_bytes(kanga_csv_lines(_trades()))
+    result = run_components(
+        ROWS,
+        lambda: kanga_service.parse_trades_from_csv(
+            csv_file=csv_file, timezone="Europe/Warsaw", user="MARIUSZ"
+        ),
+        lambda trades: crud.upsert_trade_records(
+            db_session=db_session,
+            user="MARIUSZ",
+            exchange="Kanga",
+            trades_data=trades,
+        ),
+    )
+    assert result["fetched_trades"] == ROWS
+
+
+def _parse_one_by_one(kanga_service: KangaService, kanga_trades: list[dict]):
+    """Per-trade string dict normalization the batch parser replaced."""
+    trades = []
+    for kanga_trade in kanga_trades:
+        buyer = kanga_trade["side"] == "BUYER"
+        quantity = string(Decimal(kanga_trade["quantity"]))
+        value = string(Decimal(kanga_trade["value"]))
+        currencies = (kanga_trade["buyingCurrency"], kanga_trade["payingCurrency"])
+        bought_currency, sold_currency = currencies if buyer else currencies[::-1]
+        trade_str = {
+            "utc_time": kanga_trade["created"].replace("T", " ").replace("Z", ""),
+            "bought_currency": bought_currency,
+            "sold_currency": sold_currency,
+            "price": str(kanga_trade["price"]),
+            "bought_amount": quantity if buyer else value,
+            "sold_amount": value if buyer else quantity,
+            "fee_currency": str(kanga_trade["feeCurrency"]),
+            "fee_amount": str(kanga_trade["fee"]),
+            "original_id": str(kanga_trade["id"]),
+            "id": "",
+            "exchange": "Kanga",
+            "user": kanga_service.user,
+        }
+        trades.append(kanga_service._parse_trade_from_strings(trade_str))
+    return trades
+
+
+@pytest.mark.parametrize("mode", ["per_trade", "batch"])
+def test_kanga_api_normalization(benchmark, monkeypatch, mode):
+    monkeypatch.setattr("keyring.get_password", lambda system, key: key)
+    kanga_service = KangaService()
+    kanga_trades = list(kanga_history_items(_trades()))
+    if mode == "batch":
+        parse = kanga_service._parse_trades_from_api
+    else:
+        parse = partial(_parse_one_by_one, kanga_service)
+    trades = benchmark.pedantic(parse, args=(kanga_trades,), rounds=ROUNDS)
+    benchmark.extra_info.update(
+        {
+            "rows": ROWS,
+            "microseconds_per_trade": round(
+                benchmark.stats.stats.min / ROWS * 1_000_000, 2
+            ),
+        }
+    )
+    assert trades == kanga_service._parse_trades_from_api(kanga_trades)
+
+
+def test_my_trades_store(binance_service, bench_database, db_session, run_components):
+    api_trades = list(my_trades(_trades()))
+    binance_service.client = MyTradesClient(api_trades)
+    symbols = sorted(binance_service.client.trades)
+    stored = run_components(
+        len(api_trades),
+        lambda: [
+            trade
+            for symbol in symbols
+            for trade in binance_service.fetch_all_trades_for_symbol(symbol)
+        ],
+        lambda trades: bench_database.store_trades(
+            db_session=db_session, trades=trades
+        ),
+    )
+    assert len(stored) == len(api_trades)
+
+
+def test_kline_import(binance_service, db_session, run_components):
+    data = list(klines(ROWS))
+
+    def insert(prices):
+        saved_count = 0
+        for price in prices:
+            if not crud.candle_exists(
+                db_session, price["symbol"], price["interval"], price["time"]
+            ):
+                crud.create_candle(db_session, price)
+                saved_count += 1
+        return saved_count
+
+    saved = run_components(
+        ROWS,
+        lambda: binance_service.parse_klines(data, "BTCUSDT", "1m"),
+        insert,
+    )
+    assert saved == ROWS
+
+
+def test_kline_archive_import(db_session, run_components):
+    lines = "".join(",".join(map(str, kline)) + "\n" for kline in klines(ROWS))
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("BTCUSDT-1m-2024-01.csv", lines)
+
+    def parse():
+        with zipfile.ZipFile(BytesIO(archive.getvalue())) as zip_file:
+            with zip_file.open("BTCUSDT-1m-2024-01.csv") as stream:
+                return list(read_kline_csv(stream, "BTCUSDT", "1m"))
+
+    saved = run_components(
+        ROWS,
+        parse,
+        lambda chunks: sum(crud.upsert_candles(db_session, chunk) for chunk in chunks),
+    )
+    assert saved == ROWS
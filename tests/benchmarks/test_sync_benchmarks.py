@@ -0,0 +1,89 @@
+"""
+End-to-end throughput of the sync pipelines against SQLite, offline.
+Run with: pytest tests/benchmarks --benchmark-only
+"""
+
+from datetime import datetime, timezone
+import pytest
+from tests.benchmarks.conftest import (
+    ROWS,
+    SYMBOLS,
+    DepositExchange,
+    KangaHistoryExchange,
+    KlineExchange,
+)
+from tests.synthetic_data import binance_csv_lines, csv_bytes, generate_trades
+
+pytest.importorskip("pytest_benchmark")
+
+
+def test_kline_backfill(bench_client, cassette_for, reset_database, run_replayed):
+    def run():
+        response = bench_client.post(
+            "/fetch_and_store_prices_stream",
+            params={"symbol": "BTCUSDT", "interval": "1m"},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    reset_database()
+    cassette = cassette_for("kline_backfill", KlineExchange(ROWS), run)
+    result = run_replayed(cassette, run, ROWS)
+    assert f"saved {ROWS} to database" in result["message"]
+
+
+def test_trade_csv_import(bench_client, run_replayed):
+    csv_file = csv_bytes(binance_csv_lines(generate_trades(ROWS, SYMBOLS)))
+
+    def run():
+        response = bench_client.post(
+            "/binance/upload-csv",
+            params={"user": "MARIUSZ"},
+            files={"file": ("trades.csv", csv_file, "text/csv")},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    result = run_replayed(None, run, ROWS)
+    assert result["inserted_trades"] == ROWS
+
+
+def test_kanga_range_sync(bench_client, cassette_for, reset_database, run_replayed):
+    # With the default rows a day fills a history page, so windows are split
+    exchange = KangaHistoryExchange(
+        ROWS, datetime(2024, 1, 1, tzinfo=timezone.utc), days=2
+    )
+
+    def run():
+        response = bench_client.get(
+            "/kanga/get_and_store_trades_list_for_time_period",
+            params={"start_date": "2024-01-01", "end_date": "2024-01-02"},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    reset_database()
+    cassette = cassette_for("kanga_range_sync", exchange, run)
+    result = run_replayed(cassette, run, ROWS)
+    assert result["inserted_trades"] == ROWS
+
+
+def test_deposit_sync(bench_client, cassette_for, reset_database, run_replayed):
+    exchange = DepositExchange(
+        ROWS,
+        datetime(2023, 1, 1, tzinfo=timezone.utc),
+        datetime(2024, 12, 31, tzinfo=timezone.utc),
+    )
+
+    def run():
+        response = bench_client.post(
+            "/fetch_and_store_all_deposits",
+            params={"earliest_date": "2023-01-01", "latest_date": "2024-12-31"},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    reset_database()
+    cassette = cassette_for("deposit_sync", exchange, run)
+    result = run_replayed(cassette, run, ROWS)
+    assert result == {"fetched": ROWS, "stored": ROWS}
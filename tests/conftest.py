@@ -3,10 +3,14 @@ import keyring
 from unittest.mock import patch, MagicMock
 from app.binance_service import BinanceService
 from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.base import Base
 from app.main import app
 from app.dependencies import get_binance_service, get_db, get_db_session
 from app.database import Database
+from app.rate_limiter import reset_limiters
 
 
 @pytest.fixture(autouse=True)
@@ -25,6 +29,14 @@ def mock_keyring(monkeypatch):
     monkeypatch.setattr(keyring, "get_password", fake_get_password)
 
 
+@pytest.fixture(autouse=True)
+def fresh_rate_limiters():
+    # Limiters are process wide; a 429 in one test must not pace the next one
+    reset_limiters()
+    yield
+    reset_limiters()
+
+
 @pytest.fixture
 def mocked_binance_service_instance():
     with patch("app.main.get_binance_service") as mocked_bs_instance:
@@ -84,6 +96,29 @@ def override_get_db_session(mocked_db_session):
     app.dependency_overrides.pop(get_db_session, None)
 
 
+@pytest.fixture
+def make_db_session():
+    """Factory of sessions, each of a new in-memory SQLite database."""
+    sessions = []
+
+    def make() -> Session:
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        sessions.append(sessionmaker(bind=engine)())
+        return sessions[-1]
+
+    yield make
+    for session in sessions:
+        session.close()
+
+
+@pytest.fixture
+def db_session(make_db_session):
+    return make_db_session()
+
+
 @pytest.fixture
 def mocked_db():
     return MagicMock(spec=Database)
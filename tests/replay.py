@@ -0,0 +1,228 @@
+"""
+Record/replay of exchange HTTP traffic for offline tests and benchmarks.
+
+Every request made through requests (module functions, Spot client and
+NbpService sessions) goes through requests.Session.request, which is wrapped:
+
+    with recording("tests/cassettes/kanga_week.jsonl"):
+        kanga_service.get_trades_for_time_period(...)   # real API calls
+
+    with replaying(Cassette.load("tests/cassettes/kanga_week.jsonl")):
+        kanga_service.get_trades_for_time_period(...)   # served by a stub server
+
+Requests are matched by method, host, path and normalized query/body, so
+signatures, timestamps and nonces do not matter.
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qsl, urlsplit
+import requests
+from app.response_cache import VOLATILE_PARAMS
+
+REPLAY_HOST_HEADER = "X-Replay-Host"
+RECORDED_HEADERS = ("content-type", "retry-after", "x-mbx-used-weight-1m")
+
+
+def _normalize_body(body) -> str:
+    if not body:
+        return ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    if isinstance(body, dict):
+        data = body
+    else:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = dict(parse_qsl(body))
+    if isinstance(data, dict):
+        data = {key: value for key, value in data.items() if key not in VOLATILE_PARAMS}
+    return json.dumps(data, sort_keys=True)
+
+
+def request_key(method: str, url: str, body=None) -> str:
+    parts = urlsplit(url)
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query)
+        if key not in VOLATILE_PARAMS
+    )
+    return json.dumps(
+        [method.upper(), parts.netloc, parts.path, query, _normalize_body(body)]
+    )
+
+
+class Cassette:
+    """Recorded responses; repeated identical requests are answered in order."""
+
+    def __init__(self):
+        self.responses: dict[str, list[dict]] = {}
+        self._served: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(
+        self, key: str, status: int, body: str, headers: dict | None = None
+    ) -> None:
+        self.responses.setdefault(key, []).append(
+            {"status": status, "headers": headers or {}, "body": body}
+        )
+
+    def add_json(self, method: str, url: str, payload, request_body=None) -> None:
+        self.add(
+            request_key(method, url, request_body),
+            200,
+            json.dumps(payload),
+            {"content-type": "application/json"},
+        )
+
+    def next_response(self, key: str) -> dict | None:
+        with self._lock:
+            responses = self.responses.get(key)
+            if not responses:
+                return None
+            position = self._served.get(key, 0)
+            self._served[key] = position + 1
+            return responses[min(position, len(responses) - 1)]
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._served.clear()
+
+    def save(self, path) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            for key, responses in self.responses.items():
+                for response in responses:
+                    file.write(json.dumps({"key": key, **response}) + "\n")
+
+    @classmethod
+    def load(cls, path) -> "Cassette":
+        cassette = cls()
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                entry = json.loads(line)
+                cassette.add(
+                    entry["key"], entry["status"], entry["body"], entry["headers"]
+                )
+        return cassette
+
+
+def _full_url(method: str, url: str, params) -> str:
+    return requests.Request(method, url, params=params).prepare().url
+
+
+class _TransportResponse:
+    def __init__(self, status_code: int, payload):
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+        self.headers = {"content-type": "application/json"}
+
+
+@contextmanager
+def recording(path, transport=None):
+    """
+    Performs requests and writes their responses to a cassette file.
+    transport(method, url, body) -> (status, payload) replaces the network,
+    e.g. to record a synthetic exchange for benchmarks.
+    """
+    cassette = Cassette()
+    original = requests.Session.request
+
+    def record(session, method, url, params=None, data=None, json=None, **kwargs):
+        full_url = _full_url(method, url, params)
+        if transport is None:
+            response = original(
+                session, method, url, params=params, data=data, json=json, **kwargs
+            )
+        else:
+            response = _TransportResponse(*transport(method, full_url, data or json))
+        cassette.add(
+            request_key(method, full_url, data or json),
+            response.status_code,
+            response.text,
+            {
+                key: value
+                for key, value in response.headers.items()
+                if key.lower() in RECORDED_HEADERS
+            },
+        )
+        if transport is None:
+            return response
+        return _as_requests_response(response)
+
+    with patch.object(requests.Session, "request", record):
+        try:
+            yield cassette
+        finally:
+            cassette.save(path)
+
+
+def _as_requests_response(response: _TransportResponse) -> requests.Response:
+    result = requests.Response()
+    result.status_code = response.status_code
+    result._content = response.text.encode("utf-8")
+    result.headers.update(response.headers)
+    result.encoding = "utf-8"
+    return result
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def _serve(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        url = f"http://{self.headers[REPLAY_HOST_HEADER]}{self.path}"
+        response = self.server.cassette.next_response(
+            request_key(self.command, url, body)
+        )
+        if response is None:
+            response = {"status": 599, "headers": {}, "body": "Not recorded"}
+        payload = response["body"].encode("utf-8")
+        self.send_response(response["status"])
+        for key, value in response["headers"].items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _serve
+    do_POST = _serve
+    do_DELETE = _serve
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cassette: Cassette):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.cassette = cassette
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+
+
+@contextmanager
+def replaying(cassette: Cassette):
+    """Serves every request from the cassette through a local stub server."""
+    server = StubServer(cassette)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    original = requests.Session.request
+
+    def replay(session, method, url, params=None, headers=None, **kwargs):
+        parts = urlsplit(_full_url(method, url, params))
+        stub_url = f"{server.url}{parts.path}" + (
+            f"?{parts.query}" if parts.query else ""
+        )
+        headers = dict(headers or {}, **{REPLAY_HOST_HEADER: parts.netloc})
+        return original(session, method, stub_url, headers=headers, **kwargs)
+
+    with patch.object(requests.Session, "request", replay):
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            server.server_close()
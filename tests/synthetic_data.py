@@ -0,0 +1,304 @@
+"""
+Synthetic exchange data of any size for import and upsert benchmarks.
+
+Trades are generated once (deterministic for a seed) and rendered in the
+formats the application imports: Binance CSV and XLSX exports, Kanga CSV
+exports (Polish columns), Binance myTrades responses and klines.
+
+    python -m tests.synthetic_data binance-csv --rows 1000000 \
+        --symbols 50 --duplicates 0.01 --output binance.csv
+"""
+
+import argparse
+import json
+import random
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator
+from zoneinfo import ZoneInfo
+from openpyxl import Workbook
+
+BASE_ASSETS = (
+    "BTC ETH BNB SOL ADA XRP DOT DOGE LTC LINK MATIC AVAX ATOM TRX ETC XLM "
+    "NEAR ALGO FIL APT ARB OP UNI AAVE SAND MANA AXS EGLD XTZ EOS"
+).split()
+QUOTE_ASSETS = ("USDT", "BTC", "EUR", "PLN")
+START_TIME = datetime(2023, 1, 1)
+KANGA_TIME_ZONE = "Europe/Warsaw"
+# Duplicates repeat one of the last trades, like overlapping exports do
+DUPLICATE_WINDOW = 1000
+FORMATS = ("binance-csv", "binance-xlsx", "kanga-csv", "my-trades", "klines")
+
+
+def make_symbols(count: int) -> list[tuple[str, str, str]]:
+    """Returns (symbol, base, quote) of count distinct trading pairs."""
+    pairs = [
+        (base + quote, base, quote)
+        for quote in QUOTE_ASSETS
+        for base in BASE_ASSETS
+        if base != quote
+    ]
+    if count > len(pairs):
+        raise ValueError(f"At most {len(pairs)} symbols can be generated.")
+    return pairs[:count]
+
+
+def symbol_records(symbols: Iterable[tuple[str, str, str]]) -> list[dict]:
+    """Symbols in the exchangeInfo shape accepted by crud.create_binance_symbol."""
+    return [
+        {"symbol": symbol, "status": "TRADING", "baseAsset": base, "quoteAsset": quote}
+        for symbol, base, quote in symbols
+    ]
+
+
+def _number(value: float, decimals: int = 8) -> str:
+    return f"{value:.{decimals}f}".rstrip("0").rstrip(".")
+
+
+def generate_trades(
+    rows: int,
+    symbols: int = 10,
+    duplicate_ratio: float = 0.0,
+    seed: int = 0,
+    start_time: datetime = START_TIME,
+) -> Iterator[dict]:
+    """
+    Yields rows trades in time order over symbols pairs. With duplicate_ratio
+    that part of rows repeats a recent trade exactly (same id and content).
+    """
+    rng = random.Random(seed)
+    pairs = make_symbols(symbols)
+    prices = {symbol: rng.uniform(0.01, 50_000) for symbol, _, _ in pairs}
+    recent: deque[dict] = deque(maxlen=DUPLICATE_WINDOW)
+    moment = start_time
+    trade_id = 0
+    for _ in range(rows):
+        if recent and rng.random() < duplicate_ratio:
+            yield rng.choice(recent)
+            continue
+        symbol, base, quote = rng.choice(pairs)
+        prices[symbol] *= rng.uniform(0.995, 1.005)
+        price = prices[symbol]
+        amount = rng.uniform(0.001, 10)
+        total = amount * price
+        side = rng.choice(("BUY", "SELL"))
+        trade_id += 1
+        moment += timedelta(seconds=rng.randint(0, 90))
+        trade = {
+            "id": trade_id,
+            "time": moment,
+            "symbol": symbol,
+            "base": base,
+            "quote": quote,
+            "side": side,
+            "price": _number(price),
+            "amount": _number(amount),
+            "total": _number(total),
+            # The fee is charged in the received currency
+            "fee": _number((amount if side == "BUY" else total) * 0.001),
+            "fee_asset": base if side == "BUY" else quote,
+        }
+        recent.append(trade)
+        yield trade
+
+
+def binance_csv_lines(trades: Iterable[dict]) -> Iterator[str]:
+    """Binance 'Trade History' CSV export."""
+    yield "Date(UTC),Pair,Side,Price,Executed,Amount,Fee\n"
+    for trade in trades:
+        yield (
+            f"{trade['time']:%Y-%m-%d %H:%M:%S},{trade['symbol']},{trade['side']},"
+            f"{trade['price']},{trade['amount']}{trade['base']},"
+            f"{trade['total']}{trade['quote']},{trade['fee']}{trade['fee_asset']}\n"
+        )
+
+
+def kanga_csv_lines(
+    trades: Iterable[dict], time_zone: str = KANGA_TIME_ZONE
+) -> Iterator[str]:
+    """Kanga CSV export; times are local to time_zone like in real exports."""
+    zone = ZoneInfo(time_zone)
+    yield "Data,Para,Strona,Ilość,Cena,Opłata,Suma\n"
+    for trade in trades:
+        side = "Kupujący" if trade["side"] == "BUY" else "Sprzedający"
+        local_time = trade["time"].replace(tzinfo=timezone.utc).astimezone(zone)
+        yield (
+            f"{local_time:%Y-%m-%d %H:%M:%S},{trade['base']}/{trade['quote']},{side},"
+            f"{trade['amount']} {trade['base']},{trade['price']} {trade['quote']},"
+            f"{trade['fee']} {trade['fee_asset']},{trade['total']} {trade['quote']}\n"
+        )
+
+
+def write_binance_xlsx(file, trades: Iterable[dict]) -> None:
+    """Binance XLSX export written in constant memory."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(
+        [
+            "Date(UTC)",
+            "Pair",
+            "Base Asset",
+            "Quote Asset",
+            "Type",
+            "Price",
+            "Amount",
+            "Total",
+            "Fee",
+            "Fee Coin",
+        ]
+    )
+    for trade in trades:
+        sheet.append(
+            [
+                f"{trade['time']:%Y-%m-%d %H:%M:%S}",
+                trade["symbol"],
+                trade["base"],
+                trade["quote"],
+                trade["side"],
+                trade["price"],
+                trade["amount"],
+                trade["total"],
+                trade["fee"],
+                trade["fee_asset"],
+            ]
+        )
+    workbook.save(file)
+
+
+def my_trades(trades: Iterable[dict]) -> Iterator[dict]:
+    """Binance myTrades items; the API never repeats a trade, so duplicates go."""
+    seen_ids = set()
+    for trade in trades:
+        if trade["id"] in seen_ids:
+            continue
+        seen_ids.add(trade["id"])
+        yield {
+            "symbol": trade["symbol"],
+            "id": trade["id"],
+            "orderId": trade["id"] * 10,
+            "orderListId": -1,
+            "price": trade["price"],
+            "qty": trade["amount"],
+            "quoteQty": trade["total"],
+            "commission": trade["fee"],
+            "commissionAsset": trade["fee_asset"],
+            "time": int(trade["time"].replace(tzinfo=timezone.utc).timestamp() * 1000),
+            "isBuyer": trade["side"] == "BUY",
+            "isMaker": trade["id"] % 3 == 0,
+            "isBestMatch": True,
+        }
+
+
+def kanga_history_items(trades: Iterable[dict]) -> Iterator[dict]:
+    """Kanga transaction history items (the "list" of a history response)."""
+    for trade in trades:
+        yield {
+            "id": f"kanga-{trade['id']}",
+            "created": f"{trade['time']:%Y-%m-%dT%H:%M:%SZ}",
+            "side": "BUYER" if trade["side"] == "BUY" else "SELLER",
+            "buyingCurrency": trade["base"],
+            "payingCurrency": trade["quote"],
+            "quantity": trade["amount"],
+            "value": trade["total"],
+            "price": trade["price"],
+            "feeCurrency": trade["fee_asset"],
+            "fee": trade["fee"],
+        }
+
+
+def klines(
+    rows: int, interval_ms: int = 60_000, seed: int = 0, start_time=START_TIME
+) -> Iterator[list]:
+    """Binance kline arrays of one symbol, oldest first."""
+    rng = random.Random(seed)
+    open_time = int(start_time.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    price = rng.uniform(100, 50_000)
+    for _ in range(rows):
+        open_price = price
+        price *= rng.uniform(0.995, 1.005)
+        high = max(open_price, price) * rng.uniform(1, 1.002)
+        low = min(open_price, price) * rng.uniform(0.998, 1)
+        volume = rng.uniform(0.1, 100)
+        yield [
+            open_time,
+            _number(open_price),
+            _number(high),
+            _number(low),
+            _number(price),
+            _number(volume),
+            open_time + interval_ms - 1,
+            _number(volume * price),
+            rng.randint(1, 500),
+            _number(volume / 2),
+            _number(volume * price / 2),
+            "0",
+        ]
+        open_time += interval_ms
+
+
+def csv_bytes(lines: Iterable[str]) -> bytes:
+    return "".join(lines).encode("utf-8")
+
+
+def _write_json_array(file, items: Iterable) -> None:
+    file.write("[")
+    for number, item in enumerate(items):
+        file.write(("," if number else "") + json.dumps(item))
+    file.write("]")
+
+
+def write(
+    data_format: str,
+    output,
+    rows: int,
+    symbols: int = 10,
+    duplicate_ratio: float = 0.0,
+    seed: int = 0,
+    time_zone: str = KANGA_TIME_ZONE,
+) -> None:
+    """Writes rows of data_format to the output path without holding them."""
+    trades = generate_trades(rows, symbols, duplicate_ratio, seed)
+    if data_format == "binance-xlsx":
+        write_binance_xlsx(output, trades)
+        return
+    with open(output, "w", encoding="utf-8", newline="") as file:
+        if data_format == "binance-csv":
+            file.writelines(binance_csv_lines(trades))
+        elif data_format == "kanga-csv":
+            file.writelines(kanga_csv_lines(trades, time_zone))
+        elif data_format == "my-trades":
+            _write_json_array(file, my_trades(trades))
+        elif data_format == "klines":
+            _write_json_array(file, klines(rows, seed=seed))
+        else:
+            raise ValueError(f"Unknown format: {data_format}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("format", choices=FORMATS)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument(
+        "--duplicates", type=float, default=0.0, help="Ratio of repeated trades"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--timezone", default=KANGA_TIME_ZONE, help="Local time of Kanga exports"
+    )
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args(argv)
+    write(
+        args.format,
+        args.output,
+        rows=args.rows,
+        symbols=args.symbols,
+        duplicate_ratio=args.duplicates,
+        seed=args.seed,
+        time_zone=args.timezone,
+    )
+    print(f"Wrote {args.rows} rows of {args.format} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
+from datetime import datetime
+from decimal import Decimal
+from io import BytesIO
+from openpyxl import Workbook
+import pandas as pd
 from fastapi import HTTPException
 import pytest
 from binance.error import ClientError
@@ -8,8 +13,12 @@ from requests.exceptions import (
     Timeout,
     RequestException,
 )
-from app.binance_service import BinanceService
-from app import tools
+from app.binance_service import (
+    XLSX_COLUMN_NAMES,
+    BinanceService,
+    _parse_xlsx_rows,
+)
+from app import parallel_parsing, response_cache, tools
 
 
 @patch("app.binance_service.requests.get")
@@ -129,6 +138,30 @@ def test_parse_klines_valid(fake_binance_service):
     assert "time" in parsed[0]
 
 
+def test_parse_klines_ohlcv(fake_binance_service):
+    data = [
+        [
+            1609459200000,
+            "30000.0",
+            "31000.0",
+            "29500.0",
+            "30500.0",
+            "12.5",
+            1609462799999,
+            "381250.0",
+            42,
+        ]
+    ]
+    candle = fake_binance_service.parse_klines(data, "BTCUSDT", "1h")[0]
+    assert [candle[name] for name in ("price", "high", "low", "close")] == [
+        30000.0,
+        31000.0,
+        29500.0,
+        30500.0,
+    ]
+    assert (candle["volume"], candle["trade_count"]) == (12.5, 42)
+
+
 def test_parse_klines_empty(fake_binance_service):
     parsed = fake_binance_service.parse_klines([], "BTCUSDT", "1h")
     assert parsed == []
@@ -455,6 +488,30 @@ def test_get_withdraw_history(fake_binance_service):
     )
 
 
+def test_transfer_history_cached_only_when_settled(
+    fake_binance_service, monkeypatch, tmp_path
+):
+    monkeypatch.setenv("RESPONSE_CACHE_PATH", str(tmp_path / "responses.db"))
+    response_cache.get_response_cache.cache_clear()
+    client = fake_binance_service.client
+    try:
+        # Closed long ago but still pending, then final
+        client.deposit_history = MagicMock(
+            side_effect=[[{"status": 0}], [{"status": 1}], [{"status": 0}]]
+        )
+        for _ in range(3):
+            fake_binance_service.get_deposit_history(start_time=1, end_time=2)
+        assert client.deposit_history.call_count == 2
+        # A window that closed a moment ago is not cached
+        client.withdraw_history = MagicMock(return_value=[{"status": 6}])
+        now_ms = int(datetime.now().timestamp() * 1000)
+        for _ in range(2):
+            fake_binance_service.get_withdraw_history(end_time=now_ms - 1000)
+        assert client.withdraw_history.call_count == 2
+    finally:
+        response_cache.get_response_cache.cache_clear()
+
+
 def test_get_dust_log(fake_binance_service):
     fake_binance_service.client.dust_log = MagicMock(return_value={"total": 3})
     result = fake_binance_service.get_dust_log()
@@ -520,6 +577,11 @@ def test_get_api_key_failure():
         BinanceService(keyring_system_name="wrong_system_name")
 
 
+def test_pause_seconds_is_deprecated():
+    with pytest.warns(DeprecationWarning, match="pause_seconds"):
+        BinanceService("fake keyring system name", pause_seconds=0.5)
+
+
 def test_get_api_secret_success(fake_binance_service):
     assert fake_binance_service._get_api_secret() == "fake_api_secret"
 
@@ -588,3 +650,109 @@ def test_get_all_withdrawals_multiple_pages_no_latest_date(fake_binance_service)
     assert result["count"] == 2
     assert result["data"] == page1 + page2
     assert fake_binance_service.client.withdraw_history.call_count >= 2
+
+
+BINANCE_CSV = (
+    "Date(UTC),Pair,Side,Price,Executed,Amount,Fee\n"
+    + "2024-03-01 10:00:00,BTCUSDT,BUY,60000,0.01BTC,600USDT,0.00001BTC\n" * 3
+    + "2024-03-01 11:00:00,ETHBTC,SELL,0.05,2ETH,0.1BTC,0.0001BTC\n"
+).encode("utf-8")
+
+
+def test_parse_trades_from_csv_in_processes(monkeypatch, fake_binance_service):
+    symbols = {
+        "BTCUSDT": {"base_currency": "BTC", "quote_currency": "USDT"},
+        "ETHBTC": {"base_currency": "ETH", "quote_currency": "BTC"},
+    }
+    lookups = []
+
+    def get_symbol(db_session, symbol):
+        lookups.append(symbol)
+        return symbols[symbol]
+
+    monkeypatch.setattr("app.crud.get_binance_symbol_dict", get_symbol)
+    monkeypatch.setattr(parallel_parsing, "PARALLEL_MIN_ROWS", 0)
+    monkeypatch.setenv(parallel_parsing.IMPORT_PROCESSES_ENV, "1")
+    serial = fake_binance_service.parse_trades_from_csv(None, BINANCE_CSV, "user")
+    monkeypatch.setenv(parallel_parsing.IMPORT_PROCESSES_ENV, "3")
+    parallel = fake_binance_service.parse_trades_from_csv(None, BINANCE_CSV, "user")
+
+    assert parallel == serial
+    # Milliseconds come from the row number, whichever process parsed the row
+    assert [trade["utc_time"].microsecond // 1000 for trade in parallel] == [1, 2, 3, 4]
+    assert (parallel[3]["bought_currency"], parallel[3]["bought_amount"]) == (
+        "BTC",
+        Decimal("0.1"),
+    )
+    assert sorted(lookups) == ["BTCUSDT", "BTCUSDT", "ETHBTC", "ETHBTC"]
+
+
+def test_parse_trades_from_csv_unknown_pair(monkeypatch, fake_binance_service):
+    def get_symbol(db_session, symbol):
+        raise LookupError(symbol)
+
+    monkeypatch.setattr("app.crud.get_binance_symbol_dict", get_symbol)
+    with pytest.raises(HTTPException) as exc:
+        fake_binance_service.parse_trades_from_csv(None, BINANCE_CSV, "user")
+    assert exc.value.status_code == 400
+
+
+def test_iter_trades_from_xlsx_matches_whole_file(monkeypatch, fake_binance_service):
+    workbook = Workbook()
+    workbook.active.append(
+        ["Date(UTC)", "Pair", "Base Asset", "Quote Asset", "Type", "Price"]
+        + ["Amount", "Total", "Fee", "Fee Coin"]
+    )
+    for second in range(5):
+        workbook.active.append(
+            [f"2024-03-01 10:00:0{second}", "BTCUSDT", "BTC", "USDT", "BUY", 60000.5]
+            + [0.01, 600.005, 0.00001, "BTC"]
+        )
+    xlsx_file = BytesIO()
+    workbook.save(xlsx_file)
+    lookups = []
+
+    def get_symbol(db_session, symbol):
+        lookups.append(symbol)
+        return {"base_currency": "BTC", "quote_currency": "USDT"}
+
+    monkeypatch.setattr("app.crud.get_binance_symbol_dict", get_symbol)
+    whole = fake_binance_service.parse_trades_from_xlsx(
+        None, xlsx_file.getvalue(), "user"
+    )
+    batches = list(
+        fake_binance_service.iter_trades_from_xlsx(None, xlsx_file, "user", 2)
+    )
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [trade for batch in batches for trade in batch] == whole
+    assert whole[4]["utc_time"].microsecond == 5000
+    assert lookups == ["BTCUSDT", "BTCUSDT"]
+
+
+def test_xlsx_ids_match_read_excel(monkeypatch, fake_binance_service):
+    workbook = Workbook()
+    workbook.active.append(
+        ["Date(UTC)", "Pair", "Base Asset", "Quote Asset", "Type", "Price"]
+        + ["Amount", "Total", "Fee", "Fee Coin"]
+    )
+    # Total and Fee are whole numbers only; Price is fractional in a later row
+    for second, price in enumerate((30000, 30000, 30000.5)):
+        workbook.active.append(
+            [f"2024-03-01 10:00:0{second}", "BTCUSDT", "BTC", "USDT", "BUY", price]
+            + [0.5, 15000, 0, "BTC"]
+        )
+    xlsx_file = BytesIO()
+    workbook.save(xlsx_file)
+    symbols = {"BTCUSDT": {"base_currency": "BTC", "quote_currency": "USDT"}}
+    monkeypatch.setattr(
+        "app.crud.get_binance_symbol_dict", lambda db_session, symbol: symbols[symbol]
+    )
+    xlsx_file.seek(0)
+    df = pd.read_excel(xlsx_file, engine="openpyxl").rename(columns=XLSX_COLUMN_NAMES)
+    expected = _parse_xlsx_rows(df, 1, symbols, "user")
+    assert expected[0]["fee_amount"] == Decimal("0")
+
+    batches = fake_binance_service.iter_trades_from_xlsx(None, xlsx_file, "user", 1)
+    trades = [trade for batch in batches for trade in batch]
+    assert [trade["id"] for trade in trades] == [trade["id"] for trade in expected]
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app import candle_archive, crud
+from app.candle_archive import CandleArchive, get_candle_archive
+from app.dependencies import get_db_session
+from app.main import app
+from app.price_lookup import PriceStore
+
+START = datetime(2024, 1, 1)
+START_MS = 1704067200000
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setenv(candle_archive.CANDLE_ARCHIVE_ENV, str(tmp_path))
+    get_candle_archive.cache_clear()
+    yield get_candle_archive()
+    get_candle_archive.cache_clear()
+
+
+def minute_candles(minutes: range) -> list[dict]:
+    return [
+        {
+            "symbol": "BTCUSDT",
+            "interval": "1m",
+            "time": START + timedelta(minutes=minute),
+            "price": float(minute),
+            "high": minute + 1.0,
+            "low": minute - 1.0,
+            "close": minute + 0.5,
+            "volume": 2.0,
+        }
+        for minute in minutes
+    ]
+
+
+def test_append_in_place_merge_and_grow(tmp_path, monkeypatch):
+    monkeypatch.setattr(candle_archive, "MIN_CAPACITY", 4)
+    archive = CandleArchive(tmp_path)
+    assert archive.read("BTCUSDT", "1m") is None
+
+    def append(minutes: list[int]):
+        times = START_MS + 60_000 * np.array(minutes)
+        values = np.repeat(np.array(minutes, dtype=np.float64)[:, None], 5, axis=1)
+        archive.append("BTCUSDT", "1m", times, values)
+
+    append([0, 1, 2])
+    size = archive.path("BTCUSDT", "1m").stat().st_size
+    # In place: the last candle is replaced, newer ones follow it
+    append([2, 3])
+    assert archive.path("BTCUSDT", "1m").stat().st_size == size
+    # Older candles and a full file write the series again
+    append([-1, 4])
+    append([5, 6, 7, 8])
+
+    series = archive.read("BTCUSDT", "1m")
+    assert ((series.times - START_MS) // 60_000).tolist() == list(range(-1, 9))
+    assert series.close.tolist() == list(map(float, range(-1, 9)))
+    window = archive.read("BTCUSDT", "1m", START_MS + 60_000, START_MS + 180_000)
+    assert window.open.tolist() == [1.0, 2.0, 3.0]
+    # Views of the mapped file
+    assert not window.times.flags.owndata and not window.times.flags.writeable
+
+
+def test_archive_built_from_database_and_synced(db_session, archive):
+    crud.upsert_candles(db_session, minute_candles(range(0, 3)))
+    # Not archived yet: candles stay in the database only
+    assert not archive.has_series("BTCUSDT", "1m")
+
+    price_store = PriceStore(candle_archive=archive)
+    timestamps = [START_MS + 60_000 * 4]
+    assert price_store.asof(db_session, "BTCUSDT", "1m", timestamps).tolist() == [2.0]
+    assert archive.has_series("BTCUSDT", "1m")
+
+    crud.upsert_candles(db_session, minute_candles(range(3, 5)))
+    crud.create_candle(
+        db_session,
+        {
+            "symbol": "BTCUSDT",
+            "interval": "1m",
+            "time": START + timedelta(minutes=5),
+            "price": 5.0,
+        },
+    )
+    price_store.invalidate()
+    assert price_store.asof(db_session, "BTCUSDT", "1m", timestamps).tolist() == [4.0]
+    series = archive.read("BTCUSDT", "1m")
+    assert series.high[:5].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert series.open[5] == 5.0 and np.isnan(series.high[5])
+
+
+def test_candles_endpoint(db_session, archive, monkeypatch):
+    crud.upsert_candles(db_session, minute_candles(range(0, 5)))
+    app.dependency_overrides[get_db_session] = lambda: db_session
+    try:
+        client = TestClient(app)
+        params = {
+            "symbol": "BTCUSDT",
+            "interval": "1m",
+            "start": "2024-01-01T00:01:00",
+            "end": str(START_MS + 120_000),
+        }
+        from_archive = client.get("/prices/candles", params=params).json()
+        assert from_archive["times"] == [START_MS + 60_000, START_MS + 120_000]
+        assert from_archive["close"] == [1.5, 2.5]
+
+        monkeypatch.delenv(candle_archive.CANDLE_ARCHIVE_ENV)
+        get_candle_archive.cache_clear()
+        from_database = client.get("/prices/candles", params=params).json()
+        assert from_database == from_archive
+        bad = client.get("/prices/candles", params={"start": "yesterday"})
+        assert bad.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
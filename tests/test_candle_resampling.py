@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app import crud, models
+from app.candle_resampling import (
+    CANDLE_COLUMNS,
+    bucket_starts,
+    can_resample,
+    resample_candles,
+    update_resampled,
+)
+from app.dependencies import get_db_session
+from app.main import app
+
+START = datetime(2024, 1, 1)
+
+
+def minute_candles(first: int, count: int) -> list[dict]:
+    """1m candles with open = minute number, high +1, low -1, close +0.5."""
+    return [
+        {
+            "symbol": "BTCUSDT",
+            "interval": "1m",
+            "time": START + timedelta(minutes=minute),
+            "price": float(minute),
+            "high": minute + 1.0,
+            "low": minute - 1.0,
+            "close": minute + 0.5,
+            "volume": 2.0,
+            "trade_count": 3,
+        }
+        for minute in range(first, first + count)
+    ]
+
+
+def stored_candles(db_session, interval: str) -> list[tuple]:
+    return db_session.execute(
+        select(
+            models.PriceHistory.time,
+            *(getattr(models.PriceHistory, name) for name in CANDLE_COLUMNS[1:]),
+            models.PriceHistory.source,
+        )
+        .where(models.PriceHistory.interval == interval)
+        .order_by(models.PriceHistory.time)
+    ).all()
+
+
+def test_can_resample():
+    assert can_resample("1m", "1h")
+    assert can_resample("1h", "1M")
+    assert not can_resample("1h", "1h")
+    assert not can_resample("1d", "3m")
+    assert not can_resample("3d", "1w")
+    assert not can_resample("1m", "2d")
+
+
+def test_bucket_starts():
+    times = pd.DatetimeIndex(["2024-01-03 17:45", "2024-02-29 23:59"])
+    assert list(bucket_starts(times, "4h")) == [
+        pd.Timestamp("2024-01-03 16:00"),
+        pd.Timestamp("2024-02-29 20:00"),
+    ]
+    # Weeks start on Monday, months on their first day
+    assert list(bucket_starts(times, "1w")) == [
+        pd.Timestamp("2024-01-01"),
+        pd.Timestamp("2024-02-26"),
+    ]
+    assert list(bucket_starts(times, "1M")) == [
+        pd.Timestamp("2024-01-01"),
+        pd.Timestamp("2024-02-01"),
+    ]
+
+
+def test_resample_candles():
+    candles = pd.DataFrame(
+        [
+            (START + timedelta(minutes=2), 12.0, 15.0, 11.0, 14.0, 1.0, 2),
+            (START, 10.0, 13.0, 9.0, 12.0, 1.5, 1),
+            # Stored before OHLCV
+            (START + timedelta(minutes=61), 20.0, None, None, None, None, None),
+        ],
+        columns=CANDLE_COLUMNS,
+    )
+    resampled = resample_candles(candles, "1h")
+
+    assert list(resampled.index) == [START, START + timedelta(hours=1)]
+    assert resampled.iloc[0].tolist() == [10.0, 15.0, 9.0, 14.0, 2.5, 3.0]
+    assert resampled.iloc[1].tolist()[:4] == [20.0, 20.0, 20.0, 20.0]
+    assert resampled.iloc[1][["volume", "trade_count"]].isna().all()
+
+
+def test_update_resampled_incrementally(db_session):
+    # Candle of the second hour from the API is kept
+    api_candle = minute_candles(60, 1)[0] | {"interval": "1h", "price": 1000.0}
+    crud.upsert_candles(db_session, minute_candles(0, 90) + [api_candle])
+
+    assert update_resampled(db_session, "BTCUSDT", "1h", chunk_rows=7) == 1
+    assert stored_candles(db_session, "1h") == [
+        (START, 0.0, 60.0, -1.0, 59.5, 120.0, 180, "resampled"),
+        (START + timedelta(hours=1), 1000.0, 61.0, 59.0, 60.5, 2.0, 3, "binance"),
+    ]
+
+    # The derived last hour is computed again with the new candles
+    crud.upsert_candles(db_session, minute_candles(90, 30))
+    db_session.query(models.PriceHistory).filter_by(interval="1h").filter(
+        models.PriceHistory.source == "binance"
+    ).delete()
+    db_session.commit()
+    assert update_resampled(db_session, "BTCUSDT", "1h") == 2
+    assert update_resampled(db_session, "BTCUSDT", "1h") == 1
+    assert stored_candles(db_session, "1h")[1] == (
+        START + timedelta(hours=1),
+        60.0,
+        120.0,
+        59.0,
+        119.5,
+        120.0,
+        180,
+        "resampled",
+    )
+    assert update_resampled(db_session, "BTCUSDT", "1d") == 1
+    assert stored_candles(db_session, "1d")[0][1:4] == (0.0, 120.0, -1.0)
+
+    with pytest.raises(ValueError):
+        update_resampled(db_session, "BTCUSDT", "1m", "1h")
+
+
+def test_update_resampled_after_backfills(db_session):
+    crud.upsert_candles(db_session, minute_candles(120, 60))
+    assert update_resampled(db_session, "BTCUSDT", "1h") == 1
+
+    # Older candles stored later are resampled too
+    crud.upsert_candles(db_session, minute_candles(0, 60))
+    assert update_resampled(db_session, "BTCUSDT", "1h") == 2
+    # A gap is filled when the range of the new candles is given
+    gap = minute_candles(60, 60)
+    crud.upsert_candles(db_session, gap)
+    assert (
+        update_resampled(
+            db_session, "BTCUSDT", "1h", start=gap[0]["time"], end=gap[-1]["time"]
+        )
+        == 2
+    )
+    assert [candle[:2] for candle in stored_candles(db_session, "1h")] == [
+        (START, 0.0),
+        (START + timedelta(hours=1), 60.0),
+        (START + timedelta(hours=2), 120.0),
+    ]
+
+
+def test_resample_endpoint(db_session):
+    crud.upsert_candles(db_session, minute_candles(0, 30))
+    app.dependency_overrides[get_db_session] = lambda: db_session
+    try:
+        client = TestClient(app)
+        response = client.post(
+            "/prices/resample", json={"symbol": "BTCUSDT", "intervals": ["5m"]}
+        )
+        assert response.status_code == 200
+        assert response.json()["stored"] == {"5m": 6}
+        bad = client.post("/prices/resample", json={"intervals": ["7m"]})
+        assert bad.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+from datetime import date, datetime
+from app import crud, models
+from app.conversion import ConversionGraph, ConversionService
+from app.price_lookup import PriceStore
+
+
+@pytest.fixture
+def session(db_session):
+    db_session.add_all(
+        [
+            models.BinanceSymbols(
+                symbol="SOLUSDT",
+                status="TRADING",
+                base_currency="SOL",
+                quote_currency="USDT",
+            ),
+            models.BinanceSymbols(
+                symbol="SOLBTC",
+                status="TRADING",
+                base_currency="SOL",
+                quote_currency="BTC",
+            ),
+            models.PriceHistory(
+                symbol="SOLUSDT", interval="1d", time=datetime(2024, 1, 1), price=100
+            ),
+            models.PriceHistory(
+                symbol="SOLUSDT", interval="1d", time=datetime(2024, 1, 2), price=110
+            ),
+            models.DailyPriceHistory(
+                base_currency="USD",
+                quote_currency="PLN",
+                date=date(2024, 1, 1),
+                price=4.0,
+                source="NBP",
+            ),
+        ]
+    )
+    db_session.commit()
+    return db_session
+
+
+def test_graph_finds_cheapest_path(session):
+    graph = ConversionGraph.load(session)
+    path = graph.path("SOL", "PLN")
+    assert [(step.kind, step.target) for step in path] == [
+        ("binance", "USDT"),
+        ("identity", "USD"),
+        ("nbp", "PLN"),
+    ]
+    assert graph.path("oPLN", "PLN")[0].kind == "identity"
+    assert graph.path("PLN", "PLN") == []
+    assert graph.path("UNKNOWN", "PLN") is None
+
+
+def test_graph_inverts_markets(session):
+    graph = ConversionGraph.load(session)
+    [step] = graph.path("USDT", "SOL")
+    assert step.key == "SOLUSDT"
+    assert step.invert is True
+
+
+def test_convert_vector(session):
+    service = ConversionService(price_store=PriceStore())
+    rates = service.convert(
+        session,
+        ["SOL", "SOL", "oPLN", "USDT", "UNKNOWN", "SOL"],
+        [
+            datetime(2024, 1, 1, 12),
+            datetime(2024, 1, 2, 12),
+            datetime(2024, 1, 2),
+            datetime(2024, 1, 2),
+            datetime(2024, 1, 2),
+            datetime(2023, 12, 31),
+        ],
+    )
+    assert rates[:4].tolist() == [400.0, 440.0, 1.0, 4.0]
+    assert np.isnan(rates[4])
+    assert np.isnan(rates[5])
+
+
+def test_convert_rejects_mismatched_lengths(session):
+    service = ConversionService(price_store=PriceStore())
+    with pytest.raises(ValueError):
+        service.convert(session, ["SOL"], [])
+
+
+def test_markets_without_candles_are_skipped(session):
+    session.add_all(
+        [
+            models.BinanceSymbols(
+                symbol="BTCPLN",
+                status="TRADING",
+                base_currency="BTC",
+                quote_currency="PLN",
+            ),
+            models.BinanceSymbols(
+                symbol="BTCUSDT",
+                status="TRADING",
+                base_currency="BTC",
+                quote_currency="USDT",
+            ),
+            models.Tickers(
+                ticker="BTC-oPLN", venue="Kanga", base_asset="BTC", quote_asset="oPLN"
+            ),
+            models.PriceHistory(
+                symbol="BTCUSDT", interval="1d", time=datetime(2024, 1, 1), price=40000
+            ),
+        ]
+    )
+    session.commit()
+    service = ConversionService(price_store=PriceStore())
+
+    path = service.get_graph(session).path("BTC", "PLN")
+    assert [step.key for step in path] == ["BTCUSDT", "", "USD/PLN"]
+    assert service.get_graph(session, "1h").path("BTC", "PLN") is None
+    rates = service.convert(session, ["BTC"], [datetime(2024, 1, 1, 12)])
+    assert rates.tolist() == [160000.0]
+
+
+def test_graphs_follow_market_writes(session):
+    service = ConversionService(price_store=PriceStore(check_seconds=0))
+    assert service.get_graph(session).path("BTC", "USDT") is None
+    crud.upsert_binance_symbols(
+        session,
+        [
+            {
+                "symbol": "BTCUSDT",
+                "status": "TRADING",
+                "baseAsset": "BTC",
+                "quoteAsset": "USDT",
+            }
+        ],
+    )
+    # Written without crud, as by another process
+    session.add(
+        models.PriceHistory(
+            symbol="BTCUSDT", interval="1d", time=datetime(2024, 1, 1), price=40000
+        )
+    )
+    session.commit()
+    path = service.get_graph(session).path("BTC", "USDT")
+    assert [step.key for step in path] == ["BTCUSDT"]
@@ -0,0 +1,110 @@
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from app import crud, models
+from app.cost_basis import CostBasisEngine, summarize_disposals
+
+
+def make_trade(day, bought, bought_amount, sold, sold_amount, fee="0", fee_cur=""):
+    return SimpleNamespace(
+        utc_time=datetime(2024, 1, day),
+        id=f"t{day}",
+        bought_currency=bought,
+        bought_amount=Decimal(bought_amount),
+        sold_currency=sold,
+        sold_amount=Decimal(sold_amount),
+        fee_currency=fee_cur,
+        fee_amount=Decimal(fee),
+    )
+
+
+@pytest.fixture
+def trades():
+    return [
+        make_trade(1, "BTC", "1", "PLN", "100"),
+        make_trade(2, "BTC", "1", "PLN", "200"),
+        make_trade(3, "PLN", "450", "BTC", "1.5"),
+    ]
+
+
+def test_fifo_consumes_oldest_lots(trades):
+    engine = CostBasisEngine(method="FIFO")
+    [disposal] = list(engine.run(trades))
+    assert disposal["cost"] == Decimal("200")
+    assert disposal["gain"] == Decimal("250")
+    assert engine.open_positions()["BTC"]["amount"] == Decimal("0.5")
+    assert engine.open_positions()["BTC"]["cost"] == Decimal("100")
+
+
+def test_lifo_consumes_newest_lots(trades):
+    engine = CostBasisEngine(method="LIFO")
+    [disposal] = list(engine.run(trades))
+    assert disposal["cost"] == Decimal("250")
+    assert engine.open_positions()["BTC"]["cost"] == Decimal("50")
+
+
+def test_average_pools_lots(trades):
+    engine = CostBasisEngine(method="average")
+    [disposal] = list(engine.run(trades))
+    assert disposal["cost"] == Decimal("225")
+    assert engine.open_positions()["BTC"]["cost"] == Decimal("75")
+
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        CostBasisEngine(method="HIFO")
+
+
+def test_crypto_to_crypto_carries_cost_and_fees():
+    engine = CostBasisEngine()
+    trades = [
+        make_trade(1, "BTC", "1", "oPLN", "100", fee="1", fee_cur="oPLN"),
+        make_trade(2, "ETH", "10", "BTC", "1", fee="0.1", fee_cur="ETH"),
+        make_trade(3, "PLN", "300", "ETH", "9.9"),
+    ]
+    [disposal] = list(engine.run(trades))
+    assert disposal["currency"] == "ETH"
+    assert disposal["cost"] == Decimal("101")
+    assert disposal["gain"] == Decimal("199")
+    assert disposal["unmatched_amount"] == 0
+    assert engine.open_positions() == {}
+
+
+def test_disposal_without_lots_is_reported_as_unmatched():
+    engine = CostBasisEngine()
+    [disposal] = list(engine.run([make_trade(1, "PLN", "50", "BTC", "1")]))
+    assert disposal["cost"] == 0
+    assert disposal["unmatched_amount"] == Decimal("1")
+
+
+def test_summarize_disposals_filters_year(trades):
+    engine = CostBasisEngine()
+    summary = summarize_disposals(engine.run(trades), year=2023)
+    assert summary["disposals_count"] == 0
+    summary = summarize_disposals(CostBasisEngine().run(trades), keep_limit=5)
+    assert summary["disposals_count"] == 1
+    assert summary["by_currency"]["BTC"]["gain"] == Decimal("250")
+    assert len(summary["disposals"]) == 1
+
+
+def test_iter_user_trades_orders_by_time(db_session):
+    for day, user_id in ((3, 1), (1, 1), (2, 2)):
+        db_session.add(
+            models.Trades(
+                utc_time=datetime(2024, 1, day),
+                id=f"t{day}",
+                bought_currency="BTC",
+                bought_amount=Decimal("1"),
+                sold_currency="PLN",
+                sold_amount=Decimal("100"),
+                fee_currency="BTC",
+                fee_amount=Decimal("0"),
+                original_id="",
+                exchange_id=1,
+                user_id=user_id,
+            )
+        )
+    db_session.commit()
+    rows = list(crud.iter_user_trades(db_session=db_session, user_id=1, batch_size=1))
+    assert [row.id for row in rows] == ["t1", "t3"]
@@ -4,7 +4,7 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.exc import SQLAlchemyError
-from app.database import Base, Database
+from app.database import Base, Database, upgrade_schema
 from app import models
 
 # Use in-memory SQLite for isolated testing
@@ -177,6 +177,34 @@ def sample_2_withdrawals():
     ]
 
 
+def test_upgrade_schema_adds_missing_columns():
+    engine = create_engine(TEST_DATABASE_URL, poolclass=StaticPool)
+    with engine.begin() as connection:
+        # price_history as created before OHLCV candles
+        connection.execute(
+            text(
+                "CREATE TABLE price_history (id INTEGER PRIMARY KEY,"
+                " symbol VARCHAR(20), interval VARCHAR(5), time DATETIME,"
+                " price FLOAT, source VARCHAR(20))"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO price_history (symbol, interval, time, price, source)"
+                " VALUES ('BTCUSDT', '1d', '2024-01-01 00:00:00', 42000.5, 'binance')"
+            )
+        )
+
+    assert upgrade_schema(engine) == [
+        f"price_history.{name}"
+        for name in ("high", "low", "close", "volume", "trade_count")
+    ]
+    assert upgrade_schema(engine) == []
+    with sessionmaker(bind=engine)() as session:
+        candle = session.query(models.PriceHistory).one()
+        assert (candle.price, candle.high) == (42000.5, None)
+
+
 def test_session_runs_query(test_session):
     result = test_session.execute(text("SELECT 1")).scalar()
     assert result == 1
@@ -0,0 +1,183 @@
+import pytest
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import event
+from app import models
+from app.conversion import ConversionService
+from app.holdings import portfolio_value, refresh_snapshots
+from app.price_lookup import PriceStore
+
+
+def add_trade(session, when, bought, bought_amount, sold, sold_amount, fee="0"):
+    session.add(
+        models.Trades(
+            utc_time=when,
+            id=f"{when.isoformat()}{bought}",
+            bought_currency=bought,
+            bought_amount=Decimal(bought_amount),
+            sold_currency=sold,
+            sold_amount=Decimal(sold_amount),
+            fee_currency=bought,
+            fee_amount=Decimal(fee),
+            original_id="",
+            exchange_id=1,
+            user_id=1,
+        )
+    )
+    session.commit()
+
+
+@pytest.fixture
+def session(db_session):
+    add_trade(db_session, datetime(2024, 1, 1, 10), "BTC", "1", "PLN", "100", "0.1")
+    add_trade(db_session, datetime(2024, 1, 1, 11), "PLN", "60", "BTC", "0.5")
+    return db_session
+
+
+def balances(session):
+    rows = session.query(models.DailyBalances).order_by(
+        models.DailyBalances.date, models.DailyBalances.currency
+    )
+    # SQLite keeps DECIMAL as float, compare with reduced precision
+    return [
+        (row.date, row.currency, Decimal(row.balance).quantize(Decimal("1e-9")))
+        for row in rows
+    ]
+
+
+def test_refresh_snapshots_builds_and_extends(session):
+    result = refresh_snapshots(session, user_id=1, until=date(2024, 1, 2))
+    assert result["rebuilt"] is True
+    assert balances(session) == [
+        (date(2024, 1, 1), "BTC", Decimal("0.4")),
+        (date(2024, 1, 1), "PLN", Decimal("-40")),
+    ]
+    add_trade(session, datetime(2024, 1, 3, 9), "BTC", "1", "PLN", "50")
+    result = refresh_snapshots(session, user_id=1, until=date(2024, 1, 3))
+    assert result == {
+        "last_date": date(2024, 1, 3),
+        "rows_written": 2,
+        "rebuilt": False,
+    }
+    assert balances(session)[-2:] == [
+        (date(2024, 1, 3), "BTC", Decimal("1.4")),
+        (date(2024, 1, 3), "PLN", Decimal("-90")),
+    ]
+    assert (
+        refresh_snapshots(session, user_id=1, until=date(2024, 1, 3))["rows_written"]
+        == 0
+    )
+
+
+def test_refresh_snapshots_rebuilds_after_backfill(session):
+    refresh_snapshots(session, user_id=1, until=date(2024, 1, 2))
+    add_trade(session, datetime(2023, 12, 31), "ETH", "2", "PLN", "10")
+    result = refresh_snapshots(session, user_id=1, until=date(2024, 1, 3))
+    assert result["rebuilt"] is True
+    assert balances(session)[0] == (date(2023, 12, 31), "ETH", Decimal("2"))
+
+
+def test_refresh_snapshots_reads_transfers_before_trades(session):
+    session.add_all(
+        [
+            models.Deposit(
+                id="d1",
+                coin="BTC",
+                amount="2",
+                status=1,
+                insert_time=datetime(2024, 1, 1, 12),
+            ),
+            models.Withdrawal(
+                id="w1",
+                coin="PLN",
+                amount="5",
+                transaction_fee="1",
+                status=6,
+                apply_time="2024-01-01 13:00:00",
+            ),
+        ]
+    )
+    session.commit()
+    tables = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "FROM " in statement:
+            tables.append(statement.split("FROM ", 1)[1].split()[0])
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        refresh_snapshots(
+            session, user_id=1, include_transfers=True, until=date(2024, 1, 1)
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", before_execute)
+    # Without MARS no query may run while the trades cursor is open
+    assert tables[-3:] == ["deposits", "withdrawals", "trades"]
+    assert balances(session) == [
+        (date(2024, 1, 1), "BTC", Decimal("2.4")),
+        (date(2024, 1, 1), "PLN", Decimal("-46")),
+    ]
+
+
+def test_portfolio_value_forward_fills_and_prices(session):
+    session.add_all(
+        [
+            models.BinanceSymbols(
+                symbol="BTCPLN",
+                status="TRADING",
+                base_currency="BTC",
+                quote_currency="PLN",
+            ),
+            models.PriceHistory(
+                symbol="BTCPLN", interval="1d", time=datetime(2024, 1, 1), price=200
+            ),
+        ]
+    )
+    session.commit()
+    refresh_snapshots(session, user_id=1, until=date(2024, 1, 2))
+    result = portfolio_value(
+        session,
+        ConversionService(price_store=PriceStore()),
+        user_id=1,
+        start=date(2023, 12, 31),
+        end=date(2024, 1, 2),
+    )
+    assert result["dates"] == ["2023-12-31", "2024-01-01", "2024-01-02"]
+    assert result["values"] == pytest.approx([0.0, 40.0, 40.0])
+    assert result["unpriced_currencies"] == []
+
+
+def test_portfolio_value_reports_unpriced_holdings(session):
+    session.add_all(
+        [
+            # The only market of ETH has no candles
+            models.BinanceSymbols(
+                symbol="ETHPLN",
+                status="TRADING",
+                base_currency="ETH",
+                quote_currency="PLN",
+            ),
+            models.BinanceSymbols(
+                symbol="BTCPLN",
+                status="TRADING",
+                base_currency="BTC",
+                quote_currency="PLN",
+            ),
+            models.PriceHistory(
+                symbol="BTCPLN", interval="1d", time=datetime(2024, 1, 1), price=200
+            ),
+        ]
+    )
+    add_trade(session, datetime(2024, 1, 2, 9), "ETH", "2", "PLN", "10")
+    refresh_snapshots(session, user_id=1, until=date(2024, 1, 3))
+    result = portfolio_value(
+        session,
+        ConversionService(price_store=PriceStore()),
+        user_id=1,
+        start=date(2024, 1, 1),
+        end=date(2024, 1, 3),
+    )
+    assert result["values"] == [pytest.approx(40.0), None, None]
+    assert result["unpriced_currencies"] == ["ETH"]
+    assert result["missing_rates"] == [("ETH", "2024-01-02"), ("ETH", "2024-01-03")]
@@ -1,7 +1,12 @@
 import pytest
+import pandas as pd
 from unittest.mock import Mock
+from datetime import datetime
 from decimal import Decimal
+from fastapi import HTTPException
+from app import parallel_parsing
 from app.kanga_service import KangaService
+from app.tools import generate_hash, string
 
 
 # ---------------------------------------------------------------------------
@@ -79,8 +84,6 @@ def test_parse_trade_from_api(monkeypatch):
     svc = KangaService()
     svc.user = "test-user"
 
-    monkeypatch.setattr("app.kanga_service.generate_hash", lambda input_dict: "APIHASH")
-
     kanga_trade = {
         "side": "BUYER",
         "buyingCurrency": "BTC",
@@ -101,7 +104,65 @@ def test_parse_trade_from_api(monkeypatch):
     assert parsed["sold_currency"] == "USDT"
     assert parsed["bought_amount"] == Decimal("0.2")
     assert parsed["price"] == Decimal("45000")
-    assert parsed["id"] == "APIHASH"
+    assert parsed["utc_time"] == datetime(2024, 2, 15, 14, 22, 10)
+    assert parsed["id"] == generate_hash(
+        {
+            "utc_time": "2024-02-15 14:22",
+            "bought_currency": "BTC",
+            "sold_currency": "USDT",
+            "price": "45000",
+            "bought_amount": "0.2",
+            "sold_amount": "9000",
+            "fee_currency": "USDT",
+            "fee_amount": "2",
+            "original_id": "",
+            "id": "",
+            "exchange": "Kanga",
+            "user": "test-user",
+        }
+    )
+
+
+def test_parse_trades_from_api_matches_string_path(monkeypatch):
+    svc = kanga_service(monkeypatch)
+    kanga_trades = [
+        {
+            "side": side,
+            "buyingCurrency": "PLN°",
+            "payingCurrency": "BTC",
+            "quantity": quantity,
+            "value": "1.50000",
+            "price": "0.10",
+            "feeCurrency": "BTC",
+            "fee": "1E-8",
+            "id": str(number),
+            "created": "2024-02-15T14:22:10Z",
+        }
+        for number, (side, quantity) in enumerate(
+            [("BUYER", "100"), ("SELLER", "0.000"), ("BUYER", "100")]
+        )
+    ]
+
+    batch = svc._parse_trades_from_api(kanga_trades)
+
+    for kanga_trade, parsed in zip(kanga_trades, batch):
+        buyer = kanga_trade["side"] == "BUYER"
+        quantity = string(Decimal(kanga_trade["quantity"]))
+        string_trade = {
+            "utc_time": "2024-02-15 14:22:10",
+            "bought_currency": "PLN°" if buyer else "BTC",
+            "sold_currency": "BTC" if buyer else "PLN°",
+            "price": "0.10",
+            "bought_amount": quantity if buyer else "1.5",
+            "sold_amount": "1.5" if buyer else quantity,
+            "fee_currency": "BTC",
+            "fee_amount": "1E-8",
+            "original_id": kanga_trade["id"],
+            "id": "",
+            "exchange": "Kanga",
+            "user": svc.user,
+        }
+        assert parsed == svc._parse_trade_from_strings(string_trade)
 
 
 def test_get_market_tickers_json_error(monkeypatch):
@@ -130,3 +191,152 @@ def test_get_market_tickers_json_error(monkeypatch):
         svc.get_market_tickers()
 
     assert "Invalid JSON" in str(exc.value)
+
+
+def test_iter_transaction_history_splits_full_pages(monkeypatch):
+    def fake_get_password(system, key):
+        return {"api_key": "K", "api_secret": "S", "user": "TEST_USER"}.get(key)
+
+    monkeypatch.setattr("keyring.get_password", fake_get_password)
+    svc = KangaService(pause_seconds=0)
+
+    # One fill every minute of the day: 1440 items, 500 per page at most
+    fills = [
+        {
+            "id": str(minute),
+            "created": f"2024-01-05T{minute // 60:02d}:{minute % 60:02d}",
+        }
+        for minute in range(1440)
+    ]
+    requests_made = []
+
+    def fake_history(start_time, end_time, limit):
+        requests_made.append((start_time, end_time))
+        start, end = start_time[:16], end_time[:16]
+        return {"list": [f for f in fills if start <= f["created"] <= end][:limit]}
+
+    svc._get_transaction_history_list = fake_history
+    pages = list(
+        svc.iter_transaction_history(
+            "2024-01-05T00:00:00.000Z", "2024-01-05T23:59:59.999Z", limit=500
+        )
+    )
+
+    ids = [item["id"] for page in pages for item in page["list"]]
+    assert ids == [str(minute) for minute in range(1440)]
+    assert all(len(page["list"]) < 500 for page in pages)
+    assert requests_made[0] == ("2024-01-05T00:00:00.000Z", "2024-01-05T23:59:59.999Z")
+
+
+def test_iter_transaction_history_stops_on_error(monkeypatch):
+    def fake_get_password(system, key):
+        return {"api_key": "K", "api_secret": "S", "user": "TEST_USER"}.get(key)
+
+    monkeypatch.setattr("keyring.get_password", fake_get_password)
+    svc = KangaService(pause_seconds=0)
+    svc._get_transaction_history_list = lambda start, end, limit: {
+        "result": "fail",
+        "code": 429,
+    }
+
+    assert list(
+        svc.iter_transaction_history(
+            "2024-01-05T00:00:00.000Z", "2024-01-05T23:59:59.999Z"
+        )
+    ) == [{"result": "fail", "code": 429}]
+
+
+KANGA_CSV_HEADER = "Data,Para,Strona,Ilość,Cena,Opłata,Suma\n"
+
+
+def kanga_service(monkeypatch):
+    def fake_get_password(system, key):
+        return {"api_key": "K", "api_secret": "S", "user": "TEST_USER"}.get(key)
+
+    monkeypatch.setattr("keyring.get_password", fake_get_password)
+    return KangaService()
+
+
+def test_parse_trades_from_csv(monkeypatch):
+    svc = kanga_service(monkeypatch)
+    csv_file = (
+        KANGA_CSV_HEADER + "2024-07-01 14:30:15,BTC/PLN°,Kupujący,0.5 BTC,250000 oPLN,"
+        "0.001 BTC,125000 oPLN\n"
+        # A fee in the sold currency used to reuse the previous row's time
+        + "2024-01-02 08:00:00,ETH/USDT,Sprzedający,2 ETH,2000 USDT,"
+        "0.002 ETH,4000 USDT\n"
+    ).encode("utf-8")
+
+    buy, sell = svc.parse_trades_from_csv(csv_file, "Europe/Warsaw", "user")
+
+    assert buy["utc_time"] == pd.Timestamp("2024-07-01 12:30:15", tz="UTC")
+    assert (buy["bought_currency"], buy["sold_currency"]) == ("BTC", "oPLN")
+    assert buy["bought_amount"] == Decimal("0.501")
+    assert buy["sold_amount"] == Decimal("-125000")
+    assert buy["id"] == generate_hash(
+        {
+            "utc_time": "2024-07-01 12:30",
+            "bought_currency": "BTC",
+            "sold_currency": "oPLN",
+            "price": "250000",
+            "bought_amount": "0.501",
+            "sold_amount": "-125000",
+            "fee_currency": "BTC",
+            "fee_amount": "0.001",
+            "original_id": "",
+            "id": "",
+            "exchange": "Kanga",
+            "user": "user",
+        }
+    )
+    assert sell["utc_time"] == pd.Timestamp("2024-01-02 07:00:00", tz="UTC")
+    assert (sell["bought_currency"], sell["sold_currency"]) == ("USDT", "ETH")
+    assert sell["bought_amount"] == Decimal("4000")
+    assert sell["sold_amount"] == Decimal("-2.002")
+
+
+def test_parse_trades_from_csv_moves_repeated_trades(monkeypatch, caplog):
+    svc = kanga_service(monkeypatch)
+    row = (
+        "2024-01-02 08:00:00,BTC/USDT,Kupujący,1 BTC,40000 USDT,0.001 BTC,40000 USDT\n"
+    )
+    csv_file = (KANGA_CSV_HEADER + row * 3).encode("utf-8")
+
+    trades = svc.parse_trades_from_csv(csv_file, "UTC", "user")
+
+    assert len({trade["id"] for trade in trades}) == 1
+    assert [trade["utc_time"].second for trade in trades] == [0, 1, 2]
+    assert "time adjusted for 2 trades" in caplog.text
+
+
+def test_parse_trades_from_csv_in_processes(monkeypatch):
+    svc = kanga_service(monkeypatch)
+    monkeypatch.setattr(parallel_parsing, "PARALLEL_MIN_ROWS", 0)
+    rows = [
+        f"2024-01-02 08:0{minute}:00,BTC/USDT,Kupujący,1 BTC,40000 USDT,"
+        "0.001 BTC,40000 USDT\n"
+        for minute in (0, 1, 1, 2, 1)
+    ]
+    csv_file = (KANGA_CSV_HEADER + "".join(rows)).encode("utf-8")
+    serial = svc.parse_trades_from_csv(csv_file, "UTC", "user")
+
+    monkeypatch.setenv(parallel_parsing.IMPORT_PROCESSES_ENV, "3")
+    # Repeats of the 08:01 trade fall into all three row ranges
+    assert svc.parse_trades_from_csv(csv_file, "UTC", "user") == serial
+    assert [trade["utc_time"].strftime("%M:%S") for trade in serial] == [
+        "00:00",
+        "01:00",
+        "01:01",
+        "02:00",
+        "01:02",
+    ]
+
+
+def test_parse_trades_from_csv_rejects_unknown_side(monkeypatch):
+    svc = kanga_service(monkeypatch)
+    row = "2024-01-02 08:00:00,BTC/USDT,Maker,1 BTC,40000 USDT,0.001 BTC,40000 USDT\n"
+
+    with pytest.raises(HTTPException) as exc:
+        svc.parse_trades_from_csv((KANGA_CSV_HEADER + row).encode(), "UTC", "user")
+
+    assert exc.value.status_code == 400
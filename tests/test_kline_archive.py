@@ -0,0 +1,122 @@
+import zipfile
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app import models
+from app.dependencies import get_db_session
+from app.kline_archive import archive_series, import_kline_archives
+from app.main import app
+
+KLINE_HEADER = (
+    "open_time,open,high,low,close,volume,close_time,quote_volume,count,"
+    "taker_buy_volume,taker_buy_quote_volume,ignore\n"
+)
+
+
+def kline_line(open_time: int, price: str) -> str:
+    return (
+        f"{open_time},{price},{price},{price},{price},1.5,{open_time + 59999},"
+        "60.0,3,0.5,20.0,0\n"
+    )
+
+
+def kline_zip(name: str, lines: list[str]) -> BytesIO:
+    file = BytesIO()
+    with zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(name, "".join(lines))
+    file.seek(0)
+    return file
+
+
+def stored_candles(db_session) -> list[tuple]:
+    return db_session.execute(
+        select(
+            models.PriceHistory.symbol,
+            models.PriceHistory.interval,
+            models.PriceHistory.time,
+            models.PriceHistory.price,
+        ).order_by(models.PriceHistory.time, models.PriceHistory.interval)
+    ).all()
+
+
+def test_archive_series():
+    assert archive_series("data/BTCUSDT-1m-2024-01.csv") == ("BTCUSDT", "1m")
+    assert archive_series("ETHBTC-1d-2025-03-02.csv") == ("ETHBTC", "1d")
+    with pytest.raises(ValueError):
+        archive_series("prices.csv")
+
+
+def test_import_zip_and_csv_skips_stored_candles(db_session):
+    monthly = kline_zip(
+        "BTCUSDT-1m-2024-12.csv",
+        [kline_line(1735689480000, "42000.5"), kline_line(1735689540000, "42001")],
+    )
+    # Newer dumps: header row and open times in microseconds
+    daily = BytesIO(
+        (
+            KLINE_HEADER
+            + kline_line(1735689540000000, "42001")
+            + kline_line(1735689600000000, "42002.25")
+        ).encode()
+    )
+    result = import_kline_archives(
+        db_session,
+        [("BTCUSDT-1m-2024-12.zip", monthly), ("BTCUSDT-1m-2025-01-01.csv", daily)],
+        resample=["1m", "1h"],
+    )
+
+    assert result == {
+        "files": 2,
+        "fetched_candles": 4,
+        "inserted_candles": 3,
+        "series": ["BTCUSDT-1m"],
+        "resampled_candles": {"BTCUSDT-1h": 2},
+    }
+    assert stored_candles(db_session) == [
+        ("BTCUSDT", "1h", datetime(2024, 12, 31, 23, 0), 42000.5),
+        ("BTCUSDT", "1m", datetime(2024, 12, 31, 23, 58), 42000.5),
+        ("BTCUSDT", "1m", datetime(2024, 12, 31, 23, 59), 42001.0),
+        ("BTCUSDT", "1h", datetime(2025, 1, 1, 0, 0), 42002.25),
+        ("BTCUSDT", "1m", datetime(2025, 1, 1, 0, 0), 42002.25),
+    ]
+    candle = db_session.scalars(
+        select(models.PriceHistory).where(models.PriceHistory.interval == "1h")
+    ).first()
+    assert (candle.high, candle.low, candle.close) == (42001.0, 42000.5, 42001.0)
+    assert (candle.volume, candle.trade_count) == (3.0, 6)
+
+
+def test_import_klines_endpoint(db_session):
+    app.dependency_overrides[get_db_session] = lambda: db_session
+    try:
+        client = TestClient(app)
+        response = client.post(
+            "/prices/import-klines",
+            files={
+                "files": (
+                    "ETHBTC-1h-2024-01.zip",
+                    kline_zip(
+                        "ETHBTC-1h-2024-01.csv", [kline_line(1704067200000, "0.05")]
+                    ),
+                    "application/zip",
+                )
+            },
+        )
+        assert response.status_code == 200
+        assert response.json()["inserted_candles"] == 1
+        bad_name = client.post(
+            "/prices/import-klines",
+            files={"files": ("prices.csv", b"1,2\n", "text/csv")},
+        )
+        assert bad_name.status_code == 400
+        assert client.post("/prices/import-klines").status_code == 400
+        # Server directories are imported with the CLI only
+        from_directory = client.post(
+            "/prices/import-klines", params={"directory": str(Path.cwd())}
+        )
+        assert from_directory.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,65 @@
+import io
+import json
+import logging
+import pytest
+from app.logging_config import (
+    JsonFormatter,
+    SamplingFilter,
+    configure_logging,
+    get_logger,
+    get_row_logger,
+)
+
+
+@pytest.fixture
+def app_logger():
+    logger = logging.getLogger("app")
+    handlers, level, propagate = list(logger.handlers), logger.level, logger.propagate
+    yield logger
+    logger.handlers, logger.level, logger.propagate = handlers, level, propagate
+
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.LogRecord(
+        "app.test", logging.INFO, __file__, 1, "Stored %d rows", (5,), None
+    )
+    record.exchange = "Kanga"
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Stored 5 rows"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "app.test"
+    assert entry["exchange"] == "Kanga"
+
+
+def test_sampling_filter_counts_each_call_site():
+    sampler = SamplingFilter(every=3)
+
+    def record(line):
+        return logging.LogRecord("app", logging.DEBUG, "x.py", line, "row", (), None)
+
+    passed = [sampler.filter(record(10)) for _ in range(7)]
+    assert passed == [True, False, False, True, False, False, True]
+    assert sampler.filter(record(11))
+
+
+def test_configure_logging_level_and_format(app_logger):
+    stream = io.StringIO()
+    configure_logging(level="warning", log_format="json", stream=stream)
+    logger = get_logger("app.some_module")
+    logger.info("hidden")
+    logger.warning("shown %s", "lazily", extra={"rows": 3})
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["message"] == "shown lazily"
+    assert json.loads(lines[0])["rows"] == 3
+
+
+def test_row_logger_is_sampled(app_logger, monkeypatch):
+    monkeypatch.setenv("LOG_SAMPLE_EVERY", "10")
+    stream = io.StringIO()
+    configure_logging(level="debug", log_format="text", stream=stream)
+    row_logger = get_row_logger("app.sampled_module")
+    for number in range(25):
+        row_logger.debug("row %d", number)
+    assert stream.getvalue().count("row ") == 3
+    assert "app.sampled_module.rows: row 20" in stream.getvalue()
@@ -0,0 +1,104 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from app import metrics
+from app.main import app
+from app.metrics import Counter, Histogram, Registry
+from app.rate_limiter import RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.REGISTRY.clear()
+    yield
+    metrics.REGISTRY.clear()
+
+
+def test_render_counter_and_histogram_in_prometheus_format():
+    registry = Registry()
+    rows = registry.register(Counter("rows_total", "Rows.", ("pipeline",)))
+    latency = registry.register(
+        Histogram("latency_seconds", "Latency.", ("endpoint",), buckets=(0.1, 1.0))
+    )
+    rows.inc(3, pipeline='kanga "csv"')
+    latency.observe(0.05, endpoint="klines")
+    latency.observe(0.5, endpoint="klines")
+    latency.observe(5, endpoint="klines")
+    lines = registry.render().splitlines()
+    assert "# TYPE rows_total counter" in lines
+    assert 'rows_total{pipeline="kanga \\"csv\\""} 3.0' in lines
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{endpoint="klines",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{endpoint="klines",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="klines",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{endpoint="klines"} 5.55' in lines
+    assert 'latency_seconds_count{endpoint="klines"} 3' in lines
+
+
+def test_labels_must_match():
+    with pytest.raises(ValueError):
+        Counter("c", "C.", ("pipeline",)).inc(stage="parsed")
+
+
+def test_track_request_counts_errors():
+    with pytest.raises(RuntimeError):
+        with metrics.track_request("kanga", "wallet/list"):
+            raise RuntimeError("down")
+    with metrics.track_request("kanga", "wallet/list"):
+        pass
+    labels = {"exchange": "kanga", "endpoint": "wallet/list"}
+    assert metrics.EXCHANGE_REQUESTS.value(outcome="error", **labels) == 1
+    assert metrics.EXCHANGE_REQUESTS.value(outcome="ok", **labels) == 1
+    assert metrics.EXCHANGE_REQUEST_SECONDS.count(**labels) == 2
+
+
+def test_rate_limiter_records_waits_and_hits(monkeypatch):
+    now = {"time": 0.0}
+
+    def fake_sleep(seconds):
+        now["time"] += seconds
+
+    monkeypatch.setattr("app.rate_limiter.time.sleep", fake_sleep)
+    limiter = RateLimiter(
+        "test", max_weight=1, safety_margin=1, clock=lambda: now["time"]
+    )
+    limiter.acquire()
+    limiter.acquire()
+    limiter.update({"Retry-After": "2"}, 429)
+    assert metrics.RATE_LIMIT_WAIT_SECONDS.count(limiter="test") == 2
+    assert metrics.RATE_LIMIT_WAIT_SECONDS.sum(limiter="test") == pytest.approx(60)
+    assert metrics.RATE_LIMIT_HITS.value(limiter="test", status=429) == 1
+
+
+def test_instrument_engine_records_statements():
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(engine)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    assert metrics.DB_STATEMENT_SECONDS.count(operation="SELECT") == 1
+
+
+def test_instrument_engine_keeps_no_state_of_failed_statements():
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    with engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing"))
+        connection.execute(text("SELECT 1"))
+        assert not any(key.startswith("metrics") for key in connection.info)
+    assert metrics.DB_STATEMENT_SECONDS.count(operation="SELECT") == 1
+
+
+def test_metrics_endpoint_reports_route_latency():
+    client = TestClient(app)
+    assert client.get("/health").status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_request_seconds_count{method="GET",route="/health",status="200"} 1'
+        in response.text.splitlines()
+    )
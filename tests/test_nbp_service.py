@@ -0,0 +1,250 @@
+import pytest
+from datetime import date
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app import crud, models
+from app.dependencies import get_db_session, get_nbp_service
+from app.main import app
+from app.nbp_service import NbpService
+
+
+class FakeSession:
+    def __init__(self, responses: dict):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        if url not in self.responses:
+            return SimpleNamespace(status_code=404, text="Not Found")
+        payload = self.responses[url]
+        return SimpleNamespace(status_code=200, text="", json=lambda: payload)
+
+
+def rate(code, day, mid):
+    return {
+        "base_currency": code,
+        "quote_currency": "PLN",
+        "date": day,
+        "price": mid,
+        "source": "NBP",
+    }
+
+
+def test_build_url():
+    service = NbpService()
+    assert service.build_url("A", "EUR", "2024-01-01", "2024-01-31") == (
+        "https://api.nbp.pl/api/exchangerates/rates/a/eur/2024-01-01/2024-01-31/"
+        "?format=json"
+    )
+    assert service.build_url("a") == (
+        "https://api.nbp.pl/api/exchangerates/tables/a/?format=json"
+    )
+
+
+def test_split_date_range():
+    windows = NbpService.split_date_range(date(2015, 1, 1), date(2016, 1, 5))
+    assert windows == [
+        (date(2015, 1, 1), date(2016, 1, 2)),
+        (date(2016, 1, 3), date(2016, 1, 5)),
+    ]
+    assert NbpService.split_date_range(date(2024, 1, 1), date(2024, 1, 1)) == [
+        (date(2024, 1, 1), date(2024, 1, 1))
+    ]
+    with pytest.raises(ValueError):
+        NbpService.split_date_range(date(2024, 1, 2), date(2024, 1, 1))
+
+
+def test_fetch_rates_concurrent_windows():
+    service = NbpService(max_workers=2)
+    url = service.build_url("a", "EUR", "2024-01-01", "2024-01-02")
+    service.session = FakeSession(
+        {
+            url: {
+                "code": "EUR",
+                "rates": [
+                    {"effectiveDate": "2024-01-02", "mid": 4.3},
+                ],
+            }
+        }
+    )
+    rates = service.fetch_rates(["eur", "usd"], date(2024, 1, 1), date(2024, 1, 2))
+    assert rates == [rate("EUR", "2024-01-02", 4.3)]
+    assert len(service.session.urls) == 2
+
+
+def test_fetch_rates_with_tables():
+    service = NbpService()
+    url = service.build_url("a", start_date="2024-01-02", end_date="2024-01-03")
+    service.session = FakeSession(
+        {
+            url: [
+                {
+                    "effectiveDate": "2024-01-02",
+                    "rates": [
+                        {"code": "EUR", "mid": 4.3},
+                        {"code": "USD", "mid": 3.9},
+                    ],
+                },
+                {
+                    "effectiveDate": "2024-01-03",
+                    "rates": [{"code": "EUR", "mid": 4.4}],
+                },
+            ]
+        }
+    )
+    rates = service.fetch_rates(
+        ["EUR"], date(2024, 1, 2), date(2024, 1, 3), use_tables=True
+    )
+    assert rates == [rate("EUR", "2024-01-02", 4.3), rate("EUR", "2024-01-03", 4.4)]
+
+
+def test_upsert_rates_skips_existing(db_session):
+    db_session.add(
+        models.DailyPriceHistory(
+            base_currency="EUR",
+            quote_currency="PLN",
+            date=date(2024, 1, 2),
+            price=4.3,
+            source="NBP",
+        )
+    )
+    db_session.commit()
+    rates = [
+        rate("EUR", "2024-01-02", 4.3),
+        rate("EUR", "2024-01-03", 4.4),
+        rate("USD", "2024-01-02", 3.9),
+        rate("USD", "2024-01-02", 3.9),
+    ]
+    assert crud.upsert_rates(db_session, rates) == 2
+    assert crud.upsert_rates(db_session, rates) == 0
+    stored = db_session.execute(
+        select(
+            models.DailyPriceHistory.base_currency, models.DailyPriceHistory.date
+        ).order_by(
+            models.DailyPriceHistory.base_currency, models.DailyPriceHistory.date
+        )
+    ).all()
+    assert stored == [
+        ("EUR", date(2024, 1, 2)),
+        ("EUR", date(2024, 1, 3)),
+        ("USD", date(2024, 1, 2)),
+    ]
+
+
+def test_ensure_rates_requests_only_missing_days(db_session):
+    service = NbpService()
+    # 2024-01-01 is a holiday, 2024-01-06/07 is a weekend
+    url = service.build_url("a", "EUR", "2024-01-01", "2024-01-08")
+    service.session = FakeSession(
+        {
+            url: {
+                "code": "EUR",
+                "rates": [
+                    {"effectiveDate": f"2024-01-0{day}", "mid": 4.0 + day / 10}
+                    for day in (2, 3, 4, 5, 8)
+                ],
+            }
+        }
+    )
+    assert (
+        service.ensure_rates(db_session, "eur", date(2024, 1, 1), date(2024, 1, 8)) == 5
+    )
+    assert (
+        service.ensure_rates(db_session, "EUR", date(2024, 1, 1), date(2024, 1, 8)) == 0
+    )
+    assert service.session.urls == [url]
+
+    # A fresh process knows the holiday gap from the stored coverage
+    restarted = NbpService()
+    restarted.session = FakeSession({})
+    rates = restarted.get_rates(db_session, "EUR", date(2024, 1, 1), date(2024, 1, 8))
+    assert restarted.session.urls == []
+    assert list(rates) == [date(2024, 1, day) for day in (2, 3, 4, 5, 8)]
+    assert rates[date(2024, 1, 8)] == pytest.approx(4.8)
+
+
+def test_get_rates_without_fetching_stays_local(db_session):
+    service = NbpService()
+    service.session = FakeSession({})
+    assert (
+        service.get_rates(
+            db_session, "USD", date(2024, 1, 1), date(2024, 1, 5), fetch_missing=False
+        )
+        == {}
+    )
+    assert service.session.urls == []
+
+
+def test_coverage_ranges_are_merged(db_session):
+    for start, end in ((1, 3), (10, 12), (20, 21), (4, 9)):
+        NbpService._record_coverage(
+            db_session, "EUR", date(2024, 1, start), date(2024, 1, end)
+        )
+    NbpService._record_coverage(db_session, "USD", date(2024, 1, 1), date(2024, 1, 2))
+    stored = db_session.execute(
+        select(
+            models.DailyPriceCoverage.base_currency,
+            models.DailyPriceCoverage.start_date,
+            models.DailyPriceCoverage.end_date,
+        ).order_by(
+            models.DailyPriceCoverage.base_currency,
+            models.DailyPriceCoverage.start_date,
+        )
+    ).all()
+    assert stored == [
+        ("EUR", date(2024, 1, 1), date(2024, 1, 12)),
+        ("EUR", date(2024, 1, 20), date(2024, 1, 21)),
+        ("USD", date(2024, 1, 1), date(2024, 1, 2)),
+    ]
+
+
+def test_fetch_rates_endpoint_rejects_bad_dates(db_session):
+    service = NbpService()
+    service.session = FakeSession({})
+    app.dependency_overrides[get_db_session] = lambda: db_session
+    app.dependency_overrides[get_nbp_service] = lambda: service
+    try:
+        client = TestClient(app)
+        for start_date, end_date in (
+            ("2024-13-01", "2024-12-31"),
+            ("2024-02-01", "2024-01-01"),
+        ):
+            response = client.get(
+                "/nbp/fetch_rates",
+                params={"start_date": start_date, "end_date": end_date},
+            )
+            assert response.status_code == 400
+        reversed_sync = client.post(
+            "/nbp/sync_rates",
+            params={"start_date": "2024-02-01", "end_date": "2024-01-01"},
+        )
+        assert reversed_sync.status_code == 400
+        assert service.session.urls == []
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_rates_are_resolved_per_table(db_session):
+    service = NbpService()
+    table_a = service.build_url("a", "EUR", "2024-01-01", "2024-01-02")
+    table_b = service.build_url("b", "EUR", "2024-01-01", "2024-01-02")
+    service.session = FakeSession(
+        {
+            table_a: {"code": "EUR", "rates": []},
+            table_b: {
+                "code": "EUR",
+                "rates": [{"effectiveDate": "2024-01-02", "mid": 4.3}],
+            },
+        }
+    )
+    assert (
+        service.get_rates(db_session, "EUR", date(2024, 1, 1), date(2024, 1, 2)) == {}
+    )
+    # Days table A has no rates for are still requested from table B
+    rates = service.get_rates(
+        db_session, "EUR", date(2024, 1, 1), date(2024, 1, 2), table="b"
+    )
+    assert rates == {date(2024, 1, 2): 4.3}
+    assert service.session.urls == [table_a, table_b]
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+from app import parallel_parsing
+from app.parallel_parsing import parse_in_parallel, row_ranges
+
+
+def numbered_rows(rows: pd.DataFrame, first_row_number: int, suffix: str) -> list:
+    return [
+        (row_number, value + suffix)
+        for row_number, value in enumerate(rows["value"], start=first_row_number)
+    ]
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    monkeypatch.setattr(parallel_parsing, "PARALLEL_MIN_ROWS", 0)
+
+
+def test_row_ranges_cover_all_rows():
+    assert row_ranges(10, 3) == [(0, 4), (4, 8), (8, 10)]
+    assert row_ranges(2, 4) == [(0, 1), (1, 2)]
+    assert row_ranges(0, 4) == []
+
+
+def test_processes_from_environment(monkeypatch):
+    monkeypatch.setenv(parallel_parsing.IMPORT_PROCESSES_ENV, "3")
+    assert parallel_parsing.import_processes() == 3
+
+
+@pytest.mark.parametrize("processes", [1, 3])
+def test_results_keep_row_order_and_numbers(parallel, processes):
+    df = pd.DataFrame(
+        {"value": [str(value) for value in range(10)]}, index=range(5, 15)
+    )
+    assert parse_in_parallel(numbered_rows, df, processes, suffix="!") == [
+        (row_number, f"{row_number - 1}!") for row_number in range(1, 11)
+    ]
+
+
+def test_small_inputs_are_parsed_in_process(monkeypatch):
+    def not_picklable(rows, first_row_number):
+        return list(rows["value"])
+
+    df = pd.DataFrame({"value": ["a", "b"]})
+    assert parse_in_parallel(not_picklable, df, processes=4) == ["a", "b"]
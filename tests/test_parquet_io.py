@@ -0,0 +1,158 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.dialects import mssql
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+from app import models
+from app.dependencies import get_db, get_db_session
+from app.main import app
+from app.parquet_io import EXPORT_TABLES, export_table, import_directory
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.fixture
+def db_session(db_session):
+    start = datetime(2024, 2, 15, 14, 22, 10, 5000)
+    # Amounts exact in binary, SQLite keeps DECIMAL columns as floats
+    db_session.add_all(
+        models.Trades(
+            utc_time=start + timedelta(seconds=number),
+            bought_currency="PLN°",
+            sold_currency="BTC",
+            price=Decimal("45000.5"),
+            bought_amount=Decimal("4500.25"),
+            sold_amount=Decimal("0.125"),
+            fee_currency=None,
+            fee_amount=Decimal("0.25"),
+            original_id=str(number),
+            id=f"trade-{number}",
+            exchange_id=1,
+            user_id=1,
+        )
+        for number in range(7)
+    )
+    db_session.add_all(
+        [
+            models.PriceHistory(
+                symbol="BTCUSDT",
+                interval="1m",
+                time=datetime(2024, 1, 1),
+                price=42000.5,
+                volume=None,
+                source="binance",
+            ),
+            models.DailyPriceHistory(
+                base_currency="USD",
+                quote_currency="PLN",
+                date=date(2024, 1, 2),
+                price=3.9432,
+                source="nbp",
+            ),
+            models.Deposit(id="d1", amount="0.5", coin="BTC", status=1),
+        ]
+    )
+    db_session.commit()
+    return db_session
+
+
+def table_rows(db_session, table_name: str) -> list[tuple]:
+    table = EXPORT_TABLES[table_name]
+    return db_session.execute(select(table).order_by(*table.primary_key)).all()
+
+
+def test_export_and_import_all_tables(db_session, make_db_session, tmp_path):
+    results = [
+        export_table(db_session, name, tmp_path, batch_rows=2, rows_per_file=4)
+        for name in EXPORT_TABLES
+    ]
+    assert results[0] == {
+        "table": "trades",
+        "rows": 7,
+        "files": ["part-00000.parquet", "part-00001.parquet"],
+    }
+    # Empty tables keep a part with their schema
+    assert results[-1] == {
+        "table": "withdrawals",
+        "rows": 0,
+        "files": ["part-00000.parquet"],
+    }
+
+    clone = make_db_session()
+    for name in EXPORT_TABLES:
+        import_directory(clone, name, tmp_path)
+        assert table_rows(clone, name) == table_rows(db_session, name)
+
+    with pytest.raises(IntegrityError):
+        import_directory(clone, "trades", tmp_path)
+    assert import_directory(clone, "trades", tmp_path, replace=True)["rows"] == 7
+    with pytest.raises(ValueError):
+        export_table(db_session, "users", tmp_path)
+
+
+def test_import_keeps_identity_ids_on_sql_server(db_session, tmp_path):
+    for name in ("trades", "price_history"):
+        export_table(db_session, name, tmp_path)
+    sql_server = MagicMock()
+    sql_server.get_bind.return_value.dialect = mssql.dialect()
+
+    def statements() -> list[str]:
+        executed = [str(call.args[0]) for call in sql_server.execute.call_args_list]
+        sql_server.execute.reset_mock()
+        return executed
+
+    import_directory(sql_server, "price_history", tmp_path)
+    executed = statements()
+    assert executed[0] == "SET IDENTITY_INSERT price_history ON"
+    assert executed[1].startswith("INSERT INTO price_history (")
+    assert executed[-1] == "SET IDENTITY_INSERT price_history OFF"
+    # Trades have string keys
+    import_directory(sql_server, "trades", tmp_path)
+    assert not any("IDENTITY_INSERT" in statement for statement in statements())
+
+
+def test_parquet_endpoints(db_session, make_db_session):
+    clone = make_db_session()
+    closed = []
+
+    class StreamSession(Session):
+        def close(self):
+            closed.append(self)
+            super().close()
+
+    # The export reads in a session of its own, not the request scoped one
+    database = SimpleNamespace(
+        SessionLocal=sessionmaker(bind=db_session.get_bind(), class_=StreamSession)
+    )
+    client = TestClient(app)
+    try:
+        app.dependency_overrides[get_db] = lambda: database
+        exported = client.get("/parquet/export/trades")
+        assert exported.status_code == 200
+        assert len(closed) == 1
+        body = pq.read_table(BytesIO(exported.content))
+        assert body.num_rows == 7
+        assert sorted(body.column("id").to_pylist()) == [
+            row.id for row in table_rows(db_session, "trades")
+        ]
+        assert client.get("/parquet/export/users").status_code == 400
+
+        app.dependency_overrides[get_db_session] = lambda: clone
+        files = {"files": ("trades.parquet", exported.content)}
+        response = client.post("/parquet/import/trades", files=files)
+        assert response.json() == {"table": "trades", "rows": 7}
+        assert table_rows(clone, "trades") == table_rows(db_session, "trades")
+        again = client.post("/parquet/import/trades", files=files)
+        assert again.status_code == 409
+        bad_file = client.post(
+            "/parquet/import/trades", files={"files": ("x.parquet", b"not parquet")}
+        )
+        assert bad_file.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
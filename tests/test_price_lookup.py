@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+from app import crud, models
+from app.dependencies import get_db_session, get_price_store
+from app.main import app
+from app.price_lookup import PriceSeries, PriceStore, to_epoch_ms
+
+DAY_MS = 86_400_000
+
+
+@pytest.fixture
+def session(db_session):
+    for day, price in ((3, 30.0), (1, 10.0), (2, 20.0)):
+        db_session.add(
+            models.PriceHistory(
+                symbol="BTCUSDT",
+                interval="1d",
+                time=datetime(2024, 1, day),
+                price=price,
+            )
+        )
+    db_session.commit()
+    return db_session
+
+
+def test_price_series_asof():
+    series = PriceSeries(np.array([0, DAY_MS, 2 * DAY_MS]), np.array([1.0, 2.0, 3.0]))
+    result = series.asof(np.array([-1, 0, DAY_MS - 1, 5 * DAY_MS]))
+    assert np.isnan(result[0])
+    assert result[1:].tolist() == [1.0, 1.0, 3.0]
+
+
+def test_to_epoch_ms_accepts_mixed_inputs():
+    expected = 1704067200000  # 2024-01-01 00:00:00 UTC
+    assert to_epoch_ms([expected]).tolist() == [expected]
+    assert to_epoch_ms([datetime(2024, 1, 1)]).tolist() == [expected]
+    assert to_epoch_ms(["2024-01-01T00:00:00Z"]).tolist() == [expected]
+    assert to_epoch_ms([]).tolist() == []
+
+
+def test_price_store_loads_and_caches(session):
+    store = PriceStore()
+    result = store.asof(
+        session, "BTCUSDT", "1d", [datetime(2023, 12, 31), datetime(2024, 1, 2, 12)]
+    )
+    assert np.isnan(result[0])
+    assert result[1] == 20.0
+    assert store.nbytes == 3 * 16
+    session.query(models.PriceHistory).delete()
+    # Served from cache until invalidated
+    assert store.asof(session, "BTCUSDT", "1d", [datetime(2024, 1, 5)])[0] == 30.0
+    store.invalidate(symbol="BTCUSDT")
+    assert store.nbytes == 0
+    assert np.isnan(store.asof(session, "BTCUSDT", "1d", [datetime(2024, 1, 5)])[0])
+
+
+def test_asof_endpoint(session):
+    app.dependency_overrides[get_db_session] = lambda: session
+    store = PriceStore()
+    app.dependency_overrides[get_price_store] = lambda: store
+    try:
+        client = TestClient(app)
+        response = client.post(
+            "/prices/asof",
+            json={"timestamps": ["2024-01-02T12:00:00", "2023-12-31T00:00:00"]},
+        )
+        assert response.status_code == 200
+        assert response.json()["prices"] == [20.0, None]
+        bad = client.post("/prices/asof", json={"timestamps": ["yesterday"]})
+        assert bad.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_price_store_evicts_least_recently_used():
+    store = PriceStore(max_bytes=70)
+    series = PriceSeries(np.arange(2), np.arange(2, dtype=float))
+    store.put(("A", "1d"), series)
+    store.put(("B", "1d"), series)
+    store.get_series(None, "A", "1d")
+    store.put(("C", "1d"), series)
+    assert store.get_series(None, "A", "1d") is series
+    assert store.nbytes == 2 * series.nbytes
+
+
+def test_crud_writes_invalidate_price_stores(session):
+    store = PriceStore()
+    assert store.asof(session, "BTCUSDT", "1d", [datetime(2024, 1, 5)])[0] == 30.0
+    crud.upsert_candles(
+        session,
+        [
+            {
+                "symbol": "BTCUSDT",
+                "interval": "1d",
+                "time": datetime(2024, 1, 4),
+                "price": 40.0,
+            }
+        ],
+    )
+    assert store.asof(session, "BTCUSDT", "1d", [datetime(2024, 1, 5)])[0] == 40.0
+
+
+def test_price_store_checks_for_rows_written_elsewhere(session):
+    store = PriceStore(check_seconds=0)
+    assert store.asof(session, "BTCUSDT", "1d", [datetime(2024, 1, 5)])[0] == 30.0
+    series = store.get_series(session, "BTCUSDT", "1d")
+    # Another process writes without reaching the caches of this one
+    session.add(
+        models.PriceHistory(
+            symbol="BTCUSDT", interval="1d", time=datetime(2024, 1, 4), price=40.0
+        )
+    )
+    session.commit()
+    assert store.asof(session, "BTCUSDT", "1d", [datetime(2024, 1, 5)])[0] == 40.0
+    assert store.get_series(session, "BTCUSDT", "1d") is not series
@@ -0,0 +1,61 @@
+import time
+from collections import Counter
+import pytest
+from fastapi.testclient import TestClient
+from app import profiling
+from app.main import app
+from app.profiling import ProfileStore, SamplingProfiler
+
+
+@pytest.fixture
+def profiling_on(monkeypatch, tmp_path):
+    monkeypatch.setenv(profiling.PROFILING_ENV, "true")
+    monkeypatch.setenv(profiling.PROFILE_DIR_ENV, str(tmp_path))
+    monkeypatch.setenv(profiling.PROFILE_MAX_FILES_ENV, "2")
+    return tmp_path
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampling_profiler_sees_busy_function():
+    profiler = SamplingProfiler(interval=0.001).start()
+    busy_loop(0.05)
+    stacks = profiler.stop()
+    assert profiler.samples > 0
+    assert any("busy_loop (test_profiling.py:" in stack for stack in stacks)
+
+
+def test_store_keeps_newest_profiles(tmp_path):
+    store = ProfileStore(tmp_path, max_files=2)
+    names = [
+        store.save("POST", "/binance/upload-xlsx", 0.25, Counter({"a;b": 3}))
+        for _ in range(3)
+    ]
+    assert [item["name"] for item in store.profiles()] == names[:0:-1]
+    assert "-post-binance-upload-xlsx-250ms" in names[0]
+    assert store.path(names[2]).read_text() == "a;b 3\n"
+    assert store.path(names[0]) is None
+    assert store.path("../" + names[2]) is None
+
+
+def test_requests_are_profiled_only_when_asked(profiling_on):
+    client = TestClient(app)
+    assert profiling.PROFILE_ID_HEADER not in client.get("/health").headers
+    response = client.get("/health", headers={profiling.PROFILE_HEADER: "1"})
+    name = response.headers[profiling.PROFILE_ID_HEADER]
+    assert client.get("/profiles").json()[0]["name"] == name
+    download = client.get(f"/profiles/{name}")
+    assert download.status_code == 200
+    assert client.get("/profiles/missing.folded").status_code == 404
+
+
+def test_profiling_is_disabled_by_default(monkeypatch):
+    monkeypatch.delenv(profiling.PROFILING_ENV, raising=False)
+    client = TestClient(app)
+    response = client.get("/health?profile=1")
+    assert profiling.PROFILE_ID_HEADER not in response.headers
+    assert client.get("/profiles").status_code == 404
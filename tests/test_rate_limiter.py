@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from app import rate_limiter
+from app.rate_limiter import RateLimiter, get_limiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_040.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def sleeps(monkeypatch, clock):
+    slept = []
+
+    def fake_sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limiter.time, "sleep", fake_sleep)
+    return slept
+
+
+def test_weights_fill_budget_then_wait(clock, sleeps):
+    limiter = RateLimiter(
+        "test", max_weight=10, weights={"heavy": 4}, safety_margin=1.0, clock=clock
+    )
+    limiter.acquire("heavy")
+    limiter.acquire("heavy")
+    assert sleeps == []
+    clock.now += 15
+    limiter.acquire("heavy")
+    # The first request leaves the one minute window after 45 more seconds
+    assert sleeps == [45]
+    assert limiter.utilization()["used_weight"] == 4
+
+
+def test_server_used_weight_overrides_local_count(clock, sleeps):
+    limiter = RateLimiter(
+        "test",
+        max_weight=100,
+        used_weight_header="X-MBX-USED-WEIGHT-1M",
+        safety_margin=1.0,
+        clock=clock,
+    )
+    limiter.update({"x-mbx-used-weight-1m": "99"})
+    assert limiter.utilization()["used_weight"] == 99
+    limiter.acquire(weight=1)
+    limiter.acquire(weight=1)
+    # Binance counters reset with the wall-clock minute (20 s into it here)
+    assert sleeps == [40]
+
+
+def test_retry_after_blocks_all_callers(clock, sleeps):
+    limiter = RateLimiter("test", max_weight=100, clock=clock)
+    assert limiter.update({"Retry-After": "7"}, status_code=429) == 7
+    assert limiter.utilization()["blocked_for_seconds"] == 7
+    limiter.acquire()
+    assert sleeps == [7]
+
+
+def test_backoff_without_retry_after(clock):
+    limiter = RateLimiter("test", max_weight=100, backoff_factor=1.0, clock=clock)
+    assert limiter.update(None, status_code=429) == 1
+    clock.now += 1
+    assert limiter.update(None, status_code=418) == 2
+    clock.now += 2
+    limiter.update(None, status_code=200)
+    assert limiter.update(None, status_code=429) == 1
+
+
+def test_acquire_async(clock, monkeypatch):
+    limiter = RateLimiter("test", max_weight=1, safety_margin=1.0, clock=clock)
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+
+    async def run():
+        await limiter.acquire_async()
+        await limiter.acquire_async()
+
+    asyncio.run(run())
+    assert slept == [60]
+
+
+def test_get_limiter_is_shared():
+    assert get_limiter("binance") is get_limiter("binance")
+    assert get_limiter("binance").weight("myTrades") == 20
+    assert {entry["name"] for entry in rate_limiter.utilization()} >= {"binance"}
@@ -0,0 +1,56 @@
+import requests
+from tests.replay import Cassette, recording, replaying, request_key
+
+
+def test_request_key_ignores_volatile_params():
+    first = request_key(
+        "GET", "https://api.binance.com/api/v3/myTrades?symbol=BTCUSDT&timestamp=1"
+    )
+    second = request_key(
+        "get",
+        "https://api.binance.com/api/v3/myTrades"
+        "?signature=x&timestamp=2&symbol=BTCUSDT",
+    )
+    assert first == second
+    assert request_key("POST", "https://kanga/x", '{"nonce": 1, "limit": 500}') == (
+        request_key("POST", "https://kanga/x", '{"limit": 500, "nonce": 2}')
+    )
+
+
+def test_record_then_replay_through_stub_server(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    calls = []
+
+    def transport(method, url, body):
+        calls.append(url)
+        return 200, {"page": len(calls)}
+
+    with recording(path, transport=transport):
+        first = requests.get(
+            "https://api.binance.com/api/v3/klines",
+            params={"symbol": "BTCUSDT", "timestamp": 1},
+        ).json()
+        second = requests.get(
+            "https://api.binance.com/api/v3/klines",
+            params={"symbol": "BTCUSDT", "timestamp": 2},
+        ).json()
+        posted = requests.post(
+            "https://api.kanga.exchange/api/v2/list", data='{"nonce": 1, "a": 1}'
+        ).json()
+    assert (first, second, posted) == ({"page": 1}, {"page": 2}, {"page": 3})
+
+    cassette = Cassette.load(path)
+    with replaying(cassette):
+        assert requests.get(
+            "https://api.binance.com/api/v3/klines",
+            params={"symbol": "BTCUSDT", "timestamp": 3},
+        ).json() == {"page": 1}
+        assert requests.get(
+            "https://api.binance.com/api/v3/klines?symbol=BTCUSDT&timestamp=4"
+        ).json() == {"page": 2}
+        session = requests.Session()
+        assert session.post(
+            "https://api.kanga.exchange/api/v2/list", data='{"nonce": 9, "a": 1}'
+        ).json() == {"page": 3}
+        assert requests.get("https://api.nbp.pl/unknown").status_code == 599
+    assert len(calls) == 3
@@ -0,0 +1,78 @@
+import time
+import pytest
+from app import response_cache
+from app.response_cache import ResponseCache, cache_key, cached_fetch, range_closed
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_PATH", str(tmp_path / "responses.db"))
+    response_cache.get_response_cache.cache_clear()
+    yield response_cache.get_response_cache()
+    response_cache.get_response_cache.cache_clear()
+
+
+def test_cache_key_ignores_volatile_params():
+    first = cache_key("binance/myTrades", {"symbol": "BTCUSDT", "timestamp": 1})
+    second = cache_key(
+        "binance/myTrades", {"timestamp": 2, "signature": "abc", "symbol": "BTCUSDT"}
+    )
+    assert first == second
+    assert first != cache_key("binance/myTrades", {"symbol": "ETHUSDT"})
+    assert first != cache_key("binance/klines", {"symbol": "BTCUSDT"})
+
+
+def test_range_closed():
+    now_ms = int(time.time() * 1000)
+    assert range_closed(now_ms - 120_000, margin_ms=60_000)
+    assert not range_closed(now_ms - 30_000, margin_ms=60_000)
+    assert not range_closed(None)
+
+
+def test_cached_fetch_serves_immutable_payloads(cache):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return [[1609459200000, "30000.0"]]
+
+    params = {"symbol": "BTCUSDT", "endTime": 1609459200000}
+    assert cached_fetch("binance/klines", params, fetch, immutable=True) == fetch()
+    assert cached_fetch("binance/klines", params, fetch, immutable=True) == [
+        [1609459200000, "30000.0"]
+    ]
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 1
+
+    cached_fetch("binance/klines", params, fetch, immutable=False)
+    assert len(calls) == 3
+
+
+def test_cached_fetch_skips_uncacheable_payloads(cache):
+    payload = {"result": "fail", "code": 429}
+    for _ in range(2):
+        cached_fetch(
+            "kanga/history",
+            {},
+            lambda: payload,
+            immutable=True,
+            cacheable=lambda response: "list" in response,
+        )
+    assert cache.stats()["entries"] == 0
+
+
+def test_cache_disabled_without_env(monkeypatch):
+    monkeypatch.delenv("RESPONSE_CACHE_PATH", raising=False)
+    response_cache.get_response_cache.cache_clear()
+    assert response_cache.get_response_cache() is None
+    assert cached_fetch("nbp", {}, lambda: {"rates": []}, immutable=True) == {
+        "rates": []
+    }
+
+
+def test_payloads_are_compressed(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    payload = {"list": [{"id": str(i), "price": "1.00000000"} for i in range(500)]}
+    cache.put("kanga/history", {"startTime": "x"}, payload)
+    assert cache.get("kanga/history", {"startTime": "x"}) == payload
+    assert cache.stats()["compressed_bytes"] < len(str(payload)) / 5
@@ -0,0 +1,41 @@
+import json
+import pytest
+from tests.synthetic_data import (
+    generate_trades,
+    kanga_csv_lines,
+    main,
+    make_symbols,
+    my_trades,
+)
+
+
+def test_generate_trades_is_deterministic_with_duplicates():
+    trades = list(generate_trades(2000, symbols=5, duplicate_ratio=0.1, seed=7))
+    assert trades == list(generate_trades(2000, symbols=5, duplicate_ratio=0.1, seed=7))
+    assert len(trades) == 2000
+    assert {trade["symbol"] for trade in trades} <= {s for s, _, _ in make_symbols(5)}
+    unique = len({trade["id"] for trade in trades})
+    assert 100 < 2000 - unique < 300
+    assert len(list(my_trades(trades))) == unique
+
+
+def test_make_symbols_limit():
+    with pytest.raises(ValueError):
+        make_symbols(10_000)
+
+
+def test_kanga_csv_uses_local_time():
+    lines = list(kanga_csv_lines(generate_trades(1), "Europe/Warsaw"))
+    assert lines[0] == "Data,Para,Strona,Ilość,Cena,Opłata,Suma\n"
+    assert lines[1].startswith("2023-01-01 01:")
+
+
+@pytest.mark.parametrize(
+    "data_format", ["binance-csv", "binance-xlsx", "kanga-csv", "my-trades", "klines"]
+)
+def test_cli_writes_output(tmp_path, data_format):
+    output = tmp_path / "data"
+    main([data_format, "--rows", "50", "--symbols", "3", "--output", str(output)])
+    assert output.stat().st_size > 0
+    if data_format in ("my-trades", "klines"):
+        assert len(json.loads(output.read_text())) == 50
@@ -0,0 +1,128 @@
+import pytest
+from datetime import date, datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from app import crud, models
+from app.tax_report import (
+    RateIndex,
+    TradeSpan,
+    compute_yearly_totals,
+    generate_tax_report,
+)
+
+
+def make_trade(when, bought, bought_amount, sold, sold_amount, fee="0", fee_cur=""):
+    return SimpleNamespace(
+        utc_time=when,
+        bought_currency=bought,
+        bought_amount=Decimal(bought_amount),
+        sold_currency=sold,
+        sold_amount=Decimal(sold_amount),
+        fee_currency=fee_cur,
+        fee_amount=Decimal(fee),
+    )
+
+
+@pytest.fixture
+def rates():
+    # 2024-01-05 is a Friday, nothing is published over the weekend
+    return RateIndex(
+        [
+            ("EUR", date(2024, 1, 8), 4.40),
+            ("EUR", date(2024, 1, 5), 4.35),
+        ]
+    )
+
+
+def test_rate_index_asof(rates):
+    assert rates.asof("EUR", date(2024, 1, 7)) == Decimal("4.35")
+    assert rates.asof("EUR", date(2024, 1, 8)) == Decimal("4.4")
+    assert rates.asof("EUR", date(2024, 1, 4)) is None
+    assert rates.asof("USD", date(2024, 1, 8)) is None
+
+
+def test_rate_index_uses_previous_business_day(rates):
+    # Monday trade is valued with Friday rate
+    assert rates.previous_day_rate("EUR", date(2024, 1, 8)) == Decimal("4.35")
+    assert rates.previous_day_rate("PLN", date(2024, 1, 8)) == 1
+
+
+def test_compute_yearly_totals_carries_costs(rates):
+    trades = [
+        make_trade(datetime(2023, 5, 1), "BTC", "1", "oPLN", "1000", "5", "oPLN"),
+        make_trade(datetime(2024, 1, 8), "EUR", "300", "BTC", "0.5"),
+        make_trade(datetime(2024, 1, 9), "ETH", "1", "BTC", "0.1"),
+    ]
+    report = compute_yearly_totals(trades, {"PLN", "EUR"}, rates)
+    year_2023, year_2024 = report["years"]
+    assert year_2023["costs"] == Decimal("1005")
+    assert year_2023["costs_carried_out"] == Decimal("1005")
+    assert year_2024["revenue"] == Decimal("1305")
+    assert year_2024["trades"] == 1
+    assert year_2024["income"] == Decimal("300")
+    assert year_2024["tax_due"] == Decimal("57")
+    assert report["missing_rates"] == []
+
+
+def test_compute_yearly_totals_reports_missing_rates(rates):
+    trades = [make_trade(datetime(2020, 1, 2), "EUR", "10", "BTC", "1")]
+    report = compute_yearly_totals(trades, {"PLN", "EUR"}, rates)
+    assert report["missing_rates"] == [("EUR", "2020-01-02")]
+
+
+def test_generate_tax_report_loads_rates_from_db(db_session):
+    db_session.add(
+        models.DailyPriceHistory(
+            base_currency="USD",
+            quote_currency="PLN",
+            date=date(2024, 3, 1),
+            price=4.0,
+            source="NBP",
+        )
+    )
+    db_session.commit()
+    trades = [
+        make_trade(datetime(2024, 3, 4), "BTC", "1", "USD", "100"),
+        make_trade(datetime(2024, 3, 5), "USD", "150", "BTC", "1"),
+    ]
+    report = generate_tax_report(db_session, trades, year=2024)
+    [totals] = report["years"]
+    assert totals["costs"] == Decimal("400")
+    assert totals["revenue"] == Decimal("600")
+    assert totals["income"] == Decimal("200")
+
+
+def test_generate_tax_report_streams_stored_trades(db_session):
+    db_session.add(
+        models.DailyPriceHistory(
+            base_currency="USD",
+            quote_currency="PLN",
+            date=date(2024, 3, 1),
+            price=4.0,
+            source="NBP",
+        )
+    )
+    for trade in (
+        make_trade(datetime(2024, 3, 4), "BTC", "1", "USD", "100"),
+        make_trade(datetime(2024, 3, 5), "USD", "150", "BTC", "1"),
+        make_trade(datetime(2025, 1, 2), "USD", "50", "BTC", "1"),
+    ):
+        db_session.add(
+            models.Trades(
+                **vars(trade),
+                id=trade.utc_time.isoformat(),
+                original_id="",
+                exchange_id=1,
+                user_id=1,
+            )
+        )
+    db_session.commit()
+
+    end_time = datetime(2025, 1, 1)
+    span = TradeSpan.load(db_session, user_id=1, end_time=end_time)
+    assert span == TradeSpan(date(2024, 3, 4), date(2024, 3, 5), {"BTC", "USD", ""})
+    trades = crud.iter_user_trades(db_session, user_id=1, end_time=end_time)
+    report = generate_tax_report(db_session, trades, span=span)
+    [totals] = report["years"]
+    assert (totals["costs"], totals["revenue"]) == (Decimal("400"), Decimal("600"))
+    assert TradeSpan.load(db_session, user_id=2) == TradeSpan(None, None, set())
@@ -0,0 +1,111 @@
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import select
+from app import models, trade_ids
+from app.tools import generate_hash
+
+
+def trade_fields(**changes) -> dict:
+    return {
+        "utc_time": "2024-02-15 14:22:10",
+        "bought_currency": "PLN°",
+        "sold_currency": "BTC",
+        "price": "45000.50",
+        "bought_amount": "4500.25",
+        "sold_amount": "0.125",
+        "fee_currency": "PLN°",
+        "fee_amount": "0.25",
+        "original_id": "",
+        "id": "",
+        "exchange": "Binance",
+        "user": "MARIUSZ",
+    } | changes
+
+
+@pytest.fixture
+def session(db_session):
+    db_session.add_all(
+        [
+            models.Users(id=1, name="MARIUSZ"),
+            models.Exchanges(id=1, name="Binance"),
+            models.Exchanges(id=2, name="Kanga"),
+        ]
+    )
+    db_session.commit()
+    return db_session
+
+
+def test_v1_is_generate_hash():
+    fields = trade_fields()
+    assert trade_ids.trade_id(fields, "v1") == generate_hash(fields)
+
+
+def test_v2_normalizes_numbers_and_fits_id_column():
+    trade_id = trade_ids.trade_id(trade_fields(), "v2")
+    assert trade_id.startswith("v2") and len(trade_id) == 64
+    assert trade_id == trade_ids.trade_id(trade_fields(price="45000.5"), "v2")
+    assert trade_id != trade_ids.trade_id(trade_fields(user="MARCELINA"), "v2")
+
+
+def test_scheme_from_environment(monkeypatch):
+    monkeypatch.setenv(trade_ids.TRADE_ID_SCHEME_ENV, "v2")
+    assert trade_ids.trade_id(trade_fields()).startswith("v2")
+    monkeypatch.setenv(trade_ids.TRADE_ID_SCHEME_ENV, "v3")
+    with pytest.raises(ValueError):
+        trade_ids.trade_id(trade_fields())
+
+
+@pytest.mark.parametrize("scheme", trade_ids.SCHEMES)
+def test_columns_give_the_same_ids_as_single_trades(monkeypatch, scheme):
+    rows = [trade_fields(price=str(price), sold_amount="0") for price in range(40)]
+    rows[5]["fee_amount"] = 0.0
+    columns = rows[0] | {
+        name: [row[name] for row in rows]
+        for name in ("utc_time", "price", "sold_amount", "fee_amount")
+    }
+    columns["user"] = None
+    expected = [trade_ids.trade_id(row | {"user": None}, scheme) for row in rows]
+
+    assert trade_ids.trade_ids(columns, scheme) == expected
+    # Large inputs are split across worker processes
+    monkeypatch.setattr(trade_ids, "PROCESS_POOL_MIN_ROWS", 10)
+    assert trade_ids.trade_ids(columns, scheme, processes=3) == expected
+
+
+def test_migrate_trade_ids(session):
+    # Amounts exact in binary, SQLite keeps DECIMAL columns as floats
+    binance = trade_fields()
+    kanga = trade_fields(exchange="Kanga", utc_time="2024-02-15 14:22")
+    stored = [
+        # Binance parsers add milliseconds, Kanga hashes minutes
+        (binance, 1, datetime(2024, 2, 15, 14, 22, 10, 5000)),
+        (kanga, 2, datetime(2024, 2, 15, 14, 22, 41)),
+    ]
+    session.add_all(
+        models.Trades(
+            utc_time=utc_time,
+            bought_currency=fields["bought_currency"],
+            sold_currency=fields["sold_currency"],
+            price=Decimal(fields["price"]),
+            bought_amount=Decimal(fields["bought_amount"]),
+            sold_amount=Decimal(fields["sold_amount"]),
+            fee_currency=fields["fee_currency"],
+            fee_amount=Decimal(fields["fee_amount"]),
+            original_id="12345",
+            id=trade_ids.trade_id(fields, "v1"),
+            exchange_id=exchange_id,
+            user_id=1,
+        )
+        for fields, exchange_id, utc_time in stored
+    )
+    session.commit()
+
+    assert trade_ids.migrate_trade_ids(session, batch_size=1) == {"migrated_trades": 2}
+    assert trade_ids.migrate_trade_ids(session) == {"migrated_trades": 0}
+
+    ids = session.scalars(select(models.Trades.id).order_by(models.Trades.exchange_id))
+    assert list(ids) == [
+        trade_ids.trade_id(binance, "v2"),
+        trade_ids.trade_id(kanga, "v2"),
+    ]
@@ -0,0 +1,94 @@
+from io import BytesIO
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app import models, uploads
+from app.binance_service import BinanceService
+from app.dependencies import get_binance_service, get_db_session
+from app.main import app
+
+CSV_HEADER = b"Date(UTC),Pair,Side,Price,Executed,Amount,Fee\n"
+CSV_ROWS = [
+    b"2024-03-01 10:00:0%d,BTCUSDT,BUY,60000,0.01BTC,600USDT,0.00001BTC\n" % second
+    for second in range(5)
+]
+
+
+@pytest.fixture
+def db_session(db_session):
+    db_session.add_all(
+        [models.Users(id=1, name="MARIUSZ"), models.Exchanges(id=1, name="Binance")]
+    )
+    db_session.commit()
+    return db_session
+
+
+@pytest.fixture
+def client(monkeypatch, db_session):
+    monkeypatch.setattr(
+        "app.crud.get_binance_symbol_dict",
+        lambda db_session, symbol: {"base_currency": "BTC", "quote_currency": "USDT"},
+    )
+    app.dependency_overrides[get_db_session] = lambda: db_session
+    app.dependency_overrides[get_binance_service] = lambda: BinanceService(
+        "fake keyring system name"
+    )
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def ledger_entry(content: bytes, **fields) -> models.Uploads:
+    read = uploads.read_upload(BytesIO(content), [])
+    return models.Uploads(content_hash=read.content_hash, size=read.size, **fields)
+
+
+def test_read_upload_finds_identical_and_prefix_uploads(monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_CHUNK_SIZE", 4)
+    content = CSV_HEADER + b"".join(CSV_ROWS)
+    short = ledger_entry(CSV_HEADER + CSV_ROWS[0], id=1)
+    longer = ledger_entry(CSV_HEADER + b"".join(CSV_ROWS[:3]), id=2)
+    other = ledger_entry(CSV_HEADER + CSV_ROWS[1], id=3)
+    file = BytesIO(content)
+
+    upload = uploads.read_upload(file, [short, longer, other])
+
+    assert (upload.content, upload.size, upload.previous) == (
+        content,
+        len(content),
+        None,
+    )
+    assert upload.prefix is longer
+    assert file.tell() == 0
+    same = uploads.read_upload(file, [longer, ledger_entry(content, id=4)], False)
+    assert (same.content, same.previous.id) == (None, 4)
+
+
+def test_csv_tail():
+    content = CSV_HEADER + b"".join(CSV_ROWS[:3])
+    prefix_size = len(CSV_HEADER + CSV_ROWS[0])
+    assert uploads.csv_tail(content, prefix_size) == CSV_HEADER + b"".join(
+        CSV_ROWS[1:3]
+    )
+    assert uploads.csv_tail(content, prefix_size - 1) is None
+    assert uploads.csv_tail(content, 3) is None
+
+
+def test_binance_csv_upload_is_imported_once(client, db_session):
+    def upload(rows):
+        return client.post(
+            "/binance/upload-csv",
+            params={"user": "MARIUSZ"},
+            files={"file": ("trades.csv", CSV_HEADER + b"".join(rows), "text/csv")},
+        ).json()
+
+    assert upload(CSV_ROWS[:3])["inserted_trades"] == 3
+    again = upload(CSV_ROWS[:3])
+    assert again["duplicate_upload"] and again["result"]["inserted_trades"] == 3
+    extended = upload(CSV_ROWS)
+    assert (extended["inserted_trades"], extended["skipped_rows"]) == (2, 3)
+    assert db_session.scalars(select(models.Uploads.row_count)).all() == [3, 5]
+    # Appended rows keep the millisecond offsets of their place in the file
+    times = db_session.scalars(
+        select(models.Trades.utc_time).order_by(models.Trades.utc_time)
+    )
+    assert [time.microsecond // 1000 for time in times] == [1, 2, 3, 4, 5]
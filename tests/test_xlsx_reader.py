@@ -0,0 +1,34 @@
+from io import BytesIO
+from openpyxl import Workbook
+from app.xlsx_reader import XlsxBatches
+
+
+def workbook_bytes(rows: list[list]) -> BytesIO:
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    file = BytesIO()
+    workbook.save(file)
+    file.seek(0)
+    return file
+
+
+def test_batches_of_rows():
+    file = workbook_bytes(
+        [["Pair", "Price", None], ["BTCUSDT", 60000], [], ["ETHBTC", 0.05, "x"]]
+        + [["BNBBTC", 0.01]] * 3
+    )
+    with XlsxBatches(file, batch_size=2) as sheet:
+        assert sheet.columns == ["Pair", "Price"]
+        batches = list(sheet)
+    assert [list(batch.index) for batch in batches] == [[0, 1], [2, 3], [4]]
+    assert batches[0]["Pair"].tolist() == ["BTCUSDT", "ETHBTC"]
+    # A fractional value in a later batch makes the whole column float, as
+    # in the float64 columns pd.read_excel infers
+    assert [str(price) for price in batches[0]["Price"]] == ["60000.0", "0.05"]
+
+
+def test_header_only_sheet_has_no_batches():
+    with XlsxBatches(workbook_bytes([["Pair", "Price"]])) as sheet:
+        assert sheet.columns == ["Pair", "Price"]
+        assert list(sheet) == []